@@ -0,0 +1,80 @@
+"""Markouts of a day of fills, vectorized against a Python loop.
+
+Run with `pipenv run python benchmarks/bench_analytics.py`.
+"""
+
+import bisect
+import time
+
+import numpy as np
+
+from analytics import MARKOUT_HORIZONS, BookSeries, FillSeries, markouts
+
+BOOK_EVENTS = 1_000_000
+FILLS = 100_000
+DAY = 86400.0
+
+
+def build(rng: np.random.Generator):
+    timestamps = np.sort(rng.uniform(0, DAY, BOOK_EVENTS))
+    mid = 30000 + np.cumsum(rng.choice([-0.1, 0.0, 0.1], BOOK_EVENTS))
+    book = BookSeries(
+        timestamp=timestamps,
+        bid=mid - 0.05,
+        ask=mid + 0.05,
+        bid_size=rng.uniform(0.1, 5, BOOK_EVENTS),
+        ask_size=rng.uniform(0.1, 5, BOOK_EVENTS),
+    )
+    fill_timestamps = np.sort(rng.uniform(0, DAY, FILLS))
+    side = rng.choice([1, -1], FILLS)
+    fills = FillSeries(
+        timestamp=fill_timestamps,
+        side=side,
+        price=book.mid_at(fill_timestamps) - side * 0.05,
+        size=np.ones(FILLS),
+    )
+    return book, fills
+
+
+def loop_markouts(book: BookSeries, fills: FillSeries):
+    # What this took before, one lookup per fill and horizon
+    timestamps = book.timestamp.tolist()
+    mids = book.mid.tolist()
+    rows = []
+    for timestamp, side, price in zip(
+        fills.timestamp.tolist(), fills.side.tolist(), fills.price.tolist()
+    ):
+        row = []
+        for horizon in MARKOUT_HORIZONS:
+            later = timestamp + horizon
+            index = bisect.bisect_right(timestamps, later) - 1
+            if index < 0 or later > timestamps[-1]:
+                row.append(float("nan"))
+            else:
+                row.append(side * (mids[index] - price))
+        rows.append(row)
+    return rows
+
+
+def main():
+    book, fills = build(np.random.default_rng(1))
+    print(f"{BOOK_EVENTS:,} book events, {FILLS:,} fills")
+
+    start = time.perf_counter()
+    vectorized = markouts(book, fills)
+    vectorized_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    looped = loop_markouts(book, fills)
+    loop_seconds = time.perf_counter() - start
+
+    assert np.allclose(vectorized, looped, equal_nan=True)
+    print(f"{'loop (s)':>12} {'numpy (s)':>12} {'speedup':>10}")
+    print(
+        f"{loop_seconds:>12.3f} {vectorized_seconds:>12.3f} "
+        f"{loop_seconds / vectorized_seconds:>9.0f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
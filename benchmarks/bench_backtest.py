@@ -0,0 +1,91 @@
+"""Replay throughput of the backtester on a synthetic random walk book.
+
+Run with `pipenv run python benchmarks/bench_backtest.py`.
+"""
+
+import random
+from decimal import Decimal
+
+from cryptofeed.defines import L2_BOOK
+
+from backtest import Backtest
+from rate_limits import RateLimitTracker
+
+SYMBOL = "BTC-USDT-PERP"
+ASSET = "BTCUSDT"
+DEPTH = 50
+EVENTS = 200000
+TICK = Decimal("0.1")
+# Ticks the market moves at once, sweeping the quotes resting at the touch
+MOVE = 2
+TARGET_EVENTS_PER_SECOND = 1000000
+# Budgets no replay gets near, so every decision is sent and measured
+UNLIMITED = 10**12
+
+
+def build_events(count: int, seed: int = 1):
+    # Size updates at the touch, with the market moving up or down now and
+    # then through the level we quote at while keeping the book depth constant
+    rng = random.Random(seed)
+    bid = Decimal("30000") - TICK
+    ask = bid + TICK * MOVE
+    events = [
+        (
+            0.0,
+            L2_BOOK,
+            (
+                [(bid - TICK * i, Decimal(1)) for i in range(DEPTH)],
+                [(ask + TICK * i, Decimal(1)) for i in range(DEPTH)],
+                True,
+            ),
+        )
+    ]
+    for i in range(1, count):
+        timestamp = i * 0.001
+        draw = rng.random()
+        if draw < 0.45:
+            update = ([(bid, Decimal(rng.randint(1, 5)))], [])
+        elif draw < 0.9:
+            update = ([], [(ask, Decimal(rng.randint(1, 5)))])
+        else:
+            # Asks take over the best bids or bids the best asks, filling
+            # the orders resting there
+            step = -MOVE if draw < 0.95 else MOVE
+            update = _move(bid, ask, step)
+            bid += TICK * step
+            ask += TICK * step
+        events.append((timestamp, L2_BOOK, (*update, False)))
+    return events
+
+
+def _move(bid: Decimal, ask: Decimal, step: int):
+    # Levels the book changes by when its touch moves by step ticks
+    moved = range(abs(step))
+    if step < 0:
+        bids = [(bid - TICK * i, Decimal(0)) for i in moved]
+        bids += [(bid - TICK * (DEPTH + i), Decimal(1)) for i in moved]
+        asks = [(ask - TICK * (i + 1), Decimal(1)) for i in moved]
+        asks += [(ask + TICK * (DEPTH - 1 - i), Decimal(0)) for i in moved]
+    else:
+        asks = [(ask + TICK * i, Decimal(0)) for i in moved]
+        asks += [(ask + TICK * (DEPTH + i), Decimal(1)) for i in moved]
+        bids = [(bid + TICK * (i + 1), Decimal(1)) for i in moved]
+        bids += [(bid - TICK * (DEPTH - 1 - i), Decimal(0)) for i in moved]
+    return bids, asks
+
+
+def main():
+    events = build_events(EVENTS)
+    rate_limits = RateLimitTracker(UNLIMITED, UNLIMITED, UNLIMITED)
+    result = Backtest(SYMBOL, ASSET, rate_limits=rate_limits).run(events)
+    print(
+        f"{result.events} events in {result.elapsed:.2f}s, "
+        f"{result.events_per_second:,.0f} events/s "
+        f"({result.events_per_second / TARGET_EVENTS_PER_SECOND:.1%} of the "
+        f"{TARGET_EVENTS_PER_SECOND:,} target), {result.trades} trades, "
+        f"{result.inserts} inserts, {result.cancels} cancels"
+    )
+
+
+if __name__ == "__main__":
+    main()
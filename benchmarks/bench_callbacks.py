@@ -0,0 +1,101 @@
+"""Book callback latency with and without per-access locking.
+
+The locked variant wraps State, strategy and handler access in a
+threading.Lock the way they were before state access was confined to the
+event loop. Run with `pipenv run python benchmarks/bench_callbacks.py`.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from contextlib import redirect_stdout
+from decimal import Decimal
+from unittest.mock import Mock
+
+from cryptofeed.types import OrderBook
+
+from message_handler import MessageHandler
+from simple_strategy import SimpleStrategy
+from state import BookSide, State
+
+SYMBOL = "BTC-USDT-PERP"
+DEPTH = 100
+ITERATIONS = 20000
+
+
+class LockedState:
+    # Proxies every attribute read through a lock, as the State properties did
+    def __init__(self, state: State):
+        self._state = state
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        with self._lock:
+            return getattr(self._state, name)
+
+    def handle_book(self, book: OrderBook) -> None:
+        with self._lock:
+            self._state.handle_book(book)
+
+
+class LockedMessageHandler(MessageHandler):
+    def __init__(self, state):
+        super().__init__(state)
+        self._lock = threading.Lock()
+
+    async def order_book_handler(self, book: OrderBook, receipt_timestamp) -> None:
+        with self._lock:
+            await super().order_book_handler(book, receipt_timestamp)
+
+
+def build_book() -> OrderBook:
+    mid = Decimal("30000")
+    tick = Decimal("0.1")
+    bids = {mid - tick * (i + 1): Decimal("1.5") for i in range(DEPTH)}
+    asks = {mid + tick * (i + 1): Decimal("1.5") for i in range(DEPTH)}
+    return OrderBook("BINANCE_FUTURES", SYMBOL, bids=bids, asks=asks)
+
+
+def run(handler: MessageHandler, book: OrderBook) -> float:
+    async def drive():
+        start = time.perf_counter()
+        for _ in range(ITERATIONS):
+            await handler.order_book_handler(book, 0)
+        return time.perf_counter() - start
+
+    return asyncio.run(drive())
+
+
+def setup(locked: bool):
+    state = State(SYMBOL, "BTCUSDT")
+    book = build_book()
+    state.handle_book(book)
+    # Subsequent updates are single level deltas at the top of the book
+    book.delta = {BookSide.BID: [book.book.bids.index(0)], BookSide.ASK: []}
+
+    strategy_state = LockedState(state) if locked else state
+    handler_class = LockedMessageHandler if locked else MessageHandler
+    handler = handler_class(strategy_state)
+    strategy = SimpleStrategy(transport=Mock(), state=strategy_state, balance_limit=1)
+    # Orders are not sent, only the decision path is measured
+    strategy._gateway = Mock()
+    handler.set_strategy(strategy)
+    return handler, book
+
+
+def main():
+    results = {}
+    # Strategy output is discarded so the terminal does not dominate timings
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        for locked in (True, False):
+            handler, book = setup(locked)
+            results[locked] = run(handler, book)
+
+    for locked, elapsed in results.items():
+        label = "locked" if locked else "loop-confined"
+        print(f"{label:>14}: {elapsed / ITERATIONS * 1e6:.2f} us per book callback")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Strategy CPU time on bursts of book updates, with and without conflation.
+
+Each burst delivers BURST top of book deltas back to back before the loop
+gets to run anything else, as when a feed catches up after a stall. Run with
+`pipenv run python benchmarks/bench_conflation.py`.
+"""
+
+import asyncio
+import time
+from decimal import Decimal
+from typing import Optional
+from unittest.mock import Mock
+
+from cryptofeed.types import OrderBook
+
+from book_scheduler import BookScheduler
+from message_handler import MessageHandler
+from simple_strategy import SimpleStrategy
+from state import BookSide, State
+
+SYMBOL = "BTC-USDT-PERP"
+DEPTH = 100
+BURST = 20
+BURSTS = 2000
+
+
+def build_book() -> OrderBook:
+    mid = Decimal("30000")
+    tick = Decimal("0.1")
+    bids = {mid - tick * (i + 1): Decimal("1.5") for i in range(DEPTH)}
+    asks = {mid + tick * (i + 1): Decimal("1.5") for i in range(DEPTH)}
+    return OrderBook("BINANCE_FUTURES", SYMBOL, bids=bids, asks=asks)
+
+
+def setup(scheduler: Optional[BookScheduler]):
+    state = State(SYMBOL, "BTCUSDT")
+    book = build_book()
+    state.handle_book(book)
+    handler = MessageHandler(state, scheduler=scheduler)
+    strategy = SimpleStrategy(transport=Mock(), state=state, balance_limit=1)
+    # Orders are not sent, only the decision path is measured
+    strategy._gateway = Mock()
+    handler.set_strategy(strategy)
+    return handler, book
+
+
+def run(handler: MessageHandler, book: OrderBook) -> float:
+    best_bid = book.book.bids.index(0)[0]
+
+    async def drive():
+        start = time.process_time()
+        for burst in range(BURSTS):
+            for update in range(BURST):
+                # The size at the best bid changes with every update
+                size = Decimal(burst * BURST + update + 1)
+                book.delta = {BookSide.BID: [(best_bid, size)], BookSide.ASK: []}
+                await handler.order_book_handler(book, 0)
+            await asyncio.sleep(0)
+        return time.process_time() - start
+
+    return asyncio.run(drive())
+
+
+def main():
+    updates = BURST * BURSTS
+    handler, book = setup(None)
+    elapsed = run(handler, book)
+    print(f"{'per update':>12}: {elapsed / updates * 1e6:.2f} us CPU per update")
+
+    scheduler = BookScheduler(max_decision_rate=None)
+    handler, book = setup(scheduler)
+    elapsed = run(handler, book)
+    print(
+        f"{'conflated':>12}: {elapsed / updates * 1e6:.2f} us CPU per update, "
+        f"{scheduler.counters}"
+    )
+
+
+if __name__ == "__main__":
+    main()
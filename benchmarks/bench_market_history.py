@@ -0,0 +1,40 @@
+"""Per-tick cost of recording into MarketHistory and of its window statistics.
+
+Run with `pipenv run python benchmarks/bench_market_history.py`.
+"""
+
+import random
+import timeit
+
+from market_history import MarketHistory
+
+ITERATIONS = 100000
+WINDOW = 60.0
+
+
+def main():
+    rng = random.Random(1)
+    history = MarketHistory()
+    clock = [0.0]
+
+    def top_changed():
+        clock[0] += 0.05
+        bid = 300000 + rng.randint(-5, 5)
+        history.top_changed(clock[0], bid, 1000, bid + 1, 1000)
+
+    def traded():
+        history.traded(clock[0], rng.choice((1, -1)), 300000, 10)
+
+    for name, call in (
+        ("top_changed", top_changed),
+        ("traded", traded),
+        ("volatility", lambda: history.volatility(WINDOW)),
+        ("trade_imbalance", lambda: history.trade_imbalance(WINDOW)),
+        ("update_rate", lambda: history.update_rate(WINDOW)),
+    ):
+        seconds = timeit.timeit(call, number=ITERATIONS)
+        print(f"{name:>16} {seconds / ITERATIONS * 1e6:>8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""ORDER_INFO events per second through the message handler, state and strategy.
+
+Every order goes through NEW, AMENDMENT and CANCELED events as the private
+feed delivers them. Run with `pipenv run python benchmarks/bench_order_info.py`.
+"""
+
+import asyncio
+import time
+from decimal import Decimal
+from typing import List
+from unittest.mock import Mock
+
+from cryptofeed.defines import BUY, LIMIT, SELL
+from cryptofeed.types import OrderInfo
+
+from message_handler import MessageHandler
+from simple_strategy import SimpleStrategy
+from state import State
+
+SYMBOL = "BTC-USDT-PERP"
+ORDERS = 20000
+REPEATS = 5
+STATUSES = [("NEW", "30000.10"), ("AMENDMENT", "30000.20"), ("CANCELED", "30000.20")]
+
+
+def build_events() -> List[OrderInfo]:
+    events = []
+    for index in range(ORDERS):
+        side = BUY if index % 2 else SELL
+        for status, price in STATUSES:
+            raw = {
+                "e": "ORDER_TRADE_UPDATE",
+                "o": {
+                    "s": "BTCUSDT",
+                    "c": f"bt-{index}",
+                    "S": side.upper(),
+                    "o": "LIMIT",
+                    "q": "0.010",
+                    "p": price,
+                    "x": status,
+                    "i": index,
+                    "z": "0",
+                },
+            }
+            events.append(
+                OrderInfo(
+                    "BINANCE_FUTURES",
+                    SYMBOL,
+                    str(index),
+                    side,
+                    status,
+                    LIMIT,
+                    None,
+                    Decimal("0.010"),
+                    Decimal("0.010"),
+                    0.0,
+                    raw=raw,
+                )
+            )
+    return events
+
+
+class NullGateway:
+    # Mock call recording would dominate the measured path
+    def flush(self) -> None:
+        pass
+
+    def cancel_order(self, order, callback) -> None:
+        pass
+
+
+def setup() -> MessageHandler:
+    state = State(SYMBOL, "BTCUSDT")
+    handler = MessageHandler(state)
+    strategy = SimpleStrategy(transport=Mock(), state=state, balance_limit=1)
+    # Orders are not sent, only the event path is measured
+    strategy._gateway = NullGateway()
+    handler.set_strategy(strategy)
+    return handler
+
+
+def run(handler: MessageHandler, events: List[OrderInfo]) -> float:
+    async def drive():
+        start = time.process_time()
+        for event in events:
+            await handler.order_info_handler(event, 0)
+        return time.process_time() - start
+
+    return asyncio.run(drive())
+
+
+def main():
+    events = build_events()
+    # Best of a few runs, each on a fresh state
+    elapsed = min(run(setup(), events) for _ in range(REPEATS))
+    print(
+        f"{len(events)} events in {elapsed:.2f}s CPU, "
+        f"{len(events) / elapsed:,.0f} events/s, "
+        f"{elapsed / len(events) * 1e6:.2f} us per event"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Per-update cost of State.handle_book as the book depth grows.
+
+Run with `pipenv run python benchmarks/bench_top_of_book.py`.
+"""
+
+import timeit
+from decimal import Decimal
+
+from cryptofeed.types import OrderBook
+
+from state import BookSide, State
+
+SYMBOL = "BTC-USDT-PERP"
+DEPTHS = [10, 100, 1000, 5000]
+ITERATIONS = 2000
+
+
+def build_book(depth: int) -> OrderBook:
+    mid = Decimal("30000")
+    tick = Decimal("0.1")
+    bids = {mid - tick * (i + 1): Decimal("1.5") for i in range(depth)}
+    asks = {mid + tick * (i + 1): Decimal("1.5") for i in range(depth)}
+    return OrderBook("BINANCE_FUTURES", SYMBOL, bids=bids, asks=asks)
+
+
+def to_dict_top_of_book(book: OrderBook) -> None:
+    # Previous implementation, kept for comparison
+    book_dict = book.to_dict()
+    list(book_dict["book"][BookSide.BID].items())[0]
+    list(book_dict["book"][BookSide.ASK].items())[0]
+
+
+def main():
+    print(f"{'depth':>8} {'to_dict (us)':>14} {'handle_book (us)':>18}")
+    for depth in DEPTHS:
+        state = State(SYMBOL, "BTCUSDT")
+        book = build_book(depth)
+        state.handle_book(book)
+
+        # Subsequent updates are deltas touching a single level at the top
+        best_bid = book.book.bids.index(0)
+        book.delta = {BookSide.BID: [best_bid], BookSide.ASK: []}
+        old = timeit.timeit(lambda: to_dict_top_of_book(book), number=ITERATIONS)
+        new = timeit.timeit(lambda: state.handle_book(book), number=ITERATIONS)
+        print(
+            f"{depth:>8} {old / ITERATIONS * 1e6:>14.2f} "
+            f"{new / ITERATIONS * 1e6:>18.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+import argparse
+from dataclasses import dataclass
+from typing import Dict, Sequence
+
+import numpy as np
+from cryptofeed.defines import L2_BOOK, ORDER_INFO
+
+from instrument import Instrument
+from local_book import BookSide, LocalBook
+from market_data import (
+    EVENT_START,
+    ORDER_STATUSES,
+    PRICE_SCALE,
+    SIZE_SCALE,
+    SNAPSHOT,
+    MarketDataReader,
+)
+from market_history import ORDER_EVENTS, MarketHistory
+
+# Seconds after each fill the mid is marked at
+MARKOUT_HORIZONS = (1.0, 5.0, 30.0)
+
+TRADE_STATUS = ORDER_STATUSES.index("TRADE")
+QUOTE_STATUSES = (ORDER_STATUSES.index("NEW"), ORDER_STATUSES.index("AMENDMENT"))
+
+
+@dataclass
+class BookSeries:
+    """Top of the book after every book event, one array element per event.
+
+    Prices and sizes are floats in instrument units, NaN while a side of the
+    book is empty. Derived series are computed over the whole arrays.
+    """
+
+    timestamp: np.ndarray
+    bid: np.ndarray
+    ask: np.ndarray
+    bid_size: np.ndarray
+    ask_size: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    @property
+    def mid(self) -> np.ndarray:
+        return (self.bid + self.ask) / 2
+
+    @property
+    def spread(self) -> np.ndarray:
+        return self.ask - self.bid
+
+    @property
+    def microprice(self) -> np.ndarray:
+        # Mid weighted towards the side with less size, where price moves next
+        return (self.bid * self.ask_size + self.ask * self.bid_size) / (
+            self.bid_size + self.ask_size
+        )
+
+    def mid_at(self, timestamps: np.ndarray) -> np.ndarray:
+        # Mid of the last book at or before each timestamp, NaN before the
+        # first book and after the last one
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if not len(self):
+            return np.full(timestamps.shape, np.nan)
+        index = np.searchsorted(self.timestamp, timestamps, side="right") - 1
+        valid = (index >= 0) & (timestamps <= self.timestamp[-1])
+        return np.where(valid, self.mid[np.maximum(index, 0)], np.nan)
+
+
+@dataclass
+class FillSeries:
+    """Our fills in time order, side is 1 for buys and -1 for sells."""
+
+    timestamp: np.ndarray
+    side: np.ndarray
+    price: np.ndarray
+    size: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    @property
+    def signed_size(self) -> np.ndarray:
+        return self.side * self.size
+
+    @property
+    def inventory(self) -> np.ndarray:
+        # Position after each fill, starting flat
+        return np.cumsum(self.signed_size)
+
+
+def book_series_from_recording(reader: MarketDataReader) -> BookSeries:
+    """Replays the recorded book rows into the top of book per event.
+
+    The book is stateful, so this is one sequential pass over the rows on
+    the scaled integers as recorded. Everything computed from its result is
+    vectorized.
+    """
+    columns = reader.read(L2_BOOK)
+    flags = columns["flags"]
+    starts = np.flatnonzero(flags & EVENT_START)
+    ends = np.append(starts[1:], len(flags))
+    top = np.full((len(starts), 4), -1, dtype=np.int64)
+
+    # Rows are applied as the recorded integers, the instrument is not used
+    book = LocalBook(Instrument(reader.symbol(L2_BOOK)))
+    sides = [BookSide.BID if side > 0 else BookSide.ASK for side in columns["side"]]
+    prices = columns["price"].tolist()
+    sizes = columns["size"].tolist()
+    snapshots = (flags[starts] & SNAPSHOT).tolist()
+    for event, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+        if snapshots[event]:
+            book.reset({}, {})
+        for row in range(start, end):
+            book.update(sides[row], prices[row], sizes[row])
+        best_bid = book.best(BookSide.BID)
+        best_ask = book.best(BookSide.ASK)
+        if best_bid is not None:
+            top[event, 0:2] = best_bid
+        if best_ask is not None:
+            top[event, 2:4] = best_ask
+
+    empty = top < 0
+    top = top.astype(np.float64)
+    top[:, (0, 2)] /= PRICE_SCALE
+    top[:, (1, 3)] /= SIZE_SCALE
+    top[empty] = np.nan
+    return BookSeries(
+        timestamp=columns["receipt_timestamp"][starts] / 1e9,
+        bid=top[:, 0],
+        ask=top[:, 2],
+        bid_size=top[:, 1],
+        ask_size=top[:, 3],
+    )
+
+
+def fill_series_from_recording(reader: MarketDataReader) -> FillSeries:
+    # Order events carry the cumulative filled size, each fill is the step
+    # from the previous event of the same order
+    columns = reader.read(ORDER_INFO)
+    trades = columns["status"] == TRADE_STATUS
+    order_ids = columns["order_id"][trades]
+    filled = columns["filled"][trades]
+    by_order = np.lexsort((np.arange(len(order_ids)), order_ids))
+    previous = np.zeros_like(filled)
+    sorted_ids = order_ids[by_order]
+    sorted_filled = filled[by_order]
+    same_order = sorted_ids[1:] == sorted_ids[:-1]
+    previous[by_order[1:]] = np.where(same_order, sorted_filled[:-1], 0)
+    return FillSeries(
+        timestamp=columns["receipt_timestamp"][trades] / 1e9,
+        side=columns["side"][trades].astype(np.int64),
+        price=columns["price"][trades] / PRICE_SCALE,
+        size=(filled - previous) / SIZE_SCALE,
+    )
+
+
+def book_series_from_history(
+    history: MarketHistory, instrument: Instrument
+) -> BookSeries:
+    # Copies of the in-memory top of book changes, in instrument units
+    book = history.book
+    tick_size = float(instrument.tick_size)
+    step_size = float(instrument.step_size)
+    return BookSeries(
+        timestamp=book.column("timestamp").copy(),
+        bid=book.column("bid") * tick_size,
+        ask=book.column("ask") * tick_size,
+        bid_size=book.column("bid_size") * step_size,
+        ask_size=book.column("ask_size") * step_size,
+    )
+
+
+def fill_series_from_history(
+    history: MarketHistory, instrument: Instrument
+) -> FillSeries:
+    orders = history.orders
+    trades = orders.column("status") == ORDER_EVENTS.index("TRADE")
+    trades &= orders.column("filled") > 0
+    return FillSeries(
+        timestamp=orders.column("timestamp")[trades],
+        side=orders.column("side")[trades].astype(np.int64),
+        price=orders.column("price")[trades] * float(instrument.tick_size),
+        size=orders.column("filled")[trades] * float(instrument.step_size),
+    )
+
+
+def quote_distances(reader: MarketDataReader, book: BookSeries) -> np.ndarray:
+    # Distance of each new or amended order behind the mid, in price units
+    columns = reader.read(ORDER_INFO)
+    quotes = np.isin(columns["status"], QUOTE_STATUSES)
+    timestamps = columns["receipt_timestamp"][quotes] / 1e9
+    side = columns["side"][quotes]
+    price = columns["price"][quotes] / PRICE_SCALE
+    return side * (book.mid_at(timestamps) - price)
+
+
+def markouts(
+    book: BookSeries, fills: FillSeries, horizons: Sequence[float] = MARKOUT_HORIZONS
+) -> np.ndarray:
+    """Profit per unit of each fill marked at the mid horizons later.
+
+    One row per fill and one column per horizon, NaN where the horizon runs
+    past the end of the book.
+    """
+    later = fills.timestamp[:, None] + np.asarray(horizons)[None, :]
+    return fills.side[:, None] * (book.mid_at(later) - fills.price[:, None])
+
+
+def fill_statistics(
+    book: BookSeries, fills: FillSeries, horizons: Sequence[float] = MARKOUT_HORIZONS
+) -> Dict[str, float]:
+    """Size weighted spread capture of our fills.
+
+    The edge is the distance to the mid at the fill, realized spread the
+    markout after each horizon and adverse selection the part of the edge
+    the mid took back, so edge = realized spread + adverse selection.
+    """
+    if not len(fills):
+        return {"fills": 0}
+    edge = fills.side * (book.mid_at(fills.timestamp) - fills.price)
+    realized = markouts(book, fills, horizons)
+    weights = fills.size
+    statistics = {
+        "fills": len(fills),
+        "volume": float(weights.sum()),
+        "edge": _weighted_mean(edge, weights),
+    }
+    for column, horizon in enumerate(horizons):
+        statistics[f"realized_spread_{horizon:g}s"] = _weighted_mean(
+            realized[:, column], weights
+        )
+        statistics[f"adverse_selection_{horizon:g}s"] = _weighted_mean(
+            edge - realized[:, column], weights
+        )
+    return statistics
+
+
+def inventory_statistics(
+    fills: FillSeries, start: float, end: float
+) -> Dict[str, float]:
+    # Inventory as a step function over [start, end], starting flat
+    times = np.concatenate(([start], fills.timestamp, [end]))
+    inventory = np.concatenate(([0.0], fills.inventory))
+    durations = np.diff(np.clip(times, start, end))
+    total = durations.sum()
+    if total <= 0:
+        return {"duration": 0.0}
+    flat = durations[inventory == 0].sum()
+    return {
+        "duration": float(total),
+        "mean": float(np.dot(inventory, durations) / total),
+        "mean_absolute": float(np.dot(np.abs(inventory), durations) / total),
+        "max_absolute": float(np.abs(inventory).max()),
+        "time_flat": float(flat / total),
+    }
+
+
+def analyze(
+    directory: str, horizons: Sequence[float] = MARKOUT_HORIZONS
+) -> Dict[str, Dict[str, float]]:
+    reader = MarketDataReader(directory)
+    try:
+        book = book_series_from_recording(reader)
+        fills = fill_series_from_recording(reader)
+        distances = quote_distances(reader, book)
+    finally:
+        reader.close()
+
+    if not len(book):
+        return {}
+    spread = book.spread
+    return {
+        "book": {
+            "events": len(book),
+            "duration": float(book.timestamp[-1] - book.timestamp[0]),
+            "mean_spread": float(np.nanmean(spread)),
+            "median_spread": float(np.nanmedian(spread)),
+            "mean_microprice_offset": float(np.nanmean(book.microprice - book.mid)),
+        },
+        "quotes": {
+            "quotes": len(distances),
+            "mean_distance": _mean(distances),
+            "median_distance": (
+                float(np.nanmedian(distances)) if len(distances) else 0.0
+            ),
+        },
+        "fills": fill_statistics(book, fills, horizons),
+        "inventory": inventory_statistics(
+            fills, float(book.timestamp[0]), float(book.timestamp[-1])
+        ),
+    }
+
+
+def _weighted_mean(values: np.ndarray, weights: np.ndarray) -> float:
+    valid = ~np.isnan(values)
+    total = weights[valid].sum()
+    return float(np.dot(values[valid], weights[valid]) / total) if total else 0.0
+
+
+def _mean(values: np.ndarray) -> float:
+    return float(np.nanmean(values)) if len(values) else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Spread capture, markouts and inventory of a market data recording"
+    )
+    parser.add_argument("directory", help="market data recorder output")
+    parser.add_argument(
+        "--horizons",
+        type=float,
+        nargs="+",
+        default=MARKOUT_HORIZONS,
+        help="markout horizons in seconds",
+    )
+    args = parser.parse_args()
+
+    for section, statistics in analyze(args.directory, args.horizons).items():
+        print(section)
+        for name, value in statistics.items():
+            print(f"  {name:28} {value:.6g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+import asyncio
+import itertools
+import json
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cryptofeed.defines import (
+    BUY,
+    DELETE,
+    GET,
+    L2_BOOK,
+    LIMIT,
+    ORDER_INFO,
+    POSITIONS,
+    POST,
+    PUT,
+    SELL,
+    TRADES,
+)
+from cryptofeed.types import OrderBook, OrderInfo, Position
+
+from instrument import Instrument
+from local_book import BookSide, LocalBook
+from message_handler import MessageHandler
+from order import BATCH_ORDERS, ORDER, OrderRejectedError
+from rate_limits import RateLimitTracker
+from replay import EXCHANGE, MARKET_CHANNELS, ReplayEvent
+from sandbox_get_override import ACCOUNT, ALL_OPEN_ORDER, SANDBOX_REST_ORDER
+from simple_strategy import SimpleStrategy
+from state import State
+
+UNKNOWN_ORDER = (-2011, "Unknown order sent.")
+
+# REST responses are already resolved futures, the callbacks chained on them
+# need at most this many loop iterations to run, batches taking the most
+SETTLE_ITERATIONS = 2
+
+
+class SimulatedExchange:
+    """Stands in for OrderTransport, matching orders against replayed books.
+
+    REST requests are applied as soon as they are issued and answered with
+    the responses the exchange would give. Resting orders are filled in full
+    at their price once the opposite side of the book touches or crosses it,
+    orders crossing the book on entry are filled at the touch. The resulting
+    ORDER_INFO and POSITIONS events are queued until the replay delivers them.
+    """
+
+    def __init__(
+        self,
+        symbol: str,
+        instrument: Instrument = None,
+        rate_limits: RateLimitTracker = None,
+    ):
+        self._symbol = symbol
+        self._instrument = instrument or Instrument(symbol)
+        self._book = LocalBook(self._instrument)
+        self._orders: Dict[str, Dict] = {}
+        self._order_ids = itertools.count(1)
+        self._events: List[Tuple[str, object]] = []
+        self._timestamp = 0.0
+        # Budgets refill in replay time, so throttling replays deterministically
+        self._rate_limits = rate_limits or RateLimitTracker(
+            clock=lambda: self._timestamp
+        )
+        self._requests = 0
+        self._position = Decimal(0)
+        self._cash = Decimal(0)
+        self._trades = 0
+        self._volume = Decimal(0)
+        self._max_position = Decimal(0)
+        self._inserts = 0
+        self._modifies = 0
+        self._cancels = 0
+
+    @property
+    def book(self) -> LocalBook:
+        return self._book
+
+    @property
+    def open_orders(self) -> int:
+        return len(self._orders)
+
+    @property
+    def position(self) -> Decimal:
+        return self._position
+
+    @property
+    def cash(self) -> Decimal:
+        return self._cash
+
+    @property
+    def trades(self) -> int:
+        return self._trades
+
+    @property
+    def volume(self) -> Decimal:
+        return self._volume
+
+    @property
+    def max_position(self) -> Decimal:
+        # Largest absolute position held during the replay
+        return self._max_position
+
+    @property
+    def inserts(self) -> int:
+        return self._inserts
+
+    @property
+    def modifies(self) -> int:
+        return self._modifies
+
+    @property
+    def cancels(self) -> int:
+        return self._cancels
+
+    @property
+    def rate_limits(self) -> RateLimitTracker:
+        return self._rate_limits
+
+    @property
+    def is_busy(self) -> bool:
+        # Requests were issued or events are waiting to be delivered
+        return bool(self._requests or self._events)
+
+    def exchange_symbol(self, symbol: str) -> str:
+        return symbol
+
+    def instrument(self, symbol: str) -> Instrument:
+        return self._instrument
+
+    def set_timestamp(self, timestamp: float) -> None:
+        self._timestamp = timestamp
+
+    def apply_book(self, book: OrderBook) -> None:
+        self._book.apply(book)
+        self.__match_resting()
+
+    def take_events(self) -> List[Tuple[str, object]]:
+        events, self._events = self._events, []
+        self._requests = 0
+        return events
+
+    def mark_to_market(self) -> Decimal:
+        best_bid = self._book.best(BookSide.BID)
+        best_ask = self._book.best(BookSide.ASK)
+        if best_bid is None or best_ask is None:
+            return self._cash
+        mid = self._instrument.price(best_bid[0] + best_ask[0]) / 2
+        return self._cash + self._position * mid
+
+    def request(
+        self,
+        method: str,
+        endpoint: str,
+        payload: Dict = None,
+        auth: bool = True,
+        api: str = SANDBOX_REST_ORDER,
+    ):
+        # Applied synchronously so the replay is deterministic, the caller
+        # receives a resolved future rather than a coroutine to be scheduled
+        self._requests += 1
+        response = asyncio.get_event_loop().create_future()
+        try:
+            response.set_result(self.__handle(method, endpoint, payload or {}))
+        except OrderRejectedError as error:
+            response.set_exception(error)
+        return response
+
+    def __handle(self, method: str, endpoint: str, payload: Dict):
+        if endpoint == ORDER:
+            if method == POST:
+                return self.__insert(payload)
+            if method == PUT:
+                return self.__modify(payload)
+            if method == DELETE:
+                return self.__cancel(str(payload["orderId"]))
+        if endpoint == BATCH_ORDERS:
+            if method == DELETE:
+                order_ids = json.loads(payload["orderIdList"])
+                return [self.__batch_result(self.__cancel, str(i)) for i in order_ids]
+            requests = json.loads(payload["batchOrders"])
+            handler = self.__insert if method == POST else self.__modify
+            return [self.__batch_result(handler, request) for request in requests]
+        if endpoint == ALL_OPEN_ORDER and method == DELETE:
+            for order_id in list(self._orders):
+                self.__cancel(order_id)
+            return {
+                "code": 200,
+                "msg": "The operation of cancel all open order is done.",
+            }
+        if endpoint == ACCOUNT and method == GET:
+            return {
+                "positions": [
+                    {"symbol": self._symbol, "positionAmt": str(self._position)}
+                ]
+            }
+        return {}
+
+    def __batch_result(self, handler, request) -> Dict:
+        try:
+            return handler(request)
+        except OrderRejectedError as error:
+            return {"code": error.code, "msg": error.message}
+
+    def __insert(self, request: Dict) -> Dict:
+        self._inserts += 1
+        order_id = str(next(self._order_ids))
+        order = {
+            "id": order_id,
+            "client_order_id": request.get("newClientOrderId", ""),
+            "side": BUY if request["side"] == "BUY" else SELL,
+            "price": self._instrument.parse_price(request["price"]),
+            "size": self._instrument.parse_size(request["quantity"]),
+        }
+        self._orders[order_id] = order
+        self.__order_event(order, "NEW")
+        touch = self.__touch(order)
+        if touch is not None:
+            self.__fill(order, touch)
+        return {"orderId": int(order_id), "clientOrderId": order["client_order_id"]}
+
+    def __modify(self, request: Dict) -> Dict:
+        self._modifies += 1
+        order = self._orders.get(str(request["orderId"]))
+        if order is None:
+            raise OrderRejectedError(*UNKNOWN_ORDER)
+        order["price"] = self._instrument.parse_price(request["price"])
+        order["size"] = self._instrument.parse_size(request["quantity"])
+        self.__order_event(order, "AMENDMENT")
+        touch = self.__touch(order)
+        if touch is not None:
+            self.__fill(order, touch)
+        return {"orderId": int(order["id"])}
+
+    def __cancel(self, order_id: str) -> Dict:
+        self._cancels += 1
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            raise OrderRejectedError(*UNKNOWN_ORDER)
+        self.__order_event(order, "CANCELED")
+        return {"orderId": int(order_id)}
+
+    def __match_resting(self) -> None:
+        if not self._orders:
+            return
+        for order in list(self._orders.values()):
+            if self.__touch(order) is not None:
+                self.__fill(order, order["price"])
+
+    def __touch(self, order: Dict) -> Optional[int]:
+        # Best opposite price if it touches or crosses the order price
+        if order["side"] == BUY:
+            best_ask = self._book.best(BookSide.ASK)
+            if best_ask is not None and best_ask[0] <= order["price"]:
+                return best_ask[0]
+        else:
+            best_bid = self._book.best(BookSide.BID)
+            if best_bid is not None and best_bid[0] >= order["price"]:
+                return best_bid[0]
+        return None
+
+    def __fill(self, order: Dict, ticks: int) -> None:
+        del self._orders[order["id"]]
+        size = self._instrument.size(order["size"])
+        price = self._instrument.price(ticks)
+        signed_size = size if order["side"] == BUY else -size
+        self._position += signed_size
+        self._max_position = max(self._max_position, abs(self._position))
+        self._cash -= signed_size * price
+        self._trades += 1
+        self._volume += size
+        self.__order_event(order, "TRADE", filled=order["size"])
+        self._events.append(
+            (
+                POSITIONS,
+                Position(
+                    EXCHANGE,
+                    self._symbol,
+                    self._position,
+                    price,
+                    "both",
+                    Decimal(0),
+                    self._timestamp,
+                ),
+            )
+        )
+
+    def __order_event(self, order: Dict, status: str, filled: int = 0) -> None:
+        # Same fields as the user data stream order update cryptofeed parses
+        instrument = self._instrument
+        raw = {
+            "o": {
+                "c": order["client_order_id"],
+                "p": instrument.format_price(order["price"]),
+                "q": instrument.format_size(order["size"]),
+                "z": instrument.format_size(filled),
+                "X": "FILLED" if status == "TRADE" else status,
+            }
+        }
+        order_info = OrderInfo(
+            EXCHANGE,
+            self._symbol,
+            order["id"],
+            order["side"],
+            status,
+            LIMIT,
+            instrument.price(order["price"]),
+            instrument.size(order["size"]),
+            instrument.size(order["size"] - filled),
+            self._timestamp,
+            raw=raw,
+        )
+        self._events.append((ORDER_INFO, order_info))
+
+
+@dataclass
+class BacktestResult:
+    events: int
+    elapsed: float
+    trades: int
+    volume: Decimal
+    position: Decimal
+    pnl: Decimal
+    max_position: Decimal = Decimal(0)
+    inserts: int = 0
+    modifies: int = 0
+    cancels: int = 0
+
+    @property
+    def events_per_second(self) -> float:
+        return self.events / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def fill_rate(self) -> float:
+        # Share of inserted orders that were filled
+        return self.trades / self.inserts if self.inserts else 0.0
+
+
+class Backtest:
+    """Replays recorded events through MessageHandler against a simulation.
+
+    The strategy is wired exactly as in main.py, except that its transport
+    is a SimulatedExchange. Events are replayed as fast as possible, and the
+    order events the simulation produces are delivered before the next
+    recorded event, so a run only depends on its input.
+
+    Recorded POSITIONS and ORDER_INFO events are those of the live account
+    the recording was made with, they are skipped so the simulated account
+    only sees its own. With replay_account they are passed through instead,
+    for replaying the recorded account without simulated orders of its own.
+    Orders are throttled by the exchange's default rate limits in replay time
+    unless other rate_limits are given.
+    """
+
+    def __init__(
+        self,
+        symbol: str,
+        asset: str,
+        balance_limit: float = 1,
+        initial_position: float = 0,
+        instrument: Instrument = None,
+        replay_account: bool = False,
+        rate_limits: RateLimitTracker = None,
+        **strategy_options,
+    ):
+        self._symbol = symbol
+        self._replay_account = replay_account
+        instrument = instrument or Instrument(symbol)
+        self._exchange = SimulatedExchange(symbol, instrument, rate_limits)
+        self._state = State(symbol, asset, instrument)
+        self._state.initialize_balance(initial_position)
+        self._handler = MessageHandler(self._state)
+        self._strategy = SimpleStrategy(
+            transport=self._exchange,
+            state=self._state,
+            balance_limit=balance_limit,
+            **strategy_options,
+        )
+        self._handler.set_strategy(self._strategy)
+        self._book: Optional[OrderBook] = None
+
+    @property
+    def exchange(self) -> SimulatedExchange:
+        return self._exchange
+
+    @property
+    def state(self) -> State:
+        return self._state
+
+    @property
+    def strategy(self) -> SimpleStrategy:
+        return self._strategy
+
+    def run(self, events: Iterable[ReplayEvent]) -> BacktestResult:
+        return asyncio.run(self.replay(events))
+
+    async def replay(self, events: Iterable[ReplayEvent]) -> BacktestResult:
+        count = 0
+        start = time.perf_counter()
+        for timestamp, channel, payload in events:
+            if channel not in MARKET_CHANNELS and not self._replay_account:
+                continue
+            count += 1
+            self._exchange.set_timestamp(timestamp)
+            if channel == L2_BOOK:
+                book = self.__book_update(timestamp, *payload)
+                # Resting orders are matched before the strategy sees the book
+                self._exchange.apply_book(book)
+                await self.__settle()
+                await self._handler.order_book_handler(book, timestamp)
+            elif channel == TRADES:
+                await self._handler.trades_handler(payload, timestamp)
+            elif channel == POSITIONS:
+                await self._handler.positions_handler(payload, timestamp)
+            elif channel == ORDER_INFO:
+                await self._handler.order_info_handler(payload, timestamp)
+            await self.__settle()
+
+        return BacktestResult(
+            events=count,
+            elapsed=time.perf_counter() - start,
+            trades=self._exchange.trades,
+            volume=self._exchange.volume,
+            position=self._exchange.position,
+            pnl=self._exchange.mark_to_market(),
+            max_position=self._exchange.max_position,
+            inserts=self._exchange.inserts,
+            modifies=self._exchange.modifies,
+            cancels=self._exchange.cancels,
+        )
+
+    def __book_update(
+        self,
+        timestamp: float,
+        bids: List[Tuple[Decimal, Decimal]],
+        asks: List[Tuple[Decimal, Decimal]],
+        is_snapshot: bool,
+    ) -> OrderBook:
+        # Deltas reuse one book object, only snapshots build a new one
+        if is_snapshot or self._book is None:
+            self._book = OrderBook(
+                EXCHANGE, self._symbol, bids=dict(bids), asks=dict(asks)
+            )
+            self._book.delta = None
+        else:
+            self._book.delta = {BookSide.BID: bids, BookSide.ASK: asks}
+        self._book.timestamp = timestamp
+        return self._book
+
+    async def __settle(self) -> None:
+        while self._exchange.is_busy:
+            for _ in range(SETTLE_ITERATIONS):
+                await asyncio.sleep(0)
+            for channel, event in self._exchange.take_events():
+                if channel == ORDER_INFO:
+                    await self._handler.order_info_handler(event, event.timestamp)
+                else:
+                    await self._handler.positions_handler(event, event.timestamp)
@@ -0,0 +1,95 @@
+import asyncio
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from local_book import BookSide
+
+# Upper bound on strategy decisions per second per symbol
+MAX_DECISION_RATE = 200
+
+
+class BookScheduler:
+    """Runs the strategy once per burst of book updates.
+
+    Book updates are applied to the state as they arrive, the decision is only
+    scheduled on the event loop. Every update received before the loop gets
+    to it is conflated into that one decision, which then sees the latest
+    book. Decisions are spaced at least 1 / max_decision_rate apart, and with
+    top_of_book_only a decision is skipped unless the best bid or ask, price
+    or size, changed since the last one or an order event invalidated it.
+    """
+
+    def __init__(
+        self,
+        max_decision_rate: Optional[float] = MAX_DECISION_RATE,
+        top_of_book_only: bool = True,
+    ):
+        self._min_interval = 1 / max_decision_rate if max_decision_rate else 0.0
+        self._top_of_book_only = top_of_book_only
+        self._decide: Optional[Callable[[], None]] = None
+        self._top_market: Optional[Callable[[], Dict]] = None
+        self._pending: Optional[asyncio.Handle] = None
+        self._last_decision = float("-inf")
+        self._last_top: Optional[Tuple] = None
+        self._invalidated = True
+        self._waiting = 0
+        self._updates = 0
+        self._decisions = 0
+        self._conflated = 0
+        self._filtered = 0
+
+    @property
+    def counters(self) -> Dict[str, int]:
+        return {
+            "updates": self._updates,
+            "decisions": self._decisions,
+            "conflated": self._conflated,
+            "filtered": self._filtered,
+        }
+
+    @property
+    def is_pending(self) -> bool:
+        return self._pending is not None
+
+    def bind(self, decide: Callable[[], None], top_market: Callable[[], Dict]) -> None:
+        self._decide = decide
+        self._top_market = top_market
+
+    def book_updated(self) -> None:
+        self._updates += 1
+        self._waiting += 1
+        if self._pending is not None or self._decide is None:
+            return
+
+        loop = asyncio.get_running_loop()
+        delay = self._last_decision + self._min_interval - time.monotonic()
+        if delay > 0:
+            self._pending = loop.call_later(delay, self.__run)
+        else:
+            self._pending = loop.call_soon(self.__run)
+
+    def invalidate(self) -> None:
+        # Our orders changed, the next decision runs even on an unchanged top
+        self._invalidated = True
+
+    def cancel(self) -> None:
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+
+    def __run(self) -> None:
+        self._pending = None
+        self._conflated += self._waiting - 1
+        self._waiting = 0
+
+        top_market = self._top_market()
+        top = (top_market.get(BookSide.BID), top_market.get(BookSide.ASK))
+        if self._top_of_book_only and not self._invalidated and top == self._last_top:
+            self._filtered += 1
+            return
+
+        self._last_top = top
+        self._invalidated = False
+        self._last_decision = time.monotonic()
+        self._decisions += 1
+        self._decide()
@@ -0,0 +1,138 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+LOGGER_NAME = "strategy"
+DEFAULT_RATE_LIMIT_INTERVAL = 1.0
+RATE_LIMIT_MAX_ENTRIES = 10000
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Queue handler that leaves all formatting to the writer thread.
+
+    The stock QueueHandler formats the message in the calling thread before
+    enqueueing it. Here the record is enqueued untouched, the message template
+    and its arguments are only merged by the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """Drops repeats of an identical message within an interval.
+
+    The number of dropped repeats is attached to the next record let through
+    as `suppressed`, so bursts stay visible in the output.
+    """
+
+    def __init__(
+        self,
+        interval: float = DEFAULT_RATE_LIMIT_INTERVAL,
+        max_entries: int = RATE_LIMIT_MAX_ENTRIES,
+    ):
+        super().__init__()
+        self._interval = interval
+        self._max_entries = max_entries
+        self._last_seen: Dict[Tuple, float] = {}
+        self._suppressed: Dict[Tuple, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Keyed on the template and its arguments, nothing is formatted here
+        key = (record.levelno, record.msg, record.args)
+        now = record.created
+        try:
+            last_seen = self._last_seen.get(key)
+        except TypeError:
+            # Unhashable arguments are never rate limited
+            return True
+        if last_seen is not None and now - last_seen < self._interval:
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return False
+
+        if len(self._last_seen) >= self._max_entries:
+            self.__expire(now)
+        self._last_seen[key] = now
+        record.suppressed = self._suppressed.pop(key, 0)
+        return True
+
+    def __expire(self, now: float) -> None:
+        expired = [
+            key
+            for key, last_seen in self._last_seen.items()
+            if now - last_seen >= self._interval
+        ]
+        for key in expired:
+            del self._last_seen[key]
+            self._suppressed.pop(key, None)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            "ts": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            event["suppressed"] = suppressed
+        if record.exc_info:
+            event["exc"] = self.formatException(record.exc_info)
+        return json.dumps(event, separators=(",", ":"))
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text = f"{text} ({suppressed} similar messages suppressed)"
+        return text
+
+
+def setup_logging(
+    level: str = "INFO",
+    filename: Optional[str] = None,
+    json_lines: bool = False,
+    rate_limit_interval: float = DEFAULT_RATE_LIMIT_INTERVAL,
+) -> QueueListener:
+    """Routes strategy logging through a queue to a background writer thread.
+
+    Callers only pay for the level check, the rate limit lookup and an
+    enqueue; formatting and I/O happen on the listener thread.
+    """
+    if filename:
+        output = logging.FileHandler(filename)
+    else:
+        output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonLinesFormatter() if json_lines else TextFormatter())
+
+    records = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+    if rate_limit_interval > 0:
+        handler.addFilter(RateLimitFilter(rate_limit_interval))
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    logger.propagate = False
+    for existing in list(logger.handlers):
+        logger.removeHandler(existing)
+    logger.addHandler(handler)
+
+    listener = QueueListener(records, output, respect_handler_level=False)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
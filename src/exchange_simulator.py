@@ -0,0 +1,934 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import ssl
+import time
+from bisect import bisect_left
+from collections import deque
+from decimal import Decimal
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from aiohttp import WSMsgType, web
+from cryptofeed.defines import BUY, SELL
+
+from event_log import get_logger, setup_logging
+
+HOST = "127.0.0.1"
+PORT = 8765
+TLS_PORT = 8766
+SYMBOLS = {"BTCUSDT": Decimal("30000")}
+QUOTE_ASSET = "USDT"
+TICK_SIZE = Decimal("0.1")
+STEP_SIZE = Decimal("0.001")
+INITIAL_BALANCE = Decimal("10000")
+
+# Background flow, in book messages per second
+MESSAGES_PER_SECOND = 1000
+FLOW_INTERVAL = 0.01
+FLOW_DEPTH = 20
+FLOW_MIN_LEVELS = 10
+FLOW_SIZES = (Decimal("0.001"), Decimal("0.01"), Decimal("0.1"), Decimal("1"))
+
+# Binance futures default limits
+WEIGHT_PER_MINUTE = 2400
+ORDERS_PER_10_SECONDS = 300
+DEPTH_WEIGHTS = ((50, 2), (100, 5), (500, 10))
+MAX_DEPTH_WEIGHT = 20
+REQUEST_WEIGHTS = {
+    "batchOrders": 5,
+    "account": 5,
+    "openOrders": 1,
+    "allOpenOrders": 1,
+}
+
+UNKNOWN_ORDER = (-2011, "Unknown order sent.")
+TOO_MANY_REQUESTS = (-1003, "Too many requests; current limit is exceeded.")
+TOO_MANY_ORDERS = (-1015, "Too many new orders; current limit is exceeded.")
+BAD_PARAMETER = (-1102, "Mandatory parameter was not sent or was malformed.")
+
+USER = "user"
+
+LOG = get_logger(__name__)
+
+
+class SimulatedOrder:
+    __slots__ = (
+        "order_id",
+        "client_order_id",
+        "symbol",
+        "side",
+        "price",
+        "quantity",
+        "filled",
+        "notional",
+        "owner",
+        "updated",
+    )
+
+    def __init__(
+        self,
+        order_id: int,
+        client_order_id: str,
+        symbol: str,
+        side: str,
+        price: Decimal,
+        quantity: Decimal,
+        owner: Optional[str],
+    ):
+        self.order_id = order_id
+        self.client_order_id = client_order_id
+        self.symbol = symbol
+        self.side = side
+        self.price = price
+        self.quantity = quantity
+        self.filled = Decimal(0)
+        self.notional = Decimal(0)
+        self.owner = owner
+        self.updated = 0
+
+    @property
+    def remaining(self) -> Decimal:
+        return self.quantity - self.filled
+
+    @property
+    def average_price(self) -> Decimal:
+        return self.notional / self.filled if self.filled else Decimal(0)
+
+
+# Resting order, aggressing order, price and quantity of one execution
+Fill = Tuple[SimulatedOrder, SimulatedOrder, Decimal, Decimal]
+
+
+class MatchingEngine:
+    """Limit order book for one symbol with price-time priority.
+
+    Each price level is a FIFO queue of resting orders. Incoming orders are
+    matched against the opposite side from the best price outwards and the
+    remainder rests at the back of its level. Levels whose total size changed
+    are collected for the next depth update.
+    """
+
+    def __init__(self, symbol: str):
+        self._symbol = symbol
+        self._queues: Dict[str, Dict[Decimal, Deque[SimulatedOrder]]] = {
+            BUY: {},
+            SELL: {},
+        }
+        self._sizes: Dict[str, Dict[Decimal, Decimal]] = {BUY: {}, SELL: {}}
+        self._prices: Dict[str, List[Decimal]] = {BUY: [], SELL: []}
+        self._orders: Dict[int, SimulatedOrder] = {}
+        self._changed: Dict[str, Set[Decimal]] = {BUY: set(), SELL: set()}
+        self._update_id = 0
+
+    @property
+    def symbol(self) -> str:
+        return self._symbol
+
+    @property
+    def update_id(self) -> int:
+        return self._update_id
+
+    def get(self, order_id: int) -> Optional[SimulatedOrder]:
+        return self._orders.get(order_id)
+
+    def orders(self, owner: str = None) -> List[SimulatedOrder]:
+        return [order for order in self._orders.values() if order.owner == owner]
+
+    def best(self, side: str) -> Optional[Decimal]:
+        prices = self._prices[side]
+        if not prices:
+            return None
+        return prices[-1] if side == BUY else prices[0]
+
+    def level_count(self, side: str) -> int:
+        return len(self._prices[side])
+
+    def depth(self, limit: int) -> Tuple[List, List]:
+        bids = self._prices[BUY][: -limit - 1 : -1]
+        asks = self._prices[SELL][:limit]
+        return (
+            [(price, self._sizes[BUY][price]) for price in bids],
+            [(price, self._sizes[SELL][price]) for price in asks],
+        )
+
+    def submit(self, order: SimulatedOrder, rest: bool = True) -> List[Fill]:
+        # Orders that are not rested are immediate or cancel
+        fills = self.__match(order)
+        if rest and order.remaining > 0:
+            self.__rest(order)
+        return fills
+
+    def cancel(self, order_id: int) -> Optional[SimulatedOrder]:
+        order = self._orders.pop(order_id, None)
+        if order is not None:
+            self.__unrest(order)
+        return order
+
+    def modify(
+        self, order_id: int, price: Decimal, quantity: Decimal
+    ) -> Optional[List[Fill]]:
+        # Price changes and size increases lose priority, as on Binance
+        order = self._orders.get(order_id)
+        if order is None or quantity <= order.filled:
+            return None
+        if price == order.price and quantity <= order.quantity:
+            self.__change_size(order.side, price, quantity - order.quantity)
+            order.quantity = quantity
+            return []
+        self.cancel(order_id)
+        order.price = price
+        order.quantity = quantity
+        return self.submit(order)
+
+    def take_changes(self) -> Optional[Tuple[int, List, List]]:
+        # Levels changed since the last call, with their new total size
+        if not self._changed[BUY] and not self._changed[SELL]:
+            return None
+        self._update_id += 1
+        changes = tuple(
+            [(price, self._sizes[side].get(price, Decimal(0))) for price in changed]
+            for side, changed in self._changed.items()
+        )
+        self._changed = {BUY: set(), SELL: set()}
+        return (self._update_id, *changes)
+
+    def __match(self, order: SimulatedOrder) -> List[Fill]:
+        fills = []
+        opposite = SELL if order.side == BUY else BUY
+        prices = self._prices[opposite]
+        while order.remaining > 0 and prices:
+            best = prices[0] if opposite == SELL else prices[-1]
+            if (order.side == BUY and best > order.price) or (
+                order.side == SELL and best < order.price
+            ):
+                break
+            queue = self._queues[opposite][best]
+            while order.remaining > 0 and queue:
+                resting = queue[0]
+                quantity = min(order.remaining, resting.remaining)
+                for filled_order in (resting, order):
+                    filled_order.filled += quantity
+                    filled_order.notional += quantity * best
+                self.__change_size(opposite, best, -quantity)
+                fills.append((resting, order, best, quantity))
+                if resting.remaining == 0:
+                    queue.popleft()
+                    del self._orders[resting.order_id]
+            if not queue:
+                self.__remove_level(opposite, best)
+        return fills
+
+    def __rest(self, order: SimulatedOrder) -> None:
+        queues = self._queues[order.side]
+        if order.price not in queues:
+            queues[order.price] = deque()
+            self._sizes[order.side][order.price] = Decimal(0)
+            prices = self._prices[order.side]
+            prices.insert(bisect_left(prices, order.price), order.price)
+        queues[order.price].append(order)
+        self._orders[order.order_id] = order
+        self.__change_size(order.side, order.price, order.remaining)
+
+    def __unrest(self, order: SimulatedOrder) -> None:
+        queue = self._queues[order.side].get(order.price)
+        if queue is None:
+            return
+        queue.remove(order)
+        self.__change_size(order.side, order.price, -order.remaining)
+        if not queue:
+            self.__remove_level(order.side, order.price)
+
+    def __change_size(self, side: str, price: Decimal, change: Decimal) -> None:
+        self._sizes[side][price] += change
+        self._changed[side].add(price)
+
+    def __remove_level(self, side: str, price: Decimal) -> None:
+        del self._queues[side][price]
+        del self._sizes[side][price]
+        prices = self._prices[side]
+        del prices[bisect_left(prices, price)]
+        self._changed[side].add(price)
+
+
+class RateLimiter:
+    """Fixed window request weight and order count limits, as Binance applies."""
+
+    def __init__(
+        self,
+        weight_per_minute: int = WEIGHT_PER_MINUTE,
+        orders_per_10_seconds: int = ORDERS_PER_10_SECONDS,
+    ):
+        self._limits = {60: weight_per_minute, 10: orders_per_10_seconds}
+        self._windows = {60: (0, 0), 10: (0, 0)}
+
+    def used(self, interval: int) -> int:
+        window, used = self._windows[interval]
+        return used if window == int(time.time() // interval) else 0
+
+    def acquire(self, weight: int, orders: int) -> Optional[Tuple[int, str]]:
+        # Returns the Binance error when a limit would be exceeded
+        if self.used(60) + weight > self._limits[60]:
+            return TOO_MANY_REQUESTS
+        if orders and self.used(10) + orders > self._limits[10]:
+            return TOO_MANY_ORDERS
+        self.__add(60, weight)
+        self.__add(10, orders)
+        return None
+
+    def __add(self, interval: int, amount: int) -> None:
+        self._windows[interval] = (
+            int(time.time() // interval),
+            self.used(interval) + amount,
+        )
+
+
+class _Subscriber:
+    # Websocket client with its own send queue, so injected latency delays
+    # messages without reordering them
+    def __init__(self, ws: web.WebSocketResponse, streams: Dict[str, str]):
+        self.ws = ws
+        self.streams = streams
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def run(self) -> None:
+        loop = asyncio.get_event_loop()
+        while True:
+            deliver_at, message = await self.queue.get()
+            delay = deliver_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.ws.send_str(message)
+
+
+class ExchangeSimulator:
+    """Binance futures REST and websocket API served from matching engines.
+
+    REST requests are delayed by the configured latency and checked against
+    the request weight and order rate limits. Depth updates are published as
+    diff messages with Binance update ids, order and position changes of the
+    user's orders on the user data stream.
+    """
+
+    def __init__(
+        self,
+        symbols: Dict[str, Decimal] = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        messages_per_second: int = MESSAGES_PER_SECOND,
+        rate_limiter: RateLimiter = None,
+        seed: int = None,
+    ):
+        symbols = symbols or SYMBOLS
+        self._engines = {symbol: MatchingEngine(symbol) for symbol in symbols}
+        self._mid_prices = dict(symbols)
+        self._latency = latency
+        self._jitter = jitter
+        self._messages_per_second = messages_per_second
+        self._rate_limiter = rate_limiter or RateLimiter()
+        self._random = random.Random(seed)
+        self._order_ids = itertools.count(1)
+        self._background: Dict[str, List[int]] = {symbol: [] for symbol in symbols}
+        self._book_subscribers: List[_Subscriber] = []
+        self._user_subscribers: List[_Subscriber] = []
+        self._listen_keys: Set[str] = set()
+        self._positions = {symbol: Decimal(0) for symbol in symbols}
+        self._entry_prices = {symbol: Decimal(0) for symbol in symbols}
+        self._balance = INITIAL_BALANCE
+        self._messages_sent = 0
+        self._flow_task: Optional[asyncio.Task] = None
+        for symbol in symbols:
+            self.__seed_book(symbol)
+
+    @property
+    def messages_sent(self) -> int:
+        return self._messages_sent
+
+    def engine(self, symbol: str) -> MatchingEngine:
+        return self._engines[symbol]
+
+    def position(self, symbol: str) -> Decimal:
+        return self._positions[symbol]
+
+    def application(self) -> web.Application:
+        app = web.Application(middlewares=[self.__latency_middleware])
+        app.router.add_get("/fapi/v1/ping", self.__ping)
+        app.router.add_get("/fapi/v1/exchangeInfo", self.__exchange_info)
+        app.router.add_get("/fapi/v1/depth", self.__depth)
+        app.router.add_route("*", "/fapi/v1/listenKey", self.__listen_key)
+        app.router.add_route("*", "/fapi/v1/order", self.__order)
+        app.router.add_route("*", "/fapi/v1/batchOrders", self.__batch_orders)
+        app.router.add_get("/fapi/v1/openOrders", self.__open_orders)
+        app.router.add_delete("/fapi/v1/allOpenOrders", self.__cancel_all)
+        app.router.add_get("/fapi/v2/account", self.__account)
+        app.router.add_get("/stream", self.__book_stream)
+        app.router.add_get("/ws/{listen_key}", self.__user_stream)
+        app.on_startup.append(self.__start_flow)
+        app.on_cleanup.append(self.__stop_flow)
+        return app
+
+    def step(self, symbol: str) -> None:
+        # One background flow event: a new passive order, a cancel or an
+        # aggressive order taking liquidity
+        engine = self._engines[symbol]
+        draw = self._random.random()
+        side = BUY if self._random.random() < 0.5 else SELL
+        if draw < 0.5 or engine.level_count(side) < FLOW_MIN_LEVELS:
+            self.__add_passive(symbol, side)
+        elif draw < 0.9:
+            self.__cancel_background(symbol)
+        else:
+            self.__take(symbol, side)
+        self.__publish_depth(symbol)
+
+    def __seed_book(self, symbol: str) -> None:
+        for _ in range(FLOW_DEPTH * 4):
+            self.__add_passive(symbol, BUY)
+            self.__add_passive(symbol, SELL)
+        self._engines[symbol].take_changes()
+
+    def __add_passive(self, symbol: str, side: str) -> None:
+        engine = self._engines[symbol]
+        best = engine.best(side)
+        opposite = engine.best(SELL if side == BUY else BUY)
+        if best is None:
+            best = self._mid_prices[symbol] - TICK_SIZE * (1 if side == BUY else -1)
+        ticks = self._random.randint(-1, FLOW_DEPTH)
+        price = best - ticks * TICK_SIZE if side == BUY else best + ticks * TICK_SIZE
+        # Passive flow never crosses the book
+        if opposite is not None:
+            if side == BUY and price >= opposite:
+                price = opposite - TICK_SIZE
+            if side == SELL and price <= opposite:
+                price = opposite + TICK_SIZE
+        order = SimulatedOrder(
+            next(self._order_ids),
+            "",
+            symbol,
+            side,
+            price,
+            self._random.choice(FLOW_SIZES),
+            None,
+        )
+        engine.submit(order)
+        self._background[symbol].append(order.order_id)
+
+    def __cancel_background(self, symbol: str) -> None:
+        background = self._background[symbol]
+        if not background:
+            return
+        index = self._random.randrange(len(background))
+        background[index], background[-1] = background[-1], background[index]
+        self._engines[symbol].cancel(background.pop())
+
+    def __take(self, symbol: str, side: str) -> None:
+        engine = self._engines[symbol]
+        opposite = engine.best(SELL if side == BUY else BUY)
+        if opposite is None:
+            return
+        order = SimulatedOrder(
+            next(self._order_ids),
+            "",
+            symbol,
+            side,
+            opposite + TICK_SIZE * (FLOW_DEPTH if side == BUY else -FLOW_DEPTH),
+            self._random.choice(FLOW_SIZES),
+            None,
+        )
+        self.__handle_fills(engine.submit(order, rest=False))
+
+    def __handle_fills(self, fills: List[Fill]) -> None:
+        for resting, aggressor, price, quantity in fills:
+            for order in (resting, aggressor):
+                if order.owner == USER:
+                    self.__user_fill(order, price, quantity)
+
+    def __user_fill(self, order: SimulatedOrder, price: Decimal, quantity: Decimal):
+        symbol = order.symbol
+        position = self._positions[symbol]
+        change = quantity if order.side == BUY else -quantity
+        new_position = position + change
+        if position == 0 or (position > 0) == (change > 0):
+            # Position increased, entry price is the volume weighted average
+            self._entry_prices[symbol] = (
+                self._entry_prices[symbol] * abs(position) + price * quantity
+            ) / abs(new_position)
+        else:
+            closed = min(abs(change), abs(position))
+            direction = 1 if position > 0 else -1
+            self._balance += (price - self._entry_prices[symbol]) * closed * direction
+            if new_position == 0:
+                self._entry_prices[symbol] = Decimal(0)
+            elif (new_position > 0) != (position > 0):
+                self._entry_prices[symbol] = price
+        self._positions[symbol] = new_position
+
+        status = "FILLED" if order.remaining == 0 else "PARTIALLY_FILLED"
+        self.__publish_order(order, "TRADE", status, price, quantity)
+        self.__publish_account(symbol)
+
+    def __user_order(self, request: Dict) -> SimulatedOrder:
+        try:
+            symbol = request["symbol"]
+            side = BUY if request["side"] == "BUY" else SELL
+            price = Decimal(request["price"])
+            quantity = Decimal(request["quantity"])
+        except (KeyError, ArithmeticError):
+            raise _BinanceError(*BAD_PARAMETER)
+        if symbol not in self._engines:
+            raise _BinanceError(-1121, "Invalid symbol.")
+        return SimulatedOrder(
+            next(self._order_ids),
+            request.get("newClientOrderId") or f"sim-{next(self._order_ids)}",
+            symbol,
+            side,
+            price,
+            quantity,
+            USER,
+        )
+
+    def __insert(self, request: Dict) -> Dict:
+        order = self.__user_order(request)
+        engine = self._engines[order.symbol]
+        self.__publish_order(order, "NEW", "NEW")
+        fills = engine.submit(order)
+        self.__handle_fills(fills)
+        self.__publish_depth(order.symbol)
+        return self.__order_response(order, "NEW")
+
+    def __modify(self, request: Dict) -> Dict:
+        order = self.__find(request)
+        try:
+            price = Decimal(request["price"])
+            quantity = Decimal(request["quantity"])
+        except (KeyError, ArithmeticError):
+            raise _BinanceError(*BAD_PARAMETER)
+        fills = self._engines[order.symbol].modify(order.order_id, price, quantity)
+        if fills is None:
+            raise _BinanceError(-4028, "Quantity less than or equal to filled.")
+        self.__publish_order(order, "AMENDMENT", "NEW")
+        self.__handle_fills(fills)
+        self.__publish_depth(order.symbol)
+        return self.__order_response(order, "NEW")
+
+    def __cancel(self, request: Dict) -> Dict:
+        order = self.__find(request)
+        self._engines[order.symbol].cancel(order.order_id)
+        self.__publish_order(order, "CANCELED", "CANCELED")
+        self.__publish_depth(order.symbol)
+        return self.__order_response(order, "CANCELED")
+
+    def __find(self, request: Dict) -> SimulatedOrder:
+        engine = self._engines.get(request.get("symbol"))
+        order = None
+        if engine is not None and request.get("orderId"):
+            order = engine.get(int(request["orderId"]))
+        if order is None or order.owner != USER:
+            raise _BinanceError(*UNKNOWN_ORDER)
+        return order
+
+    def __order_response(self, order: SimulatedOrder, status: str) -> Dict:
+        return {
+            "orderId": order.order_id,
+            "symbol": order.symbol,
+            "status": status,
+            "clientOrderId": order.client_order_id,
+            "price": str(order.price),
+            "avgPrice": str(order.average_price),
+            "origQty": str(order.quantity),
+            "executedQty": str(order.filled),
+            "side": "BUY" if order.side == BUY else "SELL",
+            "type": "LIMIT",
+            "timeInForce": "GTC",
+            "updateTime": _milliseconds(),
+        }
+
+    def __publish_depth(self, symbol: str) -> None:
+        changes = self._engines[symbol].take_changes()
+        if changes is None:
+            return
+        update_id, bids, asks = changes
+        now = _milliseconds()
+        data = {
+            "e": "depthUpdate",
+            "E": now,
+            "T": now,
+            "s": symbol,
+            "U": update_id,
+            "u": update_id,
+            "pu": update_id - 1,
+            "b": [[str(price), str(size)] for price, size in bids],
+            "a": [[str(price), str(size)] for price, size in asks],
+        }
+        for subscriber in self._book_subscribers:
+            stream = subscriber.streams.get(symbol)
+            if stream is not None:
+                self.__send(subscriber, {"stream": stream, "data": data})
+
+    def __publish_order(
+        self,
+        order: SimulatedOrder,
+        execution_type: str,
+        status: str,
+        last_price: Decimal = Decimal(0),
+        last_quantity: Decimal = Decimal(0),
+    ) -> None:
+        now = _milliseconds()
+        message = {
+            "e": "ORDER_TRADE_UPDATE",
+            "E": now,
+            "T": now,
+            "o": {
+                "s": order.symbol,
+                "c": order.client_order_id,
+                "S": "BUY" if order.side == BUY else "SELL",
+                "o": "LIMIT",
+                "f": "GTC",
+                "q": str(order.quantity),
+                "p": str(order.price),
+                "ap": str(order.average_price),
+                "sp": "0",
+                "x": execution_type,
+                "X": status,
+                "i": order.order_id,
+                "l": str(last_quantity),
+                "z": str(order.filled),
+                "L": str(last_price),
+                "T": now,
+                "t": 0,
+                "m": True,
+                "R": False,
+                "ps": "BOTH",
+            },
+        }
+        for subscriber in self._user_subscribers:
+            self.__send(subscriber, message)
+
+    def __publish_account(self, symbol: str) -> None:
+        now = _milliseconds()
+        message = {
+            "e": "ACCOUNT_UPDATE",
+            "E": now,
+            "T": now,
+            "a": {
+                "m": "ORDER",
+                "B": [
+                    {
+                        "a": QUOTE_ASSET,
+                        "wb": str(self._balance),
+                        "cw": str(self._balance),
+                    }
+                ],
+                "P": [
+                    {
+                        "s": symbol,
+                        "pa": str(self._positions[symbol]),
+                        "ep": str(self._entry_prices[symbol]),
+                        "cr": "0",
+                        "up": "0",
+                        "mt": "cross",
+                        "iw": "0",
+                        "ps": "BOTH",
+                    }
+                ],
+            },
+        }
+        for subscriber in self._user_subscribers:
+            self.__send(subscriber, message)
+
+    def __send(self, subscriber: _Subscriber, message: Dict) -> None:
+        deliver_at = asyncio.get_event_loop().time() + self.__delay()
+        subscriber.queue.put_nowait((deliver_at, json.dumps(message)))
+        self._messages_sent += 1
+
+    def __delay(self) -> float:
+        if not self._jitter:
+            return self._latency
+        return max(self._latency + self._random.uniform(-1, 1) * self._jitter, 0)
+
+    async def __flow(self) -> None:
+        # Runs as many flow steps as the configured rate calls for, spread
+        # over the symbols, every interval
+        loop = asyncio.get_event_loop()
+        symbols = list(self._engines)
+        last = loop.time()
+        owed = 0.0
+        while True:
+            await asyncio.sleep(FLOW_INTERVAL)
+            now = loop.time()
+            owed += (now - last) * self._messages_per_second
+            last = now
+            for i in range(int(owed)):
+                self.step(symbols[i % len(symbols)])
+            owed -= int(owed)
+
+    async def __start_flow(self, app: web.Application) -> None:
+        if self._messages_per_second > 0:
+            self._flow_task = asyncio.ensure_future(self.__flow())
+
+    async def __stop_flow(self, app: web.Application) -> None:
+        if self._flow_task is not None:
+            self._flow_task.cancel()
+
+    @web.middleware
+    async def __latency_middleware(self, request: web.Request, handler):
+        delay = self.__delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return await handler(request)
+
+    def __limit(self, weight: int, orders: int = 0) -> Dict[str, str]:
+        error = self._rate_limiter.acquire(weight, orders)
+        if error is not None:
+            # Seconds until the window of the exceeded limit ends
+            interval = 10 if error == TOO_MANY_ORDERS else 60
+            retry_after = interval - int(time.time()) % interval
+            raise _BinanceError(
+                *error, status=429, headers={"Retry-After": str(retry_after)}
+            )
+        return {
+            "X-MBX-USED-WEIGHT-1M": str(self._rate_limiter.used(60)),
+            "X-MBX-ORDER-COUNT-10S": str(self._rate_limiter.used(10)),
+        }
+
+    async def __ping(self, request: web.Request) -> web.Response:
+        return web.json_response({}, headers=self.__limit(1))
+
+    async def __exchange_info(self, request: web.Request) -> web.Response:
+        symbols = [
+            {
+                "symbol": symbol,
+                "pair": symbol,
+                "contractType": "PERPETUAL",
+                "status": "TRADING",
+                "baseAsset": symbol[: -len(QUOTE_ASSET)],
+                "quoteAsset": QUOTE_ASSET,
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "tickSize": str(TICK_SIZE)},
+                    {"filterType": "LOT_SIZE", "stepSize": str(STEP_SIZE)},
+                ],
+            }
+            for symbol in self._engines
+        ]
+        return web.json_response({"symbols": symbols}, headers=self.__limit(1))
+
+    async def __depth(self, request: web.Request) -> web.Response:
+        limit = int(request.query.get("limit", 500))
+        weight = next(
+            (weight for bound, weight in DEPTH_WEIGHTS if limit <= bound),
+            MAX_DEPTH_WEIGHT,
+        )
+        headers = self.__limit(weight)
+        engine = self._engines.get(request.query.get("symbol"))
+        if engine is None:
+            raise _BinanceError(-1121, "Invalid symbol.")
+        bids, asks = engine.depth(limit)
+        return web.json_response(
+            {
+                "lastUpdateId": engine.update_id,
+                "E": _milliseconds(),
+                "T": _milliseconds(),
+                "bids": [[str(price), str(size)] for price, size in bids],
+                "asks": [[str(price), str(size)] for price, size in asks],
+            },
+            headers=headers,
+        )
+
+    async def __listen_key(self, request: web.Request) -> web.Response:
+        if request.method == "POST":
+            listen_key = f"{next(self._order_ids):064x}"
+            self._listen_keys.add(listen_key)
+            return web.json_response({"listenKey": listen_key})
+        return web.json_response({})
+
+    async def __order(self, request: web.Request) -> web.Response:
+        handlers = {
+            "POST": self.__insert,
+            "PUT": self.__modify,
+            "DELETE": self.__cancel,
+        }
+        if request.method not in handlers:
+            raise web.HTTPMethodNotAllowed(request.method, list(handlers))
+        orders = 1 if request.method != "DELETE" else 0
+        headers = self.__limit(1, orders)
+        result = handlers[request.method](dict(request.query))
+        return web.json_response(result, headers=headers)
+
+    async def __batch_orders(self, request: web.Request) -> web.Response:
+        query = dict(request.query)
+        if request.method == "DELETE":
+            requests = [
+                {"symbol": query.get("symbol"), "orderId": order_id}
+                for order_id in json.loads(query.get("orderIdList", "[]"))
+            ]
+            handler = self.__cancel
+        elif request.method in ("POST", "PUT"):
+            requests = json.loads(query.get("batchOrders", "[]"))
+            handler = self.__insert if request.method == "POST" else self.__modify
+        else:
+            raise web.HTTPMethodNotAllowed(request.method, ["POST", "PUT", "DELETE"])
+
+        orders = len(requests) if request.method != "DELETE" else 0
+        headers = self.__limit(REQUEST_WEIGHTS["batchOrders"], orders)
+        results = []
+        for order_request in requests:
+            try:
+                results.append(handler(order_request))
+            except _BinanceError as error:
+                results.append({"code": error.code, "msg": error.message})
+        return web.json_response(results, headers=headers)
+
+    async def __open_orders(self, request: web.Request) -> web.Response:
+        headers = self.__limit(REQUEST_WEIGHTS["openOrders"])
+        engine = self._engines.get(request.query.get("symbol"))
+        if engine is None:
+            raise _BinanceError(-1121, "Invalid symbol.")
+        return web.json_response(
+            [self.__order_response(order, "NEW") for order in engine.orders(USER)],
+            headers=headers,
+        )
+
+    async def __cancel_all(self, request: web.Request) -> web.Response:
+        headers = self.__limit(REQUEST_WEIGHTS["allOpenOrders"])
+        engine = self._engines.get(request.query.get("symbol"))
+        if engine is None:
+            raise _BinanceError(-1121, "Invalid symbol.")
+        for order in engine.orders(USER):
+            engine.cancel(order.order_id)
+            self.__publish_order(order, "CANCELED", "CANCELED")
+        self.__publish_depth(engine.symbol)
+        return web.json_response(
+            {"code": 200, "msg": "The operation of cancel all open order is done."},
+            headers=headers,
+        )
+
+    async def __account(self, request: web.Request) -> web.Response:
+        headers = self.__limit(REQUEST_WEIGHTS["account"])
+        return web.json_response(
+            {
+                "assets": [{"asset": QUOTE_ASSET, "walletBalance": str(self._balance)}],
+                "positions": [
+                    {
+                        "symbol": symbol,
+                        "positionAmt": str(self._positions[symbol]),
+                        "entryPrice": str(self._entry_prices[symbol]),
+                        "positionSide": "BOTH",
+                    }
+                    for symbol in self._engines
+                ],
+            },
+            headers=headers,
+        )
+
+    async def __book_stream(self, request: web.Request) -> web.WebSocketResponse:
+        # Combined stream names are <symbol>@depth@<interval>
+        streams = {}
+        for stream in request.query.get("streams", "").split("/"):
+            symbol = stream.split("@", 1)[0].upper()
+            if symbol in self._engines and "@depth" in stream:
+                streams[symbol] = stream
+        return await self.__serve(request, streams, self._book_subscribers)
+
+    async def __user_stream(self, request: web.Request) -> web.WebSocketResponse:
+        if request.match_info["listen_key"] not in self._listen_keys:
+            raise web.HTTPBadRequest()
+        return await self.__serve(request, {}, self._user_subscribers)
+
+    async def __serve(
+        self,
+        request: web.Request,
+        streams: Dict[str, str],
+        subscribers: List[_Subscriber],
+    ) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        subscriber = _Subscriber(ws, streams)
+        subscribers.append(subscriber)
+        sender = asyncio.ensure_future(subscriber.run())
+        try:
+            async for message in ws:
+                if message.type == WSMsgType.ERROR:
+                    break
+        finally:
+            subscribers.remove(subscriber)
+            sender.cancel()
+        return ws
+
+
+class _BinanceError(web.HTTPException):
+    # Error response in the format of the Binance API
+    def __init__(
+        self, code: int, message: str, status: int = 400, headers: Dict = None
+    ):
+        self.status_code = status
+        super().__init__(
+            headers=headers,
+            text=json.dumps({"code": code, "msg": message}),
+            content_type="application/json",
+        )
+        self.code = code
+        self.message = message
+
+
+def _milliseconds() -> int:
+    return int(time.time() * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local Binance futures exchange simulator"
+    )
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--tls-port", type=int, default=TLS_PORT)
+    parser.add_argument("--certfile", help="certificate for the wss listener")
+    parser.add_argument("--keyfile")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--messages-per-second", type=int, default=MESSAGES_PER_SECOND)
+    parser.add_argument("--weight-per-minute", type=int, default=WEIGHT_PER_MINUTE)
+    parser.add_argument(
+        "--orders-per-10-seconds", type=int, default=ORDERS_PER_10_SECONDS
+    )
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    setup_logging()
+
+    simulator = ExchangeSimulator(
+        latency=args.latency,
+        jitter=args.jitter,
+        messages_per_second=args.messages_per_second,
+        rate_limiter=RateLimiter(args.weight_per_minute, args.orders_per_10_seconds),
+        seed=args.seed,
+    )
+    ssl_context = None
+    if args.certfile:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(args.certfile, args.keyfile)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    runner = web.AppRunner(simulator.application(), access_log=None)
+    loop.run_until_complete(runner.setup())
+    # The same application is served in plain HTTP and, with a certificate,
+    # over TLS for the websocket streams
+    sites = [web.TCPSite(runner, args.host, args.port)]
+    if ssl_context is not None:
+        sites.append(
+            web.TCPSite(runner, args.host, args.tls_port, ssl_context=ssl_context)
+        )
+    for site in sites:
+        loop.run_until_complete(site.start())
+        LOG.info("Simulating %s on %s", ", ".join(SYMBOLS), site.name)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(runner.cleanup())
+
+
+if __name__ == "__main__":
+    main()
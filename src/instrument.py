@@ -0,0 +1,125 @@
+from decimal import Decimal
+from typing import TYPE_CHECKING, Dict, Iterable, Union
+
+from cryptofeed.defines import GET
+
+if TYPE_CHECKING:
+    from order_transport import OrderTransport
+
+EXCHANGE_INFO = "exchangeInfo"
+PRICE_FILTER = "PRICE_FILTER"
+LOT_SIZE = "LOT_SIZE"
+
+# BTCUSDT perpetual filters, used where no exchange information is loaded
+DEFAULT_TICK_SIZE = "0.10"
+DEFAULT_STEP_SIZE = "0.001"
+
+
+class Instrument:
+    """Fixed point prices and sizes of one symbol.
+
+    Prices are held as integer numbers of ticks and sizes as integer numbers
+    of lots, as given by the exchange PRICE_FILTER tickSize and LOT_SIZE
+    stepSize. Exchange strings are parsed to and formatted from these integers
+    without going through Decimal; Decimals, as cryptofeed delivers them, are
+    converted once when they enter State. Values off the grid are truncated.
+    """
+
+    def __init__(
+        self,
+        symbol: str,
+        tick_size: Union[str, Decimal] = DEFAULT_TICK_SIZE,
+        step_size: Union[str, Decimal] = DEFAULT_STEP_SIZE,
+    ):
+        self._symbol = symbol
+        self._tick_size = Decimal(tick_size)
+        self._step_size = Decimal(step_size)
+        # Digits after the decimal point and the increment in those units
+        self._price_decimals = max(-self._tick_size.as_tuple().exponent, 0)
+        self._tick_units = int(self._tick_size.scaleb(self._price_decimals))
+        self._size_decimals = max(-self._step_size.as_tuple().exponent, 0)
+        self._lot_units = int(self._step_size.scaleb(self._size_decimals))
+        # Multiplying is cheaper than scaleb on the per level book path
+        self._price_factor = Decimal(10) ** self._price_decimals
+        self._size_factor = Decimal(10) ** self._size_decimals
+
+    @property
+    def symbol(self) -> str:
+        return self._symbol
+
+    @property
+    def tick_size(self) -> Decimal:
+        return self._tick_size
+
+    @property
+    def step_size(self) -> Decimal:
+        return self._step_size
+
+    def to_ticks(self, price: Decimal) -> int:
+        return int(price * self._price_factor) // self._tick_units
+
+    def to_lots(self, size: Decimal) -> int:
+        return int(size * self._size_factor) // self._lot_units
+
+    def parse_price(self, text: str) -> int:
+        return _parse_scaled(text, self._price_decimals) // self._tick_units
+
+    def parse_size(self, text: str) -> int:
+        return _parse_scaled(text, self._size_decimals) // self._lot_units
+
+    def format_price(self, ticks: int) -> str:
+        return _format_scaled(ticks * self._tick_units, self._price_decimals)
+
+    def format_size(self, lots: int) -> str:
+        return _format_scaled(lots * self._lot_units, self._size_decimals)
+
+    def price(self, ticks: int) -> Decimal:
+        return ticks * self._tick_size
+
+    def size(self, lots: int) -> Decimal:
+        return lots * self._step_size
+
+
+def _parse_scaled(text: str, decimals: int) -> int:
+    # "30000.1" with 2 decimals is 3000010
+    whole, _, fraction = text.partition(".")
+    return int(whole + (fraction + "0" * decimals)[:decimals])
+
+
+def _format_scaled(units: int, decimals: int) -> str:
+    if not decimals:
+        return str(units)
+    sign = "-" if units < 0 else ""
+    digits = str(abs(units)).rjust(decimals + 1, "0")
+    return f"{sign}{digits[:-decimals]}.{digits[-decimals:]}"
+
+
+def instruments_from_exchange_info(
+    exchange_info: Dict, symbols: Dict[str, str]
+) -> Dict[str, Instrument]:
+    # symbols maps exchange symbols to the symbols they are keyed by
+    instruments = {}
+    for symbol_info in exchange_info["symbols"]:
+        symbol = symbols.get(symbol_info["symbol"])
+        if symbol is None:
+            continue
+        filters = {
+            symbol_filter["filterType"]: symbol_filter
+            for symbol_filter in symbol_info["filters"]
+        }
+        instruments[symbol] = Instrument(
+            symbol,
+            str(filters[PRICE_FILTER]["tickSize"]),
+            str(filters[LOT_SIZE]["stepSize"]),
+        )
+    return instruments
+
+
+async def load_instruments(
+    transport: "OrderTransport", symbols: Iterable[str]
+) -> Dict[str, Instrument]:
+    exchange_info = await transport.request(GET, EXCHANGE_INFO, auth=False)
+    return instruments_from_exchange_info(
+        exchange_info,
+        {transport.exchange_symbol(symbol): symbol for symbol in symbols},
+    )
@@ -0,0 +1,298 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+
+from event_log import get_logger
+
+LOG = get_logger(__name__)
+
+# Each power of two range is split into 2 ** SUB_BUCKET_BITS linear buckets,
+# recorded values are accurate to about 1 / 2 ** (SUB_BUCKET_BITS - 1)
+SUB_BUCKET_BITS = 5
+MAX_VALUE_BITS = 48
+PERCENTILES = (50, 90, 99, 99.9)
+
+DUMP_INTERVAL = 60
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9102
+MAX_TRACKED_ORDERS = 10000
+
+
+class LatencyStage:
+    # Exchange event time to the feed message being received, across clocks
+    EXCHANGE_TO_RECEIPT = "exchange_to_receipt"
+    # Feed receipt to our book handler being entered
+    RECEIPT_TO_HANDLER = "receipt_to_handler"
+    # Book handler entry to the strategy queuing an order request
+    HANDLER_TO_DECISION = "handler_to_decision"
+    # Order request queued to it being handed to the REST transport
+    DECISION_TO_SEND = "decision_to_send"
+    # REST request sent to its response
+    SEND_TO_ACK = "send_to_ack"
+    # REST request sent to the ORDER_INFO event confirming it
+    SEND_TO_CONFIRM = "send_to_confirm"
+    # Feed receipt to the order request being sent
+    TICK_TO_TRADE = "tick_to_trade"
+
+
+class RequestKind:
+    INSERT = "insert"
+    MODIFY = "modify"
+    CANCEL = "cancel"
+
+
+FEED_STAGES = (
+    LatencyStage.EXCHANGE_TO_RECEIPT,
+    LatencyStage.RECEIPT_TO_HANDLER,
+)
+# Stages of an order request, recorded separately for every kind of request
+REQUEST_STAGES = (
+    LatencyStage.HANDLER_TO_DECISION,
+    LatencyStage.DECISION_TO_SEND,
+    LatencyStage.SEND_TO_ACK,
+    LatencyStage.SEND_TO_CONFIRM,
+    LatencyStage.TICK_TO_TRADE,
+)
+REQUEST_KINDS = (RequestKind.INSERT, RequestKind.MODIFY, RequestKind.CANCEL)
+
+
+def request_stage(kind: str, stage: str) -> str:
+    # Histogram name of a request stage, e.g. `cancel_send_to_ack`
+    return f"{kind}_{stage}"
+
+
+STAGES = FEED_STAGES + tuple(
+    request_stage(kind, stage) for kind in REQUEST_KINDS for stage in REQUEST_STAGES
+)
+
+
+class LatencyHistogram:
+    """Log-linear histogram of nanosecond latencies in the style of HDR.
+
+    Recording is a bit length, a shift and a list increment. Percentiles are
+    reported as the highest value of the bucket they fall in.
+    """
+
+    def __init__(self):
+        self._counts = [0] * ((MAX_VALUE_BITS + 1) << SUB_BUCKET_BITS)
+        self._total = 0
+        self._sum = 0
+        self._min: Optional[int] = None
+        self._max = 0
+
+    def __len__(self) -> int:
+        return self._total
+
+    @property
+    def min(self) -> Optional[int]:
+        return self._min
+
+    @property
+    def max(self) -> int:
+        return self._max
+
+    @property
+    def mean(self) -> float:
+        return self._sum / self._total if self._total else 0.0
+
+    def record(self, value: int) -> None:
+        value = min(max(value, 0), (1 << MAX_VALUE_BITS) - 1)
+        self._counts[_bucket_index(value)] += 1
+        self._total += 1
+        self._sum += value
+        if self._min is None or value < self._min:
+            self._min = value
+        if value > self._max:
+            self._max = value
+
+    def percentile(self, percentile: float) -> int:
+        if not self._total:
+            return 0
+        target = max(1, round(self._total * percentile / 100))
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= target:
+                return min(_bucket_highest_value(index), self._max)
+        return self._max
+
+    def reset(self) -> None:
+        self._counts = [0] * len(self._counts)
+        self._total = 0
+        self._sum = 0
+        self._min = None
+        self._max = 0
+
+    def summary(self, percentiles: Iterable[float] = PERCENTILES) -> Dict:
+        # Microseconds, as nanoseconds are too fine grained to read
+        summary = {
+            "count": self._total,
+            "min_us": (self._min or 0) / 1000,
+            "mean_us": round(self.mean / 1000, 3),
+            "max_us": self._max / 1000,
+        }
+        for percentile in percentiles:
+            summary[f"p{percentile}_us"] = self.percentile(percentile) / 1000
+        return summary
+
+
+def _bucket_index(value: int) -> int:
+    shift = max(value.bit_length() - SUB_BUCKET_BITS, 0)
+    return (shift << SUB_BUCKET_BITS) + (value >> shift)
+
+
+def _bucket_highest_value(index: int) -> int:
+    shift = index >> SUB_BUCKET_BITS
+    if shift == 0:
+        return index
+    sub_bucket = index - (shift << SUB_BUCKET_BITS)
+    return ((sub_bucket + 1) << shift) - 1
+
+
+class LatencyMetrics:
+    """Timestamps the path from a book update to the orders it causes.
+
+    The latest book update is remembered as the current tick until the
+    strategy pass deciding on it is done. Order requests decided on a tick
+    are then tracked by kind and client order id from the strategy decision
+    through the REST send and ack to the ORDER_INFO confirmation, and each
+    step is recorded into a histogram per stage and kind of request, as a
+    cancel or modify reuses the client order id of the order it is for.
+    Requests decided without a tick are not timed. Only the feed timestamps
+    use wall clock time, everything else is measured with the monotonic
+    nanosecond counter. Requests never confirmed are evicted oldest first
+    once max_tracked_orders are held.
+    """
+
+    def __init__(self, max_tracked_orders: int = MAX_TRACKED_ORDERS):
+        self._histograms = {stage: LatencyHistogram() for stage in STAGES}
+        self._max_tracked_orders = max_tracked_orders
+        self._tick_received: Optional[int] = None
+        self._tick_handled: Optional[int] = None
+        self._decided: "OrderedDict[Tuple[str, str], List[int]]" = OrderedDict()
+        self._sent: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+        self._sections: Dict[str, Callable[[], Dict]] = {}
+        self._dump_task: Optional[asyncio.Task] = None
+
+    @property
+    def histograms(self) -> Dict[str, LatencyHistogram]:
+        return self._histograms
+
+    @property
+    def tracked_orders(self) -> int:
+        return len(self._decided) + len(self._sent)
+
+    def book_received(
+        self, exchange_timestamp: Optional[float], receipt_timestamp: float
+    ) -> None:
+        now = time.perf_counter_ns()
+        self._tick_handled = now
+        self._tick_received = now
+        if not receipt_timestamp:
+            return
+
+        if exchange_timestamp:
+            self._histograms[LatencyStage.EXCHANGE_TO_RECEIPT].record(
+                int((receipt_timestamp - exchange_timestamp) * 1e9)
+            )
+        receipt_to_handler = max(int((time.time() - receipt_timestamp) * 1e9), 0)
+        self._histograms[LatencyStage.RECEIPT_TO_HANDLER].record(receipt_to_handler)
+        # Receipt time moved onto the monotonic clock
+        self._tick_received = now - receipt_to_handler
+
+    def decision_done(self) -> None:
+        # Requests decided from here on are not in response to the last tick
+        self._tick_received = None
+        self._tick_handled = None
+
+    def decided(self, client_order_id: Optional[str], kind: str) -> None:
+        if client_order_id is None or self._tick_handled is None:
+            return
+        now = time.perf_counter_ns()
+        self.__record(kind, LatencyStage.HANDLER_TO_DECISION, now - self._tick_handled)
+        self.__track(self._decided, (kind, client_order_id), [self._tick_received, now])
+
+    def sent(self, client_order_id: Optional[str], kind: str) -> None:
+        timestamps = self._decided.pop((kind, client_order_id), None)
+        if timestamps is None:
+            return
+        now = time.perf_counter_ns()
+        tick_received, decided_at = timestamps
+        self.__record(kind, LatencyStage.DECISION_TO_SEND, now - decided_at)
+        self.__record(kind, LatencyStage.TICK_TO_TRADE, now - tick_received)
+        # Ack and confirmation may arrive in either order
+        self.__track(self._sent, (kind, client_order_id), [now, False, False])
+
+    def acknowledged(self, client_order_id: Optional[str], kind: str) -> None:
+        self.__complete((kind, client_order_id), LatencyStage.SEND_TO_ACK, 1)
+
+    def confirmed(self, client_order_id: Optional[str], kind: str) -> None:
+        self.__complete((kind, client_order_id), LatencyStage.SEND_TO_CONFIRM, 2)
+
+    def discard(self, client_order_id: Optional[str], kind: str) -> None:
+        # Requests that failed will not be confirmed
+        self._decided.pop((kind, client_order_id), None)
+        self._sent.pop((kind, client_order_id), None)
+
+    def add_section(self, name: str, snapshot: Callable[[], Dict]) -> None:
+        # Other counters reported along with the histograms
+        self._sections[name] = snapshot
+
+    def snapshot(self) -> Dict[str, Dict]:
+        snapshot = {
+            stage: histogram.summary() for stage, histogram in self._histograms.items()
+        }
+        for name, section in self._sections.items():
+            snapshot[name] = section()
+        return snapshot
+
+    def reset(self) -> None:
+        for histogram in self._histograms.values():
+            histogram.reset()
+
+    def dump(self) -> None:
+        LOG.info("Latency %s", json.dumps(self.snapshot(), separators=(",", ":")))
+
+    def start_periodic_dump(self, interval: float = DUMP_INTERVAL) -> None:
+        if self._dump_task is None:
+            self._dump_task = asyncio.ensure_future(self.__periodic_dump(interval))
+
+    async def start_server(
+        self, host: str = METRICS_HOST, port: int = METRICS_PORT
+    ) -> web.AppRunner:
+        # Serves the histogram summaries as JSON on /metrics
+        app = web.Application()
+        app.router.add_get("/metrics", self.__handle_metrics)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+    def __record(self, kind: str, stage: str, value: int) -> None:
+        self._histograms[request_stage(kind, stage)].record(value)
+
+    def __track(self, tracked: OrderedDict, key: Tuple[str, str], value: list) -> None:
+        while tracked and len(tracked) >= self._max_tracked_orders:
+            tracked.popitem(last=False)
+        tracked[key] = value
+
+    def __complete(self, key: Tuple[str, Optional[str]], stage: str, slot: int) -> None:
+        timestamps = self._sent.get(key)
+        if timestamps is None or timestamps[slot]:
+            return
+        self.__record(key[0], stage, time.perf_counter_ns() - timestamps[0])
+        timestamps[slot] = True
+        if timestamps[1] and timestamps[2]:
+            del self._sent[key]
+
+    async def __periodic_dump(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.dump()
+
+    async def __handle_metrics(self, request: web.Request) -> web.Response:
+        return web.json_response(self.snapshot())
@@ -0,0 +1,93 @@
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from cryptofeed.types import OrderBook
+
+from instrument import Instrument
+
+
+class BookSide:
+    BID = "bid"
+    ASK = "ask"
+
+
+class LocalBook:
+    """L2 book kept in sync with the feed by applying book deltas.
+
+    Each side holds a price -> size map alongside an ascending list of its
+    prices, so best levels are read from the ends of the list and only the
+    levels touched by a delta are inserted or removed. Prices are kept in
+    ticks and sizes in lots of the instrument, feed Decimals are converted as
+    they are applied.
+    """
+
+    def __init__(self, instrument: Instrument):
+        self._instrument = instrument
+        self._sizes = {BookSide.BID: {}, BookSide.ASK: {}}
+        self._prices = {BookSide.BID: [], BookSide.ASK: []}
+
+    def __len__(self) -> int:
+        return len(self._prices[BookSide.BID]) + len(self._prices[BookSide.ASK])
+
+    def apply(self, book: OrderBook) -> None:
+        to_ticks = self._instrument.to_ticks
+        to_lots = self._instrument.to_lots
+        # Snapshots carry no delta, the book is then rebuilt from scratch
+        if book.delta is None:
+            self.reset(
+                bids={
+                    to_ticks(price): to_lots(size)
+                    for price, size in book.book.bids.to_dict().items()
+                },
+                asks={
+                    to_ticks(price): to_lots(size)
+                    for price, size in book.book.asks.to_dict().items()
+                },
+            )
+            return
+
+        for side in (BookSide.BID, BookSide.ASK):
+            for price, size in book.delta.get(side, ()):
+                self.update(side, to_ticks(price), to_lots(size))
+
+    def reset(self, bids: Dict[int, int], asks: Dict[int, int]) -> None:
+        for side, levels in ((BookSide.BID, bids), (BookSide.ASK, asks)):
+            sizes = {price: size for price, size in levels.items() if size}
+            self._sizes[side] = sizes
+            self._prices[side] = sorted(sizes)
+
+    def update(self, side: str, price: int, size: int) -> None:
+        sizes = self._sizes[side]
+        prices = self._prices[side]
+        if not size:
+            if sizes.pop(price, None) is not None:
+                del prices[bisect_left(prices, price)]
+            return
+
+        if price not in sizes:
+            prices.insert(bisect_left(prices, price), price)
+        sizes[price] = size
+
+    def best(self, side: str) -> Optional[Tuple[int, int]]:
+        prices = self._prices[side]
+        if not prices:
+            return None
+        price = prices[-1] if side == BookSide.BID else prices[0]
+        return price, self._sizes[side][price]
+
+    def levels(self, side: str, depth: int) -> List[Tuple[int, int]]:
+        # Best `depth` levels, ordered from the top of the book outwards
+        prices = self._prices[side]
+        sizes = self._sizes[side]
+        if side == BookSide.BID:
+            selected = prices[: -depth - 1 : -1] if depth > 0 else []
+        else:
+            selected = prices[:depth]
+        return [(price, sizes[price]) for price in selected]
+
+    def depth_at(self, side: str, price: int) -> int:
+        return self._sizes[side].get(price, 0)
+
+    def queue_size(self, side: str, price: int, own_size: int) -> int:
+        # Volume resting at a price that does not belong to our own orders
+        return max(self.depth_at(side, price) - own_size, 0)
@@ -0,0 +1,27 @@
+import ssl
+from typing import Type
+
+from cryptofeed.connection import RestEndpoint, WebsocketEndpoint
+from cryptofeed.exchanges import BinanceFutures
+
+
+def local_binance_futures(
+    rest: str, websocket: str, cafile: str = None
+) -> Type[BinanceFutures]:
+    # BinanceFutures with its REST and websocket endpoints pointed at the
+    # simulator, cryptofeed only connects to wss addresses so the websocket
+    # certificate is trusted through cafile
+    options = {"compression": None}
+    if cafile:
+        options["ssl"] = ssl.create_default_context(cafile=cafile)
+    routes = BinanceFutures.rest_endpoints[0].routes
+    return type(
+        "LocalBinanceFutures",
+        (BinanceFutures,),
+        {
+            "websocket_endpoints": [
+                WebsocketEndpoint(websocket, sandbox=websocket, options=options)
+            ],
+            "rest_endpoints": [RestEndpoint(rest, sandbox=rest, routes=routes)],
+        },
+    )
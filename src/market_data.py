@@ -0,0 +1,434 @@
+import heapq
+import json
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from cryptofeed.defines import BUY, L2_BOOK, LIMIT, ORDER_INFO, POSITIONS, SELL, TRADES
+from cryptofeed.types import OrderBook, OrderInfo, Position, Trade
+
+from local_book import BookSide
+from replay import EXCHANGE, ReplayEvent
+
+MAGIC = b"MDREC001"
+CHUNK_MAGIC = b"CHNK"
+# Magic, flags, row count, payload length in bytes
+CHUNK_HEADER = struct.Struct("<4sIIQ")
+CHUNK_COMPRESSED = 1
+
+PRICE_SCALE = 10**8
+SIZE_SCALE = 10**8
+CHUNK_ROWS = 65536
+COMPRESSION_LEVEL = 1
+
+# Book rows are flagged with the start of each update and of each snapshot
+EVENT_START = 1
+SNAPSHOT = 2
+
+CLIENT_ORDER_ID_LENGTH = 36
+ORDER_STATUSES = ("NEW", "CANCELED", "CALCULATED", "EXPIRED", "TRADE", "AMENDMENT")
+
+COLUMNS = {
+    L2_BOOK: (
+        ("timestamp", "<i8"),
+        ("receipt_timestamp", "<i8"),
+        ("flags", "<i1"),
+        ("side", "<i1"),
+        ("price", "<i8"),
+        ("size", "<i8"),
+    ),
+    POSITIONS: (
+        ("timestamp", "<i8"),
+        ("receipt_timestamp", "<i8"),
+        ("position", "<i8"),
+        ("entry_price", "<i8"),
+    ),
+    ORDER_INFO: (
+        ("timestamp", "<i8"),
+        ("receipt_timestamp", "<i8"),
+        ("order_id", "<i8"),
+        ("client_order_id", f"S{CLIENT_ORDER_ID_LENGTH}"),
+        ("side", "<i1"),
+        ("status", "<i1"),
+        ("price", "<i8"),
+        ("amount", "<i8"),
+        ("filled", "<i8"),
+    ),
+    TRADES: (
+        ("timestamp", "<i8"),
+        ("receipt_timestamp", "<i8"),
+        ("side", "<i1"),
+        ("price", "<i8"),
+        ("amount", "<i8"),
+    ),
+}
+
+# Sides are stored as 1 for bids and buys, -1 for asks and sells
+SIDES = {BookSide.BID: 1, BookSide.ASK: -1, BUY: 1, SELL: -1}
+
+
+class MarketDataRecorder:
+    """Records feed callbacks into append-only columnar binary files.
+
+    One file is written per channel. Prices and sizes are scaled to int64 and
+    timestamps to int64 nanoseconds. Rows are buffered per column and written
+    in chunks, each chunk holding its columns back to back and optionally
+    compressed, by a single background thread so the feed loop only appends
+    to the column buffers.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        symbol: str,
+        chunk_rows: int = CHUNK_ROWS,
+        compress: bool = True,
+    ):
+        os.makedirs(directory, exist_ok=True)
+        self._symbol = symbol
+        self._chunk_rows = chunk_rows
+        self._compress = compress
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._files = {}
+        self._buffers = {}
+        for channel, columns in COLUMNS.items():
+            path = os.path.join(directory, _file_name(channel))
+            self._files[channel] = open(path, "ab")
+            if self._files[channel].tell() == 0:
+                self._files[channel].write(_file_header(channel, symbol))
+            self._buffers[channel] = _new_buffers(columns)
+
+    async def order_book_handler(self, book: OrderBook, receipt_timestamp) -> None:
+        columns = self._buffers[L2_BOOK]
+        timestamp = _nanoseconds(book.timestamp or receipt_timestamp)
+        receipt = _nanoseconds(receipt_timestamp)
+        if book.delta is None:
+            levels = (
+                (BookSide.BID, book.book.bids.to_dict().items()),
+                (BookSide.ASK, book.book.asks.to_dict().items()),
+            )
+            flags = EVENT_START | SNAPSHOT
+        else:
+            levels = (
+                (BookSide.BID, book.delta.get(BookSide.BID, ())),
+                (BookSide.ASK, book.delta.get(BookSide.ASK, ())),
+            )
+            flags = EVENT_START
+
+        rows = 0
+        for side, side_levels in levels:
+            for price, size in side_levels:
+                columns["timestamp"].append(timestamp)
+                columns["receipt_timestamp"].append(receipt)
+                columns["flags"].append(flags)
+                columns["side"].append(SIDES[side])
+                columns["price"].append(int(price * PRICE_SCALE))
+                columns["size"].append(int(size * SIZE_SCALE))
+                flags &= ~EVENT_START
+                rows += 1
+        if rows:
+            self.__flush_if_full(L2_BOOK)
+
+    async def trades_handler(self, trade: Trade, receipt_timestamp) -> None:
+        columns = self._buffers[TRADES]
+        columns["timestamp"].append(_nanoseconds(trade.timestamp or receipt_timestamp))
+        columns["receipt_timestamp"].append(_nanoseconds(receipt_timestamp))
+        columns["side"].append(SIDES[trade.side])
+        columns["price"].append(int(trade.price * PRICE_SCALE))
+        columns["amount"].append(int(trade.amount * SIZE_SCALE))
+        self.__flush_if_full(TRADES)
+
+    async def positions_handler(self, positions: Position, receipt_timestamp) -> None:
+        columns = self._buffers[POSITIONS]
+        columns["timestamp"].append(
+            _nanoseconds(positions.timestamp or receipt_timestamp)
+        )
+        columns["receipt_timestamp"].append(_nanoseconds(receipt_timestamp))
+        columns["position"].append(int(positions.position * SIZE_SCALE))
+        columns["entry_price"].append(int(positions.entry_price * PRICE_SCALE))
+        self.__flush_if_full(POSITIONS)
+
+    async def order_info_handler(
+        self, order_info: OrderInfo, receipt_timestamp
+    ) -> None:
+        columns = self._buffers[ORDER_INFO]
+        raw = order_info.raw["o"]
+        columns["timestamp"].append(
+            _nanoseconds(order_info.timestamp or receipt_timestamp)
+        )
+        columns["receipt_timestamp"].append(_nanoseconds(receipt_timestamp))
+        columns["order_id"].append(int(order_info.id))
+        columns["client_order_id"].append(raw.get("c", "").encode("ascii"))
+        columns["side"].append(SIDES[order_info.side])
+        columns["status"].append(ORDER_STATUSES.index(order_info.status))
+        columns["price"].append(int(Decimal(raw["p"]) * PRICE_SCALE))
+        columns["amount"].append(int(Decimal(raw["q"]) * SIZE_SCALE))
+        columns["filled"].append(int(Decimal(raw["z"]) * SIZE_SCALE))
+        self.__flush_if_full(ORDER_INFO)
+
+    def flush(self) -> None:
+        for channel in COLUMNS:
+            self.__flush(channel)
+
+    def close(self) -> None:
+        self.flush()
+        self._writer.shutdown(wait=True)
+        for file in self._files.values():
+            file.close()
+
+    def __flush_if_full(self, channel: str) -> None:
+        if len(self._buffers[channel]["timestamp"]) >= self._chunk_rows:
+            self.__flush(channel)
+
+    def __flush(self, channel: str) -> None:
+        buffers = self._buffers[channel]
+        if not buffers["timestamp"]:
+            return
+        self._buffers[channel] = _new_buffers(COLUMNS[channel])
+        self._writer.submit(
+            _write_chunk, self._files[channel], channel, buffers, self._compress
+        )
+
+
+class MarketDataReader:
+    """Reads recorded channels through memory maps.
+
+    Uncompressed chunks are returned as NumPy views straight onto the mapped
+    file, compressed chunks are inflated into new arrays.
+    """
+
+    def __init__(self, directory: str):
+        self._directory = directory
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._headers: Dict[str, Dict] = {}
+        for channel in COLUMNS:
+            path = os.path.join(directory, _file_name(channel))
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                continue
+            with open(path, "rb") as file:
+                self._maps[channel] = mmap.mmap(
+                    file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+            self._headers[channel] = _read_file_header(self._maps[channel])
+
+    @property
+    def channels(self) -> List[str]:
+        return list(self._maps)
+
+    def symbol(self, channel: str) -> str:
+        return self._headers[channel]["symbol"]
+
+    def chunks(self, channel: str) -> Iterator[Dict[str, np.ndarray]]:
+        if channel not in self._maps:
+            return
+        data = self._maps[channel]
+        columns = [(name, np.dtype(dtype)) for name, dtype in COLUMNS[channel]]
+        offset = self._headers[channel]["data_offset"]
+        while offset + CHUNK_HEADER.size <= len(data):
+            magic, flags, rows, length = CHUNK_HEADER.unpack_from(data, offset)
+            if magic != CHUNK_MAGIC:
+                raise ValueError(f"Corrupt chunk in {channel} at offset {offset}")
+            offset += CHUNK_HEADER.size
+            if offset + length > len(data):
+                # Chunk still being written
+                return
+            if flags & CHUNK_COMPRESSED:
+                buffer = zlib.decompress(data[offset : offset + length])
+                column_offset = 0
+            else:
+                buffer = data
+                column_offset = offset
+            chunk = {}
+            for name, dtype in columns:
+                chunk[name] = np.frombuffer(
+                    buffer, dtype=dtype, count=rows, offset=column_offset
+                )
+                column_offset += rows * dtype.itemsize
+            offset += length
+            yield chunk
+
+    def read(self, channel: str) -> Dict[str, np.ndarray]:
+        # Whole channel as one array per column, copying across chunks
+        chunks = list(self.chunks(channel))
+        if not chunks:
+            return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS[channel]}
+        if len(chunks) == 1:
+            return chunks[0]
+        return {
+            name: np.concatenate([chunk[name] for chunk in chunks])
+            for name, _ in COLUMNS[channel]
+        }
+
+    def events(self, channels: Sequence[str] = None) -> Iterator[ReplayEvent]:
+        # The channels given, all by default, merged in receipt order as
+        # backtest replay events
+        sources = {
+            L2_BOOK: self.__book_events,
+            TRADES: self.__trade_events,
+            POSITIONS: self.__position_events,
+            ORDER_INFO: self.__order_events,
+        }
+        return heapq.merge(
+            *(
+                events()
+                for channel, events in sources.items()
+                if channels is None or channel in channels
+            ),
+            key=lambda event: event[0],
+        )
+
+    def close(self) -> None:
+        for data in self._maps.values():
+            data.close()
+        self._maps = {}
+
+    def __book_events(self) -> Iterator[ReplayEvent]:
+        for chunk in self.chunks(L2_BOOK):
+            flags = chunk["flags"]
+            starts = np.flatnonzero(flags & EVENT_START)
+            ends = np.append(starts[1:], len(flags))
+            receipts = chunk["receipt_timestamp"] / 1e9
+            sides = chunk["side"].tolist()
+            prices = _decimals(chunk["price"], PRICE_SCALE)
+            sizes = _decimals(chunk["size"], SIZE_SCALE)
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                bids, asks = [], []
+                for row in range(start, end):
+                    level = (prices[row], sizes[row])
+                    (bids if sides[row] > 0 else asks).append(level)
+                is_snapshot = bool(flags[start] & SNAPSHOT)
+                yield float(receipts[start]), L2_BOOK, (bids, asks, is_snapshot)
+
+    def __trade_events(self) -> Iterator[ReplayEvent]:
+        symbol = self._headers.get(TRADES, {}).get("symbol")
+        for chunk in self.chunks(TRADES):
+            prices = _decimals(chunk["price"], PRICE_SCALE)
+            amounts = _decimals(chunk["amount"], SIZE_SCALE)
+            for row in range(len(prices)):
+                trade = Trade(
+                    EXCHANGE,
+                    symbol,
+                    BUY if chunk["side"][row] > 0 else SELL,
+                    amounts[row],
+                    prices[row],
+                    float(chunk["timestamp"][row] / 1e9),
+                )
+                receipt = float(chunk["receipt_timestamp"][row] / 1e9)
+                yield receipt, TRADES, trade
+
+    def __position_events(self) -> Iterator[ReplayEvent]:
+        symbol = self._headers.get(POSITIONS, {}).get("symbol")
+        for chunk in self.chunks(POSITIONS):
+            positions = _decimals(chunk["position"], SIZE_SCALE)
+            entry_prices = _decimals(chunk["entry_price"], PRICE_SCALE)
+            for row in range(len(positions)):
+                position = Position(
+                    EXCHANGE,
+                    symbol,
+                    positions[row],
+                    entry_prices[row],
+                    "both",
+                    Decimal(0),
+                    float(chunk["timestamp"][row] / 1e9),
+                )
+                receipt = float(chunk["receipt_timestamp"][row] / 1e9)
+                yield receipt, POSITIONS, position
+
+    def __order_events(self) -> Iterator[ReplayEvent]:
+        symbol = self._headers.get(ORDER_INFO, {}).get("symbol")
+        for chunk in self.chunks(ORDER_INFO):
+            prices = _decimals(chunk["price"], PRICE_SCALE)
+            amounts = _decimals(chunk["amount"], SIZE_SCALE)
+            filled = _decimals(chunk["filled"], SIZE_SCALE)
+            for row in range(len(prices)):
+                status = ORDER_STATUSES[chunk["status"][row]]
+                raw = {
+                    "o": {
+                        "c": chunk["client_order_id"][row].decode("ascii"),
+                        "p": str(prices[row]),
+                        "q": str(amounts[row]),
+                        "z": str(filled[row]),
+                        "X": status,
+                    }
+                }
+                order_info = OrderInfo(
+                    EXCHANGE,
+                    symbol,
+                    str(chunk["order_id"][row]),
+                    BUY if chunk["side"][row] > 0 else SELL,
+                    status,
+                    LIMIT,
+                    prices[row],
+                    amounts[row],
+                    amounts[row] - filled[row],
+                    float(chunk["timestamp"][row] / 1e9),
+                    raw=raw,
+                )
+                receipt = float(chunk["receipt_timestamp"][row] / 1e9)
+                yield receipt, ORDER_INFO, order_info
+
+
+def _file_name(channel: str) -> str:
+    return f"{channel}.bin"
+
+
+def _file_header(channel: str, symbol: str) -> bytes:
+    header = json.dumps(
+        {
+            "channel": channel,
+            "symbol": symbol,
+            "price_scale": PRICE_SCALE,
+            "size_scale": SIZE_SCALE,
+            "columns": COLUMNS[channel],
+        }
+    ).encode("utf8")
+    return MAGIC + struct.pack("<I", len(header)) + header
+
+
+def _read_file_header(data: mmap.mmap) -> Dict:
+    if data[: len(MAGIC)] != MAGIC:
+        raise ValueError("Not a market data recording")
+    (length,) = struct.unpack_from("<I", data, len(MAGIC))
+    start = len(MAGIC) + 4
+    header = json.loads(data[start : start + length])
+    header["data_offset"] = start + length
+    return header
+
+
+def _new_buffers(columns: Tuple[Tuple[str, str], ...]) -> Dict:
+    buffers = {}
+    for name, dtype in columns:
+        # Fixed width strings have no array typecode and are kept as a list
+        buffers[name] = array(np.dtype(dtype).char) if dtype[0] != "S" else []
+    return buffers
+
+
+def _write_chunk(file, channel: str, buffers: Dict, compress: bool) -> None:
+    rows = len(buffers["timestamp"])
+    payload = b"".join(
+        np.asarray(buffers[name], dtype=dtype).tobytes()
+        for name, dtype in COLUMNS[channel]
+    )
+    flags = 0
+    if compress:
+        payload = zlib.compress(payload, COMPRESSION_LEVEL)
+        flags |= CHUNK_COMPRESSED
+    file.write(CHUNK_HEADER.pack(CHUNK_MAGIC, flags, rows, len(payload)))
+    file.write(payload)
+    file.flush()
+
+
+def _nanoseconds(timestamp: Optional[float]) -> int:
+    return int((timestamp or 0) * 1e9)
+
+
+def _decimals(values: np.ndarray, scale: int) -> List[Decimal]:
+    # Scaled integers back to exact decimals, equal to the recorded ones
+    exponent = -len(str(scale)) + 1
+    return [Decimal(value).scaleb(exponent) for value in values.tolist()]
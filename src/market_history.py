@@ -0,0 +1,136 @@
+import math
+from typing import Optional
+
+import numpy as np
+
+from ring_buffer import RingBuffer
+
+BOOK_CAPACITY = 4096
+TRADE_CAPACITY = 4096
+ORDER_CAPACITY = 1024
+
+# Own order events by code, as stored in the status column
+ORDER_EVENTS = ("NEW", "AMENDMENT", "TRADE", "CANCELED")
+
+
+class MarketHistory:
+    """Recent top of book changes, trade prints and our order events.
+
+    Each is held in a preallocated ring buffer, prices in ticks and sizes in
+    lots. Window statistics cover the rows after now less the window up to
+    now, the latest timestamp seen unless given, and are sums over buffer
+    views, so querying them on every decision allocates no arrays. Windows
+    longer than the buffers hold are cut to the time the buffers cover. Sides
+    are 1 for bids and buys and -1 for asks and sells.
+    """
+
+    def __init__(
+        self,
+        book_capacity: int = BOOK_CAPACITY,
+        trade_capacity: int = TRADE_CAPACITY,
+        order_capacity: int = ORDER_CAPACITY,
+    ):
+        # The squared mid change since the previous row is kept per row,
+        # making volatility a plain sum over the window
+        self._book = RingBuffer(
+            book_capacity,
+            ("timestamp", "bid", "bid_size", "ask", "ask_size", "mid_change"),
+        )
+        self._trades = RingBuffer(
+            trade_capacity, ("timestamp", "side", "price", "size")
+        )
+        # Size is what remains of the order, filled the lots this event filled
+        self._orders = RingBuffer(
+            order_capacity,
+            ("timestamp", "status", "side", "price", "size", "filled"),
+        )
+        self._now = float("-inf")
+        self._mid: Optional[float] = None
+
+    @property
+    def book(self) -> RingBuffer:
+        return self._book
+
+    @property
+    def trades(self) -> RingBuffer:
+        return self._trades
+
+    @property
+    def orders(self) -> RingBuffer:
+        return self._orders
+
+    @property
+    def now(self) -> float:
+        return self._now
+
+    def top_changed(
+        self, timestamp: float, bid: int, bid_size: int, ask: int, ask_size: int
+    ) -> None:
+        mid = (bid + ask) / 2
+        change = 0.0 if self._mid is None else mid - self._mid
+        self._mid = mid
+        self._book.append(timestamp, bid, bid_size, ask, ask_size, change * change)
+        self.__seen(timestamp)
+
+    def traded(self, timestamp: float, side: int, price: int, size: int) -> None:
+        self._trades.append(timestamp, side, price, size)
+        self.__seen(timestamp)
+
+    def order_event(
+        self,
+        timestamp: float,
+        status: str,
+        side: int,
+        price: int,
+        size: int,
+        filled: int = 0,
+    ) -> None:
+        self._orders.append(
+            timestamp, ORDER_EVENTS.index(status), side, price, size, filled
+        )
+        self.__seen(timestamp)
+
+    def clear(self) -> None:
+        self._book.clear()
+        self._trades.clear()
+        self._orders.clear()
+        self._now = float("-inf")
+        self._mid = None
+
+    def volatility(self, window: float, now: float = None) -> float:
+        # Realized volatility of the mid, in ticks per square root second
+        start, elapsed = self.__window(self._book, window, now)
+        if elapsed <= 0:
+            return 0.0
+        return math.sqrt(self._book.column("mid_change", start).sum() / elapsed)
+
+    def trade_imbalance(self, window: float, now: float = None) -> float:
+        # Bought less sold over all traded volume, from -1 to 1
+        start, _ = self.__window(self._trades, window, now)
+        sizes = self._trades.column("size", start)
+        volume = sizes.sum()
+        if not volume:
+            return 0.0
+        return float(np.dot(self._trades.column("side", start), sizes) / volume)
+
+    def update_rate(self, window: float, now: float = None) -> float:
+        # Top of book changes per second
+        start, elapsed = self.__window(self._book, window, now)
+        if elapsed <= 0:
+            return 0.0
+        return (len(self._book) - start) / elapsed
+
+    def __seen(self, timestamp: float) -> None:
+        if timestamp > self._now:
+            self._now = timestamp
+
+    def __window(self, buffer: RingBuffer, window: float, now: Optional[float]):
+        # First row in the window and the seconds of it the buffer covers
+        if now is None:
+            now = self._now
+        if not len(buffer):
+            return 0, 0.0
+        start = now - window
+        if len(buffer) == buffer.capacity:
+            start = max(start, buffer.column("timestamp")[0])
+        return buffer.since(now - window), now - start
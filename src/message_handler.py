@@ -1,44 +1,90 @@
-import threading
+import asyncio
+from typing import Callable, Optional
 
-from cryptofeed.types import OrderBook, OrderInfo, Position
+from cryptofeed.types import OrderBook, OrderInfo, Position, Trade
 
-from simple_strategy import SimpleStrategy
+from book_scheduler import BookScheduler
+from latency import LatencyMetrics
 from state import State
+from strategy import Strategy
 
 
 class MessageHandler:
-    def __init__(self, state: State):
+    """Feeds cryptofeed callbacks into the state and strategy.
+
+    All callbacks are driven by the single event loop cryptofeed runs on, so
+    state and strategy are only ever mutated from that loop and need no
+    locking. Other threads must go through call_threadsafe, which hands the
+    call over to the loop instead of touching state directly.
+
+    Without a scheduler the strategy runs on every book update, with one it
+    runs once per burst of updates as the scheduler decides.
+    """
+
+    def __init__(
+        self,
+        state: State,
+        latency: LatencyMetrics = None,
+        scheduler: BookScheduler = None,
+    ):
         self._state = state
-        self._strategy = None
-        self.__lock = threading.Lock()
+        self._latency = latency or LatencyMetrics()
+        self._scheduler = scheduler
+        self._strategy: Optional[Strategy] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
 
     async def order_book_handler(self, book: OrderBook, receipt_timestamp) -> None:
-        self.__lock.acquire()
-        try:
-            self._state.handle_book(book)
-            if self._strategy is not None:
-                self._strategy.process_strategy()
-        finally:
-            self.__lock.release()
+        self._latency.book_received(book.timestamp, receipt_timestamp)
+        self._state.handle_book(book)
+        if self._strategy is None:
+            return
+        if self._scheduler is None:
+            self._strategy.process_strategy()
+        else:
+            self._scheduler.book_updated()
+
+    async def trades_handler(self, trade: Trade, receipt_timestamp) -> None:
+        # Trade prints only move queue position estimates, no decision runs
+        self._state.handle_trade(trade)
 
     async def positions_handler(self, positions: Position, receipt_timestamp) -> None:
-        self.__lock.acquire()
-        try:
-            self._state.handle_positions(positions)
-        finally:
-            self.__lock.release()
+        self._state.handle_positions(positions)
 
     async def order_info_handler(
         self, order_info: OrderInfo, receipt_timestamp
     ) -> None:
-        self.__lock.acquire()
-        try:
-            self._state.handle_order_info(order_info)
-            if self._strategy is not None:
-                self._strategy.handle_order_info(order_info)
-        finally:
-            self.__lock.release()
-
-    def set_strategy(self, strategy: SimpleStrategy) -> None:
+        # Parsed once by the state, the strategy is handed the same order
+        order = self._state.handle_order_info(order_info)
+        if self._scheduler is not None:
+            self._scheduler.invalidate()
+        if self._strategy is not None:
+            self._strategy.handle_order_info(order_info, order)
+
+    def set_strategy(self, strategy: Strategy) -> None:
         if self._strategy is None:
             self._strategy = strategy
+            if self._scheduler is not None:
+                self._scheduler.bind(
+                    strategy.process_strategy, lambda: self._state.top_market
+                )
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        # The loop driving the feeds, must be bound before call_threadsafe is
+        # used from other threads
+        self._loop = loop
+
+    def call_threadsafe(self, callback: Callable, *args) -> None:
+        # Entry point for other threads, the call runs on the loop thread
+        if self._loop is None:
+            raise RuntimeError("No event loop bound to the message handler")
+        if _running_loop() is self._loop:
+            callback(*args)
+        else:
+            self._loop.call_soon_threadsafe(callback, *args)
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
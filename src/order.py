@@ -1,50 +1,94 @@
 import asyncio
-from asyncio import Future
-from dataclasses import dataclass
-from decimal import Decimal
-from typing import Callable
+import itertools
+import json
+import time
+from asyncio import Future, Task
+from typing import Callable, Dict, List, NamedTuple, Optional
 
-from cryptofeed.defines import GOOD_TIL_CANCELED, LIMIT
-from cryptofeed.exchange import RestExchange
+from cryptofeed.defines import BUY, DELETE, GOOD_TIL_CANCELED, LIMIT, POST, PUT
+from cryptofeed.exchanges.mixins.binance_rest import BinanceRestMixin
 from cryptofeed.types import OrderInfo
 
+from event_log import get_logger
+from instrument import Instrument
+from order_transport import OrderTransport
 
-@dataclass
-class Order:
-    symbol: str
-    side: str
-    size: float
-    price: Decimal
-    order_id: str
-
-    def __init__(
-        self, symbol: str, side: str, size: float, price: Decimal, order_id: str = None
-    ):
-        self._symbol = symbol
-        self._side = side
-        self._size = size
-        self._price = price
-        self._order_id = order_id
+ORDER = "order"
+BATCH_ORDERS = "batchOrders"
+LIMIT_ORDER = BinanceRestMixin.order_options[LIMIT]
+GOOD_TIL_CANCELED_ORDER = BinanceRestMixin.order_options[GOOD_TIL_CANCELED]
+MAX_BATCH_INSERTS = 5
+MAX_BATCH_CANCELS = 10
+MAX_BATCH_MODIFIES = 5
+# Request weights, batch cancels weigh as much as a single request
+ORDER_WEIGHT = 1
+BATCH_ORDERS_WEIGHT = 5
+BATCH_CANCEL_WEIGHT = 1
+# Binance error code for requests over a rate limit
+TOO_MANY_REQUESTS = -1003
+CLIENT_ORDER_ID_PREFIX = "bt"
 
-    @property
-    def symbol(self) -> str:
-        return self._symbol
+LOG = get_logger(__name__)
 
-    @property
-    def side(self) -> str:
-        return self._side
+# Client order ids are unique per process run, prefixed with the start time so
+# ids from a previous run are not reused
+_client_order_session = format(int(time.time() * 1000), "x")
+_client_order_counter = itertools.count(1)
 
-    @property
-    def size(self) -> float:
-        return self._size
+
+class OrderRejectedError(Exception):
+    # Raised for a single order rejected within an otherwise successful batch
+    def __init__(self, code: int, message: str):
+        super().__init__(f"Order rejected with code {code}: {message}")
+        self.code = code
+        self.message = message
+
+
+class Order(NamedTuple):
+    """An immutable order record, size in lots and price in ticks.
+
+    As a named tuple it carries no instance dictionary and its fields are
+    read without a property call. A new version replaces it on every change,
+    with the previous versions kept in replace_chain. Size is the original
+    quantity as the exchange reports and modifies it, filled the cumulative
+    filled quantity of it.
+    """
+
+    symbol: str
+    side: str
+    size: int
+    price: int
+    order_id: str = None
+    client_order_id: str = None
+    replaces: Optional["Order"] = None
+    filled: int = 0
 
     @property
-    def price(self) -> Decimal:
-        return self._price
+    def remaining(self) -> int:
+        # Lots still resting on the book
+        return self.size - self.filled
 
     @property
-    def order_id(self) -> str:
-        return self._order_id
+    def replace_chain(self) -> List["Order"]:
+        # Previous versions of this order, most recent first
+        chain = []
+        previous = self.replaces
+        while previous is not None:
+            chain.append(previous)
+            previous = previous.replaces
+        return chain
+
+    def replace(self, price: int) -> "Order":
+        return Order(
+            self.symbol,
+            self.side,
+            self.size,
+            price,
+            self.order_id,
+            self.client_order_id,
+            self,
+            self.filled,
+        )
 
     def __eq__(self, other):
         if not isinstance(other, Order):
@@ -57,45 +101,210 @@ class Order:
             and self.price == other.price
         )
 
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    # Equality leaves out the ids, orders are not hashed
+    __hash__ = None
 
-def order_from_order_info(order_info: OrderInfo) -> Order:
+
+def order_from_order_info(order_info: OrderInfo, instrument: Instrument) -> Order:
+    # Parsed once per event, the same order is handed to state and strategy
+    raw_order = order_info.raw["o"]
+    size = instrument.to_lots(order_info.amount)
+    remaining = order_info.remaining
     return Order(
-        symbol=order_info.symbol,
-        side=order_info.side,
-        size=float(order_info.amount),
-        price=Decimal(order_info.raw["o"]["p"]),
-        order_id=order_info.id,
+        order_info.symbol,
+        order_info.side,
+        size,
+        instrument.parse_price(raw_order["p"]),
+        order_info.id,
+        raw_order["c"],
+        filled=0 if remaining is None else size - instrument.to_lots(remaining),
     )
 
 
+def new_client_order_id() -> str:
+    return f"{CLIENT_ORDER_ID_PREFIX}-{_client_order_session}-{next(_client_order_counter)}"
+
+
 def send_order(
-    exchange: RestExchange, order: Order, callback: Callable[[Future], None]
+    transport: OrderTransport, order: Order, callback: Callable[[Future], None]
 ) -> None:
-    print(
-        f"Sending order for Symbol({order.symbol}), Side({order.side}), "
-        f"Size({float(order.size)}), Price({order.price})."
-    )
-    task = asyncio.ensure_future(
-        exchange.place_order(
-            symbol=order.symbol,
-            side=order.side,
-            order_type=LIMIT,
-            amount=float(order.size),
-            price=order.price,
-            time_in_force=GOOD_TIL_CANCELED,
-        )
+    parameters = _order_parameters(transport, order)
+    LOG.info(
+        "Sending order for Symbol(%s), Side(%s), Size(%s), Price(%s).",
+        order.symbol,
+        order.side,
+        parameters["quantity"],
+        parameters["price"],
     )
+    task = asyncio.ensure_future(transport.request(POST, ORDER, payload=parameters))
     task.add_done_callback(callback)
 
 
 def cancel_order(
-    exchange: RestExchange, order: Order, callback: Callable[[Future], None]
+    transport: OrderTransport, order: Order, callback: Callable[[Future], None]
 ) -> None:
-    print(
-        f"Sending cancel for order Id({order.order_id}), Symbol({order.symbol}), Side({order.side}), "
-        f"Size({order.size}), Price({order.price})."
+    instrument = transport.instrument(order.symbol)
+    LOG.info(
+        "Sending cancel for order Id(%s), Symbol(%s), Side(%s), Size(%s), Price(%s).",
+        order.order_id,
+        order.symbol,
+        order.side,
+        instrument.format_size(order.size),
+        instrument.format_price(order.price),
     )
+    payload = {
+        "symbol": transport.exchange_symbol(order.symbol),
+        "orderId": order.order_id,
+    }
+    task = asyncio.ensure_future(transport.request(DELETE, ORDER, payload=payload))
+    task.add_done_callback(callback)
+
+
+def send_orders(
+    transport: OrderTransport,
+    orders: List[Order],
+    callbacks: List[Callable[[Future], None]],
+) -> None:
+    batch = [_order_parameters(transport, order) for order in orders]
+    for order, parameters in zip(orders, batch):
+        LOG.info(
+            "Sending batched order for Symbol(%s), Side(%s), Size(%s), Price(%s).",
+            order.symbol,
+            order.side,
+            parameters["quantity"],
+            parameters["price"],
+        )
+    payload = {"batchOrders": json.dumps(batch, separators=(",", ":"))}
+    task = asyncio.ensure_future(transport.request(POST, BATCH_ORDERS, payload=payload))
+    _dispatch_batch_results(task, callbacks)
+
+
+def cancel_orders(
+    transport: OrderTransport,
+    orders: List[Order],
+    callbacks: List[Callable[[Future], None]],
+) -> None:
+    instrument = transport.instrument(orders[0].symbol)
+    for order in orders:
+        LOG.info(
+            "Sending batched cancel for order Id(%s), Symbol(%s), Side(%s), "
+            "Size(%s), Price(%s).",
+            order.order_id,
+            order.symbol,
+            order.side,
+            instrument.format_size(order.size),
+            instrument.format_price(order.price),
+        )
+    payload = {
+        "symbol": transport.exchange_symbol(orders[0].symbol),
+        "orderIdList": json.dumps(
+            [int(order.order_id) for order in orders], separators=(",", ":")
+        ),
+    }
     task = asyncio.ensure_future(
-        exchange.cancel_order(symbol=order.symbol, order_id=order.order_id)
+        transport.request(DELETE, BATCH_ORDERS, payload=payload)
     )
+    _dispatch_batch_results(task, callbacks)
+
+
+def modify_order(
+    transport: OrderTransport, order: Order, callback: Callable[[Future], None]
+) -> None:
+    parameters = _modify_parameters(transport, order)
+    LOG.info(
+        "Sending modify for order Id(%s), Symbol(%s), Side(%s), Size(%s), "
+        "Price(%s) -> Price(%s).",
+        order.order_id,
+        order.symbol,
+        order.side,
+        parameters["quantity"],
+        transport.instrument(order.symbol).format_price(order.replaces.price),
+        parameters["price"],
+    )
+    task = asyncio.ensure_future(transport.request(PUT, ORDER, payload=parameters))
     task.add_done_callback(callback)
+
+
+def modify_orders(
+    transport: OrderTransport,
+    orders: List[Order],
+    callbacks: List[Callable[[Future], None]],
+) -> None:
+    instrument = transport.instrument(orders[0].symbol)
+    batch = [_modify_parameters(transport, order) for order in orders]
+    for order, parameters in zip(orders, batch):
+        LOG.info(
+            "Sending batched modify for order Id(%s), Symbol(%s), Side(%s), "
+            "Size(%s), Price(%s) -> Price(%s).",
+            order.order_id,
+            order.symbol,
+            order.side,
+            parameters["quantity"],
+            instrument.format_price(order.replaces.price),
+            parameters["price"],
+        )
+    payload = {"batchOrders": json.dumps(batch, separators=(",", ":"))}
+    task = asyncio.ensure_future(transport.request(PUT, BATCH_ORDERS, payload=payload))
+    _dispatch_batch_results(task, callbacks)
+
+
+def _order_parameters(transport: OrderTransport, order: Order) -> Dict[str, str]:
+    # Ticks and lots are only turned into decimal strings here
+    instrument = transport.instrument(order.symbol)
+    parameters = {
+        "symbol": transport.exchange_symbol(order.symbol),
+        "side": "BUY" if order.side == BUY else "SELL",
+        "type": LIMIT_ORDER,
+        "quantity": instrument.format_size(order.size),
+        "price": instrument.format_price(order.price),
+        "timeInForce": GOOD_TIL_CANCELED_ORDER,
+    }
+    if order.client_order_id is not None:
+        parameters["newClientOrderId"] = order.client_order_id
+    return parameters
+
+
+def _modify_parameters(transport: OrderTransport, order: Order) -> Dict[str, str]:
+    instrument = transport.instrument(order.symbol)
+    return {
+        "symbol": transport.exchange_symbol(order.symbol),
+        "orderId": str(order.order_id),
+        "side": "BUY" if order.side == BUY else "SELL",
+        "quantity": instrument.format_size(order.size),
+        "price": instrument.format_price(order.price),
+    }
+
+
+def _dispatch_batch_results(
+    task: Task, callbacks: List[Callable[[Future], None]]
+) -> None:
+    # Splits a batch response into one future per order, so callers receive
+    # the same per-order callback as with single order requests
+    loop = asyncio.get_event_loop()
+    futures = []
+    for callback in callbacks:
+        future = loop.create_future()
+        future.add_done_callback(callback)
+        futures.append(future)
+
+    def on_batch_done(done: Task) -> None:
+        if done.cancelled():
+            for future in futures:
+                future.cancel()
+            return
+        if done.exception() is not None:
+            for future in futures:
+                future.set_exception(done.exception())
+            return
+
+        for future, result in zip(futures, done.result()):
+            if "code" in result and "orderId" not in result:
+                future.set_exception(OrderRejectedError(result["code"], result["msg"]))
+            else:
+                future.set_result(result)
+
+    task.add_done_callback(on_batch_done)
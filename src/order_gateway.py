@@ -0,0 +1,141 @@
+import asyncio
+from asyncio import Future
+from typing import Callable, List, Tuple
+
+from event_log import get_logger
+from latency import LatencyMetrics, RequestKind
+from order import (
+    BATCH_CANCEL_WEIGHT,
+    BATCH_ORDERS_WEIGHT,
+    MAX_BATCH_CANCELS,
+    MAX_BATCH_INSERTS,
+    MAX_BATCH_MODIFIES,
+    ORDER_WEIGHT,
+    TOO_MANY_REQUESTS,
+    Order,
+    OrderRejectedError,
+    cancel_order,
+    cancel_orders,
+    modify_order,
+    modify_orders,
+    send_order,
+    send_orders,
+)
+from order_transport import OrderTransport
+from sandbox_get_override import cancel_all_orders
+
+LOG = get_logger(__name__)
+
+
+class OrderGateway:
+    """Collects order requests and sends them as batches on flush.
+
+    Inserts, cancels and modifies issued during one strategy pass are queued
+    and then coalesced into batchOrders requests, falling back to the single
+    order endpoints when only one request of a kind is queued. Requests the
+    rate limits of the transport do not allow are failed without being sent.
+    """
+
+    def __init__(self, transport: OrderTransport, latency: LatencyMetrics = None):
+        self._transport = transport
+        self._latency = latency or LatencyMetrics()
+        self._inserts: List[Tuple[Order, Callable[[Future], None]]] = []
+        self._cancels: List[Tuple[Order, Callable[[Future], None]]] = []
+        self._modifies: List[Tuple[Order, Callable[[Future], None]]] = []
+
+    @property
+    def has_queued_requests(self) -> bool:
+        return bool(self._inserts or self._cancels or self._modifies)
+
+    def send_order(self, order: Order, callback: Callable[[Future], None]) -> None:
+        self._latency.decided(order.client_order_id, RequestKind.INSERT)
+        self._inserts.append((order, callback))
+
+    def cancel_order(self, order: Order, callback: Callable[[Future], None]) -> None:
+        self._latency.decided(order.client_order_id, RequestKind.CANCEL)
+        self._cancels.append((order, callback))
+
+    def modify_order(self, order: Order, callback: Callable[[Future], None]) -> None:
+        # The order is expected to be the replacement produced by Order.replace
+        self._latency.decided(order.client_order_id, RequestKind.MODIFY)
+        self._modifies.append((order, callback))
+
+    def cancel_all_orders(self, asset: str) -> None:
+        # Queued requests are superseded by a cancel all
+        self._inserts = []
+        self._cancels = []
+        self._modifies = []
+        cancel_all_orders(self._transport, asset)
+
+    def flush(self) -> None:
+        if not self.has_queued_requests:
+            return
+
+        cancels, self._cancels = self._cancels, []
+        modifies, self._modifies = self._modifies, []
+        inserts, self._inserts = self._inserts, []
+
+        # Cancels go first so that they are not queued behind new orders, and
+        # may use the budget held back from inserts and modifies
+        for batch in _chunks(cancels, MAX_BATCH_CANCELS):
+            weight = ORDER_WEIGHT if len(batch) == 1 else BATCH_CANCEL_WEIGHT
+            if self.__acquire(batch, weight, 0, cancel=True):
+                self.__send(batch, RequestKind.CANCEL, cancel_order, cancel_orders)
+
+        for batch in _chunks(modifies, MAX_BATCH_MODIFIES):
+            weight = ORDER_WEIGHT if len(batch) == 1 else BATCH_ORDERS_WEIGHT
+            if self.__acquire(batch, weight, len(batch)):
+                self.__send(batch, RequestKind.MODIFY, modify_order, modify_orders)
+
+        for batch in _chunks(inserts, MAX_BATCH_INSERTS):
+            weight = ORDER_WEIGHT if len(batch) == 1 else BATCH_ORDERS_WEIGHT
+            if self.__acquire(batch, weight, len(batch)):
+                self.__send(batch, RequestKind.INSERT, send_order, send_orders)
+
+    def __acquire(
+        self,
+        batch: List[Tuple[Order, Callable[[Future], None]]],
+        weight: int,
+        orders: int,
+        cancel: bool = False,
+    ) -> bool:
+        # Requests over a limit are rejected here rather than by the exchange,
+        # callbacks see the same error as a rejection of a batched order
+        rate_limits = self._transport.rate_limits
+        if rate_limits.allows(weight, orders, cancel):
+            rate_limits.consume(weight, orders)
+            return True
+
+        rate_limits.throttle(len(batch))
+        LOG.warning("Rate limits reached, not sending %s requests.", len(batch))
+        loop = asyncio.get_event_loop()
+        for _, callback in batch:
+            future = loop.create_future()
+            future.add_done_callback(callback)
+            future.set_exception(
+                OrderRejectedError(TOO_MANY_REQUESTS, "Rate limited locally.")
+            )
+        return False
+
+    def __send(
+        self,
+        batch: List[Tuple[Order, Callable[[Future], None]]],
+        kind: str,
+        single: Callable,
+        multiple: Callable,
+    ) -> None:
+        for order, _ in batch:
+            self._latency.sent(order.client_order_id, kind)
+        if len(batch) == 1:
+            order, callback = batch[0]
+            single(transport=self._transport, order=order, callback=callback)
+        else:
+            multiple(
+                transport=self._transport,
+                orders=[order for order, _ in batch],
+                callbacks=[callback for _, callback in batch],
+            )
+
+
+def _chunks(requests: List, size: int) -> List[List]:
+    return [requests[i : i + size] for i in range(0, len(requests), size)]
@@ -0,0 +1,309 @@
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from cryptofeed.defines import BUY, SELL
+
+from order import Order
+
+
+class OrderStatus:
+    PENDING_NEW = "pending_new"
+    LIVE = "live"
+    PENDING_CANCEL = "pending_cancel"
+    PENDING_REPLACE = "pending_replace"
+    DONE = "done"
+
+
+LATENCY_HISTORY = 1000
+
+OPEN_STATUSES = (
+    OrderStatus.LIVE,
+    OrderStatus.PENDING_CANCEL,
+    OrderStatus.PENDING_REPLACE,
+)
+
+
+class OrderRegistry:
+    """Our orders indexed by order id, client order id, side and price level.
+
+    Orders sent but not yet acknowledged are resolved through their client
+    order id once the REST ack or the feed confirmation arrives. Orders without
+    one are queued per side and price and matched first in first out. Every
+    lifecycle transition is a dictionary update, and per side status counts are
+    maintained so that no query has to scan all orders.
+    """
+
+    def __init__(self):
+        self._orders: Dict[str, Order] = {}
+        self._status: Dict[str, str] = {}
+        self._replacements: Dict[str, Order] = {}
+        self._by_price: Dict[str, Dict[int, Dict[str, Order]]] = {
+            BUY: {},
+            SELL: {},
+        }
+        self._pending_new: Dict[Tuple[str, int], List[Order]] = {}
+        self._pending_by_client_id: Dict[str, Order] = {}
+        self._client_ids: Dict[str, str] = {}
+        self._acked_at: Dict[str, float] = {}
+        self._confirmed_at: Dict[str, float] = {}
+        self._ack_to_feed_latencies: Deque[float] = deque(maxlen=LATENCY_HISTORY)
+        self._counts: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __contains__(self, order_id: str) -> bool:
+        return order_id in self._orders
+
+    @property
+    def ack_to_feed_latencies(self) -> Deque[float]:
+        # Seconds between the REST ack and the feed confirmation of new orders,
+        # negative when the feed confirmation arrived first
+        return self._ack_to_feed_latencies
+
+    def get(self, order_id: str) -> Optional[Order]:
+        return self._orders.get(order_id)
+
+    def get_by_client_id(self, client_order_id: str) -> Optional[Order]:
+        order_id = self._client_ids.get(client_order_id)
+        if order_id in self._orders:
+            return self._orders[order_id]
+        return self._pending_by_client_id.get(client_order_id)
+
+    def status(self, order_id: str) -> str:
+        return self._status.get(order_id, OrderStatus.DONE)
+
+    def replacement(self, order_id: str) -> Optional[Order]:
+        return self._replacements.get(order_id)
+
+    def count(self, status: str, side: str = None) -> int:
+        if side is None:
+            return self._counts[(BUY, status)] + self._counts[(SELL, status)]
+        return self._counts[(side, status)]
+
+    def open_count(self, side: str = None) -> int:
+        return sum(self.count(status, side) for status in OPEN_STATUSES)
+
+    def open_orders(self, side: str = None) -> List[Order]:
+        # Orders acknowledged by the exchange, including those being cancelled
+        if side is None:
+            return list(self._orders.values())
+        return [
+            order
+            for orders in self._by_price[side].values()
+            for order in orders.values()
+        ]
+
+    def at_price(self, side: str, price: int) -> List[Order]:
+        return list(self._by_price[side].get(price, {}).values())
+
+    def add_pending(self, order: Order) -> None:
+        self._pending_new.setdefault((order.side, order.price), []).append(order)
+        if order.client_order_id is not None:
+            self._pending_by_client_id[order.client_order_id] = order
+        self._counts[(order.side, OrderStatus.PENDING_NEW)] += 1
+
+    def reject_pending(self, order: Order) -> bool:
+        # Drops an order whose insert failed, matched on identity so that other
+        # pending orders at the same price are kept
+        pending = self._pending_new.get((order.side, order.price), [])
+        for i, pending_order in enumerate(pending):
+            if pending_order is order:
+                self.__pop_pending(order.side, order.price, i)
+                self._pending_by_client_id.pop(order.client_order_id, None)
+                return True
+        return False
+
+    def acknowledge(self, client_order_id: str, order_id: str) -> None:
+        # REST ack for an insert, the feed confirmation may arrive either side
+        if (
+            client_order_id not in self._pending_by_client_id
+            and order_id not in self._orders
+        ):
+            return
+        self._client_ids[client_order_id] = order_id
+        now = time.perf_counter()
+        confirmed_at = self._confirmed_at.pop(order_id, None)
+        if confirmed_at is not None:
+            self._ack_to_feed_latencies.append(confirmed_at - now)
+        elif order_id not in self._orders:
+            self._acked_at[order_id] = now
+
+    def confirm(self, order: Order) -> Order:
+        # Duplicate confirmations keep the order already registered
+        if order.order_id in self._orders:
+            return self._orders[order.order_id]
+
+        self.__record_confirmation(order)
+        self.__match_pending(order)
+        self._orders[order.order_id] = order
+        if order.client_order_id is not None:
+            self._client_ids[order.client_order_id] = order.order_id
+        self._by_price[order.side].setdefault(order.price, {})[order.order_id] = order
+        self.__set_status(order, OrderStatus.LIVE)
+        return order
+
+    def request_cancel(self, order_id: str) -> bool:
+        # Returns whether a cancel should be sent for the order
+        if self._status.get(order_id) not in (
+            OrderStatus.LIVE,
+            OrderStatus.PENDING_REPLACE,
+        ):
+            return False
+        self._replacements.pop(order_id, None)
+        self.__set_status(self._orders[order_id], OrderStatus.PENDING_CANCEL)
+        return True
+
+    def cancel_failed(self, order_id: str) -> None:
+        if self._status.get(order_id) == OrderStatus.PENDING_CANCEL:
+            self.__set_status(self._orders[order_id], OrderStatus.LIVE)
+
+    def request_replace(self, replacement: Order) -> bool:
+        # Returns whether a modify should be sent for the order
+        order_id = replacement.order_id
+        if self._status.get(order_id) != OrderStatus.LIVE:
+            return False
+        self._replacements[order_id] = replacement
+        self.__set_status(self._orders[order_id], OrderStatus.PENDING_REPLACE)
+        return True
+
+    def replace_failed(self, order_id: str) -> None:
+        self._replacements.pop(order_id, None)
+        if self._status.get(order_id) == OrderStatus.PENDING_REPLACE:
+            self.__set_status(self._orders[order_id], OrderStatus.LIVE)
+
+    def replace(self, order: Order) -> Order:
+        # Amended orders keep their order id, the new version replaces the old one
+        self._replacements.pop(order.order_id, None)
+        previous = self._orders.get(order.order_id)
+        if previous is None:
+            return self.confirm(order)
+
+        status = self._status[order.order_id]
+        self.__unindex(previous)
+        replaced = Order(
+            symbol=order.symbol,
+            side=order.side,
+            size=order.size,
+            price=order.price,
+            order_id=order.order_id,
+            client_order_id=previous.client_order_id,
+            replaces=previous,
+            filled=max(order.filled, previous.filled),
+        )
+        self._orders[order.order_id] = replaced
+        self._by_price[order.side].setdefault(order.price, {})[
+            order.order_id
+        ] = replaced
+        if status == OrderStatus.PENDING_REPLACE:
+            status = OrderStatus.LIVE
+        self.__set_status(replaced, status)
+        return replaced
+
+    def reconcile(self, open_orders: List[Order]) -> Tuple[int, int, int]:
+        # Brings the registry in line with the exchange's open orders after a
+        # feed gap, returns the number of orders added, changed and removed.
+        # Pending inserts not acknowledged yet are left to their REST responses
+        exchange_orders = {order.order_id: order for order in open_orders}
+        removed = [
+            order_id for order_id in self._orders if order_id not in exchange_orders
+        ]
+        for order_id in removed:
+            self.remove(order_id)
+        # Acknowledged inserts whose confirmation was lost in the gap are
+        # confirmed below if still open, otherwise they were done within it
+        for client_order_id, order in list(self._pending_by_client_id.items()):
+            order_id = self._client_ids.get(client_order_id)
+            if order_id is not None and order_id not in exchange_orders:
+                self.reject_pending(order)
+                self._client_ids.pop(client_order_id)
+                self._acked_at.pop(order_id, None)
+                removed.append(order_id)
+
+        added = changed = 0
+        for order in open_orders:
+            known = self._orders.get(order.order_id)
+            if known is None:
+                self.confirm(order)
+                added += 1
+            elif known.price != order.price or known.size != order.size:
+                self.replace(order)
+                changed += 1
+            elif known.filled != order.filled:
+                self.fill(order.order_id, order.filled)
+                changed += 1
+        return added, changed, len(removed)
+
+    def fill(self, order_id: str, filled: int) -> Optional[Order]:
+        # Records the cumulative filled size of a partially filled order, which
+        # keeps its status and place in the indexes
+        order = self._orders.get(order_id)
+        if order is None or filled <= order.filled:
+            return order
+        order = order._replace(filled=filled)
+        self._orders[order_id] = order
+        self._by_price[order.side][order.price][order_id] = order
+        return order
+
+    def remove(self, order_id: str) -> Optional[Order]:
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return None
+        self._replacements.pop(order_id, None)
+        self._client_ids.pop(order.client_order_id, None)
+        self._acked_at.pop(order_id, None)
+        self._confirmed_at.pop(order_id, None)
+        self.__unindex(order)
+        self.__set_status(order, OrderStatus.DONE)
+        self._status.pop(order_id, None)
+        return order
+
+    def __record_confirmation(self, order: Order) -> None:
+        now = time.perf_counter()
+        acked_at = self._acked_at.pop(order.order_id, None)
+        if acked_at is not None:
+            self._ack_to_feed_latencies.append(now - acked_at)
+        elif order.client_order_id in self._pending_by_client_id:
+            # Confirmed before the REST ack, kept until the ack arrives
+            self._confirmed_at[order.order_id] = now
+
+    def __match_pending(self, order: Order) -> None:
+        pending_order = self._pending_by_client_id.pop(order.client_order_id, None)
+        if pending_order is not None:
+            self.reject_pending(pending_order)
+            return
+
+        # Without a client order id, matches the oldest pending order on the
+        # same side and price, preferring one of the same size
+        pending = self._pending_new.get((order.side, order.price))
+        if not pending:
+            return
+        index = next(
+            (i for i, pending_order in enumerate(pending) if pending_order == order),
+            0,
+        )
+        self.__pop_pending(order.side, order.price, index)
+
+    def __pop_pending(self, side: str, price: int, index: int) -> None:
+        pending = self._pending_new[(side, price)]
+        del pending[index]
+        if not pending:
+            del self._pending_new[(side, price)]
+        self._counts[(side, OrderStatus.PENDING_NEW)] -= 1
+
+    def __unindex(self, order: Order) -> None:
+        level = self._by_price[order.side].get(order.price)
+        if level is None:
+            return
+        level.pop(order.order_id, None)
+        if not level:
+            del self._by_price[order.side][order.price]
+
+    def __set_status(self, order: Order, status: str) -> None:
+        previous = self._status.get(order.order_id)
+        if previous is not None:
+            self._counts[(order.side, previous)] -= 1
+        if status != OrderStatus.DONE:
+            self._counts[(order.side, status)] += 1
+        self._status[order.order_id] = status
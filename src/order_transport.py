@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import hmac
+import time
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlencode
+
+import aiohttp
+from cryptofeed.defines import GET
+from cryptofeed.exchanges.mixins.binance_rest import BinanceRestMixin
+from yapic import json
+
+from event_log import get_logger
+from instrument import Instrument
+from rate_limits import (
+    IP_BANNED_STATUS,
+    RETRY_AFTER_HEADER,
+    TOO_MANY_REQUESTS_STATUS,
+    RateLimitTracker,
+)
+from sandbox_get_override import SANDBOX_REST_API, SANDBOX_REST_ORDER
+
+PING = "ping"
+API_KEY_HEADER = "X-MBX-APIKEY"
+
+# Binance closes idle connections after a while, pinging more often than that
+# keeps the pooled connections and their TLS sessions alive
+KEEPALIVE_TIMEOUT = 60
+KEEPALIVE_INTERVAL = 20
+LIMIT_PER_HOST = 8
+WARM_CONNECTIONS = 4
+DNS_CACHE_TTL = 300
+
+LOG = get_logger(__name__)
+
+
+class OrderTransport:
+    """Signed REST requests over a long lived, pooled HTTP session.
+
+    The session and its connector are owned here rather than by cryptofeed so
+    connection reuse, DNS caching and keep-alive on the order path can be
+    tuned. The HMAC key schedule is computed once and copied per request.
+    Every response updates the rate limit budgets from its headers.
+    """
+
+    def __init__(
+        self,
+        exchange: BinanceRestMixin,
+        api: str = SANDBOX_REST_API,
+        limit_per_host: int = LIMIT_PER_HOST,
+        keepalive_timeout: float = KEEPALIVE_TIMEOUT,
+        dns_cache_ttl: int = DNS_CACHE_TTL,
+        warm_connections: int = WARM_CONNECTIONS,
+        rate_limits: RateLimitTracker = None,
+    ):
+        self._exchange = exchange
+        self._api = api
+        self._limit_per_host = limit_per_host
+        self._keepalive_timeout = keepalive_timeout
+        self._dns_cache_ttl = dns_cache_ttl
+        self._warm_connections = warm_connections
+        self._headers = {API_KEY_HEADER: str(exchange.key_id)}
+        self._hmac = hmac.new(
+            str(exchange.key_secret).encode("utf8"), digestmod=hashlib.sha256
+        )
+        self._instruments: Dict[str, Instrument] = {}
+        self._rate_limits = rate_limits or RateLimitTracker()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._keepalive_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._session is not None and not self._session.closed
+
+    @property
+    def rate_limits(self) -> RateLimitTracker:
+        return self._rate_limits
+
+    def exchange_symbol(self, symbol: str) -> str:
+        return self._exchange.std_symbol_to_exchange_symbol(symbol)
+
+    def instrument(self, symbol: str) -> Instrument:
+        return self._instruments[symbol]
+
+    def add_instruments(self, instruments: Iterable[Instrument]) -> None:
+        # Tick and lot sizes used to format the orders of each symbol
+        for instrument in instruments:
+            self._instruments[instrument.symbol] = instrument
+
+    async def open(self) -> None:
+        if self.is_open:
+            return
+        connector = aiohttp.TCPConnector(
+            limit_per_host=self._limit_per_host,
+            keepalive_timeout=self._keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self._dns_cache_ttl,
+            enable_cleanup_closed=True,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector, headers=self._headers
+        )
+
+    async def warm_up(self) -> None:
+        # Concurrent pings force the connector to open several connections,
+        # paying DNS, TCP and TLS setup before the first order is sent
+        await self.open()
+        await asyncio.gather(
+            *(
+                self.request(GET, PING, auth=False)
+                for _ in range(self._warm_connections)
+            )
+        )
+
+    def start_keepalive(self, interval: float = KEEPALIVE_INTERVAL) -> None:
+        if self._keepalive_task is None:
+            self._keepalive_task = asyncio.ensure_future(self.__keepalive(interval))
+
+    async def close(self) -> None:
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
+        if self.is_open:
+            await self._session.close()
+
+    async def request(
+        self,
+        method: str,
+        endpoint: str,
+        payload: Dict = None,
+        auth: bool = True,
+        api: str = SANDBOX_REST_ORDER,
+    ):
+        if not self.is_open:
+            await self.open()
+
+        query_string = urlencode(payload) if payload else ""
+        if auth:
+            timestamp = f"timestamp={int(time.time() * 1000)}"
+            query_string = f"{query_string}&{timestamp}" if query_string else timestamp
+            query_string = f"{query_string}&signature={self._sign(query_string)}"
+
+        url = f"{self._api}{api}{endpoint}"
+        if query_string:
+            url = f"{url}?{query_string}"
+        async with self._session.request(method, url) as response:
+            data = await response.read()
+            self._rate_limits.update(response.headers)
+            if response.status in (TOO_MANY_REQUESTS_STATUS, IP_BANNED_STATUS):
+                self._rate_limits.back_off(
+                    response.status, response.headers.get(RETRY_AFTER_HEADER)
+                )
+            response.raise_for_status()
+        return json.loads(data, parse_float=Decimal)
+
+    def _sign(self, query_string: str) -> str:
+        signature = self._hmac.copy()
+        signature.update(query_string.encode("utf8"))
+        return signature.hexdigest()
+
+    async def __keepalive(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.warm_up()
+            except (asyncio.TimeoutError, aiohttp.ClientError) as error:
+                LOG.warning("Connection keepalive failed: %r", error)
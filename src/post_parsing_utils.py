@@ -1,6 +1,8 @@
-from decimal import Decimal
 from typing import Dict, List
 
+from cryptofeed.defines import BUY, SELL
+
+from instrument import Instrument
 from order import Order
 
 POSITION_AMOUNT_KEY = "positionAmt"
@@ -9,6 +11,7 @@ POSITION_KEY = "positions"
 SIDE_KEY = "side"
 PRICE_KEY = "price"
 ORDER_ID_KEY = "orderId"
+CLIENT_ORDER_ID_KEY = "clientOrderId"
 ORIGINAL_QTY_KEY = "origQty"
 EXECUTED_QTY_KEY = "executedQty"
 
@@ -28,21 +31,21 @@ def get_balance_for_asset(account_info: Dict, asset: str) -> float:
 
 
 def get_open_orders_from_info(
-    open_orders_info: Dict, asset: str, symbol: str
+    open_orders_info: Dict, asset: str, symbol: str, instrument: Instrument
 ) -> List[Order]:
     open_orders = []
     for order_info in open_orders_info:
         if not order_info[SYMBOL_KEY] == asset:
             continue
-        size = Decimal(order_info[ORIGINAL_QTY_KEY]) - Decimal(
-            order_info[EXECUTED_QTY_KEY]
-        )
+        # REST sides are upper case, orders use the cryptofeed sides
         order = Order(
             symbol=symbol,
-            side=order_info[SIDE_KEY],
-            size=size,
-            price=Decimal(order_info[PRICE_KEY]),
-            order_id=order_info[ORDER_ID_KEY],
+            side=BUY if order_info[SIDE_KEY] == "BUY" else SELL,
+            size=instrument.parse_size(order_info[ORIGINAL_QTY_KEY]),
+            price=instrument.parse_price(order_info[PRICE_KEY]),
+            order_id=str(order_info[ORDER_ID_KEY]),
+            client_order_id=order_info[CLIENT_ORDER_ID_KEY],
+            filled=instrument.parse_size(order_info[EXECUTED_QTY_KEY]),
         )
         open_orders.append(order)
     return open_orders
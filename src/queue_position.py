@@ -0,0 +1,128 @@
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from cryptofeed.defines import BUY, SELL
+
+from local_book import BookSide, LocalBook
+from order import Order
+
+# Book side our orders rest on, and the side a taker of each side trades against
+ORDER_BOOK_SIDES = {BUY: BookSide.BID, SELL: BookSide.ASK}
+TAKER_BOOK_SIDES = {SELL: BookSide.BID, BUY: BookSide.ASK}
+
+
+class QueuePosition(NamedTuple):
+    # Lots of other participants queued before and after the order
+    ahead: int
+    behind: int
+
+
+class QueueEstimator:
+    """Estimated volume ahead of each of our resting orders.
+
+    An order joins the back of its level, so everything else resting there
+    when it is confirmed is ahead of it. Trade prints at the level are taken from
+    the front of the queue. Any other decrease of the level is a cancel,
+    taken from ahead of and behind the order in proportion to the volume on
+    either side, and increases join behind. Only levels with our orders are
+    tracked, each book update compares their depth with the last one seen.
+    """
+
+    def __init__(self):
+        self._ahead: Dict[str, int] = {}
+        self._keys: Dict[str, Tuple[str, int]] = {}
+        self._levels: Dict[Tuple[str, int], Dict[str, Order]] = {}
+        self._depths: Dict[Tuple[str, int], int] = {}
+        # Traded lots not yet seen as a decrease of the level
+        self._traded: Dict[Tuple[str, int], int] = {}
+
+    def __contains__(self, order_id: str) -> bool:
+        return order_id in self._keys
+
+    def position(self, order_id: str) -> Optional[QueuePosition]:
+        key = self._keys.get(order_id)
+        if key is None:
+            return None
+        ahead = self._ahead[order_id]
+        own_size = sum(order.remaining for order in self._levels[key].values())
+        return QueuePosition(ahead, max(self._depths[key] - own_size - ahead, 0))
+
+    def add(self, order: Order, book: LocalBook, in_book: bool = False) -> None:
+        # Others resting at the level are ahead, our earlier orders excluded
+        # and the order itself when the book already shows it
+        key = (ORDER_BOOK_SIDES[order.side], order.price)
+        level = self._levels.setdefault(key, {})
+        own_size = sum(own.remaining for own in level.values())
+        if in_book:
+            own_size += order.remaining
+        depth = book.depth_at(*key)
+        level[order.order_id] = order
+        self._keys[order.order_id] = key
+        self._ahead[order.order_id] = max(depth - own_size, 0)
+        self._depths[key] = depth
+
+    def remove(self, order_id: str) -> None:
+        key = self._keys.pop(order_id, None)
+        if key is None:
+            return
+        del self._ahead[order_id]
+        level = self._levels[key]
+        order = level.pop(order_id)
+        if level:
+            # The level shrinks by the order whether or not the book has shown
+            # it yet
+            self._depths[key] = max(self._depths[key] - order.remaining, 0)
+        else:
+            del self._levels[key]
+            del self._depths[key]
+            self._traded.pop(key, None)
+
+    def filled(self, order: Order) -> None:
+        # A partially filled order was at the front, the level shrinks by the
+        # fill whether or not the book has shown it yet
+        key = self._keys.get(order.order_id)
+        if key is None:
+            return
+        previous = self._levels[key][order.order_id]
+        self._levels[key][order.order_id] = order
+        self._ahead[order.order_id] = 0
+        self._depths[key] = max(
+            self._depths[key] - (previous.remaining - order.remaining), 0
+        )
+
+    def clear(self) -> None:
+        self._ahead.clear()
+        self._keys.clear()
+        self._levels.clear()
+        self._depths.clear()
+        self._traded.clear()
+
+    def traded(self, taker_side: str, price: int, size: int) -> None:
+        key = (TAKER_BOOK_SIDES[taker_side], price)
+        level = self._levels.get(key)
+        if level is None:
+            return
+        for order_id in level:
+            self._ahead[order_id] = max(self._ahead[order_id] - size, 0)
+        self._traded[key] = self._traded.get(key, 0) + size
+
+    def book_updated(self, book: LocalBook) -> None:
+        for key, level in self._levels.items():
+            previous = self._depths[key]
+            depth = book.depth_at(*key)
+            self._depths[key] = depth
+            if depth >= previous:
+                continue
+
+            # Decreases already applied as trades are not counted twice
+            decrease = previous - depth
+            pending = self._traded.pop(key, 0)
+            traded = min(pending, decrease)
+            if pending > traded:
+                self._traded[key] = pending - traded
+            cancelled = decrease - traded
+            others = previous - sum(order.remaining for order in level.values())
+            if cancelled <= 0 or others <= 0:
+                continue
+            for order_id in level:
+                ahead = self._ahead[order_id]
+                self._ahead[order_id] = max(ahead - cancelled * ahead // others, 0)
@@ -0,0 +1,70 @@
+from collections import Counter
+from typing import List, NamedTuple, Sequence
+
+from cryptofeed.defines import BUY, SELL
+
+from order import Order
+
+
+class Quote(NamedTuple):
+    # Target order of a ladder, price in ticks and size in lots
+    side: str
+    price: int
+    size: int
+
+
+class QuoteDiff(NamedTuple):
+    # Targets no live order rests at, and live orders at no target price
+    inserts: List[Quote]
+    cancels: List[Order]
+
+
+class QuoteLadder:
+    """Target orders of one side, levels price_offset apart from the best price.
+
+    The offset of every level is worked out once, building the ladder on a
+    decision is one addition per level. Levels are ordered from the top of
+    the book outwards.
+    """
+
+    def __init__(self, levels: int, price_offset: int, size: int):
+        self._levels = levels
+        self._size = size
+        self._offsets = {
+            BUY: tuple(-level * price_offset for level in range(levels)),
+            SELL: tuple(level * price_offset for level in range(levels)),
+        }
+
+    @property
+    def levels(self) -> int:
+        return self._levels
+
+    def quotes(self, side: str, best_price: int) -> List[Quote]:
+        size = self._size
+        return [
+            Quote(side, best_price + offset, size) for offset in self._offsets[side]
+        ]
+
+
+def diff_quotes(live: Sequence[Order], targets: Sequence[Quote]) -> QuoteDiff:
+    """Fewest inserts and cancels that turn the live orders into the targets.
+
+    Live orders are matched to targets by price, one order per target, and
+    are kept whatever is left of their size so partially filled orders keep
+    their queue priority. Inserts follow the order of targets and cancels the
+    order of live.
+    """
+    wanted = Counter(quote.price for quote in targets)
+    cancels = []
+    for order in live:
+        if wanted[order.price] > 0:
+            wanted[order.price] -= 1
+        else:
+            cancels.append(order)
+
+    inserts = []
+    for quote in targets:
+        if wanted[quote.price] > 0:
+            wanted[quote.price] -= 1
+            inserts.append(quote)
+    return QuoteDiff(inserts, cancels)
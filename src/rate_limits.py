@@ -0,0 +1,179 @@
+import time
+from typing import Callable, Dict, Mapping, Optional
+
+from event_log import get_logger
+
+# Binance futures default limits
+WEIGHT_PER_MINUTE = 2400
+ORDERS_PER_MINUTE = 1200
+ORDERS_PER_10_SECONDS = 300
+# Share of every budget only cancels may spend
+CANCEL_RESERVE = 0.1
+# Seconds to back off when a 429 or 418 response carries no Retry-After
+DEFAULT_RETRY_AFTER = 60
+
+USED_WEIGHT_HEADER = "X-MBX-USED-WEIGHT-"
+ORDER_COUNT_HEADER = "X-MBX-ORDER-COUNT-"
+RETRY_AFTER_HEADER = "Retry-After"
+INTERVAL_UNITS = {"S": 1, "M": 60, "H": 3600, "D": 86400}
+
+TOO_MANY_REQUESTS_STATUS = 429
+IP_BANNED_STATUS = 418
+
+LOG = get_logger(__name__)
+
+
+class RateLimitKind:
+    # Request weight, counted per IP for every REST request
+    WEIGHT = "weight"
+    # New and modified orders, counted per account
+    ORDERS = "orders"
+
+
+class TokenBucket:
+    """Budget of one exchange limit, refilled continuously.
+
+    Tokens are taken when a request is sent and refill at limit per interval.
+    The exchange counts usage within fixed windows instead, so the bucket is
+    pulled down to what the used count headers report whenever those show
+    less room than estimated locally.
+    """
+
+    def __init__(
+        self, limit: int, interval: float, clock: Callable[[], float] = time.monotonic
+    ):
+        self._limit = limit
+        self._interval = interval
+        self._rate = limit / interval
+        self._clock = clock
+        self._tokens = float(limit)
+        self._updated = clock()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def interval(self) -> float:
+        return self._interval
+
+    @property
+    def available(self) -> float:
+        self.__refill()
+        return self._tokens
+
+    def consume(self, amount: int) -> None:
+        self.__refill()
+        self._tokens -= amount
+
+    def sync(self, used: int) -> None:
+        self.__refill()
+        self._tokens = min(self._tokens, self._limit - used)
+
+    def __refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            self._tokens + (now - self._updated) * self._rate, self._limit
+        )
+        self._updated = now
+
+
+class RateLimitTracker:
+    """Remaining request weight and order count budgets of the exchange.
+
+    One token bucket is kept per limit window. Order requests are charged as
+    they are sent and every REST response syncs the buckets from its
+    X-MBX-USED-WEIGHT-* and X-MBX-ORDER-COUNT-* headers, which also account
+    for the requests of other shards on the same account. Inserts and
+    modifies leave cancel_reserve of every budget to cancels, so resting
+    orders can still be pulled close to the limits. After a 429 or 418
+    nothing is allowed until its Retry-After has passed.
+    """
+
+    def __init__(
+        self,
+        weight_per_minute: int = WEIGHT_PER_MINUTE,
+        orders_per_minute: int = ORDERS_PER_MINUTE,
+        orders_per_10_seconds: int = ORDERS_PER_10_SECONDS,
+        cancel_reserve: float = CANCEL_RESERVE,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._buckets = {
+            (RateLimitKind.WEIGHT, 60): TokenBucket(weight_per_minute, 60, clock),
+            (RateLimitKind.ORDERS, 60): TokenBucket(orders_per_minute, 60, clock),
+            (RateLimitKind.ORDERS, 10): TokenBucket(orders_per_10_seconds, 10, clock),
+        }
+        self._cancel_reserve = cancel_reserve
+        self._clock = clock
+        self._blocked_until = float("-inf")
+        self._throttled = 0
+
+    @property
+    def is_blocked(self) -> bool:
+        return self._clock() < self._blocked_until
+
+    @property
+    def throttled(self) -> int:
+        # Requests held back locally rather than sent over a limit
+        return self._throttled
+
+    def remaining(self) -> Dict[str, int]:
+        # Tokens left per limit, e.g. `orders_10s`, for the strategy to query
+        remaining = {
+            f"{kind}_{_interval_name(interval)}": int(bucket.available)
+            for (kind, interval), bucket in self._buckets.items()
+        }
+        remaining["throttled"] = self._throttled
+        return remaining
+
+    def allows(self, weight: int, orders: int = 0, cancel: bool = False) -> bool:
+        if self.is_blocked:
+            return False
+        reserve = 0.0 if cancel else self._cancel_reserve
+        for (kind, _), bucket in self._buckets.items():
+            cost = weight if kind == RateLimitKind.WEIGHT else orders
+            if cost and bucket.available - cost < bucket.limit * reserve:
+                return False
+        return True
+
+    def consume(self, weight: int, orders: int = 0) -> None:
+        for (kind, _), bucket in self._buckets.items():
+            cost = weight if kind == RateLimitKind.WEIGHT else orders
+            if cost:
+                bucket.consume(cost)
+
+    def throttle(self, requests: int = 1) -> None:
+        self._throttled += requests
+
+    def update(self, headers: Mapping[str, str]) -> None:
+        for name, value in headers.items():
+            name = name.upper()
+            if name.startswith(USED_WEIGHT_HEADER):
+                kind, interval = RateLimitKind.WEIGHT, name[len(USED_WEIGHT_HEADER) :]
+            elif name.startswith(ORDER_COUNT_HEADER):
+                kind, interval = RateLimitKind.ORDERS, name[len(ORDER_COUNT_HEADER) :]
+            else:
+                continue
+            bucket = self._buckets.get((kind, _interval_seconds(interval)))
+            if bucket is not None:
+                bucket.sync(int(value))
+
+    def back_off(self, status: int, retry_after: Optional[str] = None) -> None:
+        # 429 warns that a limit was hit, 418 is an IP ban for ignoring those
+        delay = float(retry_after) if retry_after else DEFAULT_RETRY_AFTER
+        self._blocked_until = max(self._blocked_until, self._clock() + delay)
+        LOG.warning(
+            "Rate limited with status %s, holding requests for %ss.", status, delay
+        )
+
+
+def _interval_seconds(name: str) -> Optional[int]:
+    # Header suffixes such as 1M or 10S
+    unit = INTERVAL_UNITS.get(name[-1:])
+    if unit is None or not name[:-1].isdigit():
+        return None
+    return int(name[:-1]) * unit
+
+
+def _interval_name(seconds: int) -> str:
+    return f"{seconds // 60}m" if seconds % 60 == 0 else f"{seconds}s"
@@ -0,0 +1,14 @@
+from typing import Tuple
+
+from cryptofeed.defines import L2_BOOK, TRADES
+
+# Exchange name of recorded and simulated cryptofeed objects
+EXCHANGE = "BINANCE_FUTURES"
+
+# A replayed event, payload of L2_BOOK is (bids, asks, is_snapshot) with
+# bids and asks as lists of (price, size), TRADES, POSITIONS and ORDER_INFO
+# carry the recorded cryptofeed objects
+ReplayEvent = Tuple[float, str, object]
+# Channels of the market itself, recorded POSITIONS and ORDER_INFO are of
+# the live account rather than the simulated one
+MARKET_CHANNELS = (L2_BOOK, TRADES)
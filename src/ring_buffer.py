@@ -0,0 +1,63 @@
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+class RingBuffer:
+    """Last capacity rows of a fixed set of float columns.
+
+    The storage is preallocated at twice the capacity and every row is
+    written to its slot and to the slot capacity further on, so the rows
+    held are always one contiguous stretch of the storage. Appends are O(1)
+    and columns are read as views in append order, oldest first, without
+    copying. Rows must be appended in timestamp order for since.
+    """
+
+    def __init__(self, capacity: int, columns: Sequence[str]):
+        if capacity <= 0:
+            raise ValueError(f"Capacity must be positive, got {capacity}")
+        self._capacity = capacity
+        self._indexes = {name: index for index, name in enumerate(columns)}
+        # Rows are contiguous, one write per row is cheaper than per column
+        self._data = np.zeros((2 * capacity, len(self._indexes)))
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def columns(self) -> Sequence[str]:
+        return tuple(self._indexes)
+
+    def append(self, *values: float) -> None:
+        # One value per column, in the order the columns were given
+        slot = self._next
+        row = self._data[slot]
+        row[:] = values
+        self._data[slot + self._capacity] = row
+        self._next = slot + 1 if slot + 1 < self._capacity else 0
+        if self._count < self._capacity:
+            self._count += 1
+
+    def column(self, name: str, start: int = 0) -> np.ndarray:
+        # View of the rows from index start on, valid until the next append
+        end = self._next + self._capacity
+        return self._data[end - self._count + start : end, self._indexes[name]]
+
+    def last(self, name: str) -> Optional[float]:
+        if not self._count:
+            return None
+        return float(self._data[self._next + self._capacity - 1, self._indexes[name]])
+
+    def since(self, timestamp: float) -> int:
+        # Index of the first row after timestamp
+        return int(np.searchsorted(self.column("timestamp"), timestamp, side="right"))
+
+    def clear(self) -> None:
+        self._next = 0
+        self._count = 0
@@ -0,0 +1,73 @@
+import multiprocessing
+from typing import Dict, Iterable, Optional
+
+from cryptofeed.defines import BUY
+
+from event_log import get_logger
+
+LOG = get_logger(__name__)
+
+
+class RiskAggregator:
+    """Positions of all quoted symbols, shared between shard processes.
+
+    Positions and their entry prices live in shared memory with one slot per
+    symbol. Every symbol is traded by exactly one shard, the only writer of
+    its slots, so they are written without a lock. Once the gross notional
+    across all symbols reaches the limit, only orders reducing a position are
+    allowed.
+    """
+
+    def __init__(
+        self,
+        symbols: Iterable[str],
+        max_gross_notional: Optional[float] = None,
+        context=multiprocessing,
+    ):
+        self._slots = {symbol: slot for slot, symbol in enumerate(symbols)}
+        self._positions = context.RawArray("d", len(self._slots))
+        self._prices = context.RawArray("d", len(self._slots))
+        self._max_gross_notional = max_gross_notional
+        self._limit_reached = False
+
+    @property
+    def max_gross_notional(self) -> Optional[float]:
+        return self._max_gross_notional
+
+    def update(self, symbol: str, position: float, price: float) -> None:
+        slot = self._slots.get(symbol)
+        if slot is None:
+            return
+        self._positions[slot] = position
+        self._prices[slot] = price
+
+    def position(self, symbol: str) -> float:
+        slot = self._slots.get(symbol)
+        return 0.0 if slot is None else self._positions[slot]
+
+    def positions(self) -> Dict[str, float]:
+        return {symbol: self._positions[slot] for symbol, slot in self._slots.items()}
+
+    def gross_notional(self) -> float:
+        return sum(
+            abs(position) * price
+            for position, price in zip(self._positions, self._prices)
+        )
+
+    def allows(self, symbol: str, side: str) -> bool:
+        if self._max_gross_notional is None:
+            return True
+        limit_reached = self.gross_notional() >= self._max_gross_notional
+        if limit_reached != self._limit_reached:
+            self._limit_reached = limit_reached
+            LOG.warning(
+                "Gross notional limit %s %s.",
+                self._max_gross_notional,
+                "reached" if limit_reached else "cleared",
+            )
+        if not limit_reached:
+            return True
+
+        # Over the limit a side may only be quoted to reduce the position
+        position = self.position(symbol)
+        return position < 0 if side == BUY else position > 0
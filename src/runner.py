@@ -0,0 +1,280 @@
+import asyncio
+import atexit
+import multiprocessing
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Type
+
+from cryptofeed import FeedHandler
+from cryptofeed.defines import L2_BOOK, ORDER_INFO, POSITIONS, TRADES
+from cryptofeed.exchanges import BinanceFutures
+from cryptofeed.types import OrderBook, OrderInfo, Position, Trade
+
+from book_scheduler import BookScheduler
+from event_log import get_logger, setup_logging
+from instrument import load_instruments
+from latency import METRICS_PORT, LatencyMetrics
+from local_exchange import local_binance_futures
+from market_data import MarketDataRecorder
+from message_handler import MessageHandler
+from order_transport import OrderTransport
+from post_parsing_utils import get_balance_for_asset
+from risk import RiskAggregator
+from sandbox_get_override import cancel_all_orders, get_account_info
+from simple_strategy import RequoteMode, SimpleStrategy
+from state import State
+from user_data import UserDataStream
+
+DEFAULT_SYMBOLS = [{"symbol": "BTC-USDT-PERP", "asset": "BTCUSDT"}]
+DEFAULT_BALANCE_LIMIT = 1
+
+LOG = get_logger(__name__)
+
+
+@dataclass
+class SymbolConfig:
+    symbol: str
+    asset: str
+    balance_limit: float = DEFAULT_BALANCE_LIMIT
+    requote_mode: str = RequoteMode.PULL
+    # Pins the symbol to a shard, otherwise symbols are spread round robin
+    shard: Optional[int] = None
+
+
+def load_symbols(config: Dict) -> List[SymbolConfig]:
+    return [SymbolConfig(**entry) for entry in config.get("symbols", DEFAULT_SYMBOLS)]
+
+
+def shard_symbols(symbols: List[SymbolConfig], shards: int) -> List[List[SymbolConfig]]:
+    groups = [[] for _ in range(max(shards, 1))]
+    unpinned = 0
+    for symbol in symbols:
+        if symbol.shard is not None:
+            groups[symbol.shard % len(groups)].append(symbol)
+        else:
+            groups[unpinned % len(groups)].append(symbol)
+            unpinned += 1
+    return [group for group in groups if group]
+
+
+class SymbolDispatcher:
+    """Routes feed callbacks of a multi-symbol feed by symbol.
+
+    One public and one private feed carry all symbols of a shard, each event
+    is handed to the handlers registered for its symbol via a dictionary
+    lookup. Events of symbols without handlers are dropped. Position updates
+    are also published to the shared risk aggregator.
+    """
+
+    def __init__(self, risk: RiskAggregator = None):
+        self._risk = risk
+        self._routes: Dict[str, list] = {}
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._routes)
+
+    def add(self, symbol: str, handler) -> None:
+        # Handlers implement the MessageHandler callbacks
+        self._routes.setdefault(symbol, []).append(handler)
+
+    async def order_book_handler(self, book: OrderBook, receipt_timestamp) -> None:
+        for handler in self._routes.get(book.symbol, ()):
+            await handler.order_book_handler(book, receipt_timestamp)
+
+    async def trades_handler(self, trade: Trade, receipt_timestamp) -> None:
+        for handler in self._routes.get(trade.symbol, ()):
+            await handler.trades_handler(trade, receipt_timestamp)
+
+    async def positions_handler(self, positions: Position, receipt_timestamp) -> None:
+        if self._risk is not None:
+            self._risk.update(
+                positions.symbol,
+                float(positions.position),
+                float(positions.entry_price or 0),
+            )
+        for handler in self._routes.get(positions.symbol, ()):
+            await handler.positions_handler(positions, receipt_timestamp)
+
+    async def order_info_handler(
+        self, order_info: OrderInfo, receipt_timestamp
+    ) -> None:
+        for handler in self._routes.get(order_info.symbol, ()):
+            await handler.order_info_handler(order_info, receipt_timestamp)
+
+
+def exchange_for(config: Dict) -> Tuple[Type[BinanceFutures], Dict]:
+    # Both feeds and orders go to a local exchange simulator when its rest
+    # and websocket addresses are set under `simulator`
+    if config.get("simulator"):
+        return local_binance_futures(**config["simulator"]), {
+            "api": config["simulator"]["rest"]
+        }
+    return BinanceFutures, {}
+
+
+def run(path_to_config: str, config: Dict) -> None:
+    """Quotes every configured symbol, sharded over `shards` processes.
+
+    With a single shard everything runs in this process. Otherwise every
+    shard runs in its own process with its own feeds, event loop and order
+    transport, so a busy symbol only delays the symbols sharing its shard.
+    """
+    symbols = load_symbols(config)
+    groups = shard_symbols(symbols, config.get("shards", 1))
+    context = multiprocessing.get_context("spawn")
+    risk = RiskAggregator(
+        [symbol.symbol for symbol in symbols],
+        config.get("max_gross_notional"),
+        context=context,
+    )
+    if len(groups) == 1:
+        run_shard(path_to_config, config, groups[0], risk)
+        return
+
+    processes = [
+        context.Process(
+            target=run_shard,
+            args=(path_to_config, config, group, risk, index),
+            name=f"shard-{index}",
+        )
+        for index, group in enumerate(groups)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+def run_shard(
+    path_to_config: str,
+    config: Dict,
+    symbols: List[SymbolConfig],
+    risk: RiskAggregator = None,
+    index: int = 0,
+) -> None:
+    # Strategy logging is formatted and written on a background thread. The
+    # log section is cryptofeed's own, the strategy has a section of its own
+    setup_logging(**config.get("order_log", {}))
+    LOG.info(
+        "Shard %s quoting %s", index, ", ".join(symbol.symbol for symbol in symbols)
+    )
+
+    latency = LatencyMetrics()
+    dispatcher = SymbolDispatcher(risk)
+    exchange, transport_options = exchange_for(config)
+    names = [symbol.symbol for symbol in symbols]
+
+    binance_futures_public = exchange(
+        config=path_to_config,
+        sandbox=True,
+        symbols=names,
+        channels=[L2_BOOK, TRADES],
+        callbacks={
+            L2_BOOK: [dispatcher.order_book_handler],
+            TRADES: [dispatcher.trades_handler],
+        },
+    )
+    # The private feed reports its reconnects to the user data stream, which
+    # keeps the listen key alive and resyncs orders and positions after gaps
+    user_data = UserDataStream(**config.get("user_data", {}))
+    binance_futures_private = user_data.feed(exchange)(
+        config=path_to_config,
+        sandbox=True,
+        symbols=names,
+        channels=[POSITIONS, ORDER_INFO],
+        callbacks={
+            POSITIONS: [dispatcher.positions_handler],
+            ORDER_INFO: [dispatcher.order_info_handler],
+        },
+    )
+
+    # Created first as it may install uvloop, the order transport session
+    # has to be opened on the loop the feeds run on
+    f = FeedHandler()
+    # Every shard process drives its own event loop
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    # Orders go through our own REST transport, as current implementation
+    # does not support using sandbox REST API. It is shared by the strategies
+    # of the shard so they reuse the pooled connections
+    transport = OrderTransport(binance_futures_private, **transport_options)
+    latency.add_section("rate_limits", transport.rate_limits.remaining)
+
+    # Prices and sizes are integer ticks and lots of each symbol's filters
+    instruments = loop.run_until_complete(load_instruments(transport, names))
+    transport.add_instruments(instruments.values())
+
+    # Book bursts are conflated into one decision unless `conflation` is set to
+    # false, its options are passed to the BookScheduler
+    conflation = config.get("conflation", {})
+    states = []
+    message_handlers = []
+    for symbol in symbols:
+        state = State(symbol.symbol, symbol.asset, instruments[symbol.symbol])
+        scheduler = None
+        if conflation is not False:
+            scheduler = BookScheduler(**(conflation or {}))
+            latency.add_section(
+                f"conflation.{symbol.symbol}",
+                lambda scheduler=scheduler: scheduler.counters,
+            )
+        message_handler = MessageHandler(state, latency, scheduler)
+        strategy = SimpleStrategy(
+            transport=transport,
+            state=state,
+            balance_limit=symbol.balance_limit,
+            requote_mode=symbol.requote_mode,
+            latency=latency,
+            risk=risk,
+        )
+        message_handler.set_strategy(strategy)
+        dispatcher.add(symbol.symbol, message_handler)
+
+        # Feed events are recorded per symbol for replay when a `record`
+        # directory is set
+        if config.get("record"):
+            recorder = MarketDataRecorder(
+                os.path.join(config["record"], symbol.symbol), symbol.symbol
+            )
+            atexit.register(recorder.close)
+            dispatcher.add(symbol.symbol, recorder)
+
+        states.append(state)
+        message_handlers.append(message_handler)
+
+    initialize_account_info(transport, states)
+    user_data.bind(transport, states)
+    latency.add_section("user_data", lambda: user_data.counters)
+
+    # Latency histograms are logged periodically and served on /metrics, one
+    # port per shard
+    loop.run_until_complete(latency.start_server(port=METRICS_PORT + index))
+    latency.start_periodic_dump()
+
+    # State is only mutated from the feed loop, other threads hand calls to it
+    for message_handler in message_handlers:
+        message_handler.bind_loop(loop)
+
+    f.add_feed(binance_futures_public)
+    f.add_feed(binance_futures_private)
+    f.run()
+
+
+def initialize_account_info(transport: OrderTransport, states: List[State]) -> None:
+    loop = asyncio.get_event_loop()
+
+    # Open the pooled order connections before the first order is sent
+    loop.run_until_complete(transport.warm_up())
+    transport.start_keepalive()
+
+    # Get starting balances
+    account_info = loop.run_until_complete(get_account_info(transport))
+
+    for state in states:
+        # Cancels all open orders
+        cancel_all_orders(transport, state.asset)
+
+        # Initialize balance
+        state.initialize_balance(get_balance_for_asset(account_info, state.asset))
@@ -1,8 +1,10 @@
 import asyncio
-from typing import Dict
+from typing import TYPE_CHECKING, Dict
 
 from cryptofeed.defines import DELETE, GET
-from cryptofeed.exchanges.mixins.binance_rest import BinanceRestMixin
+
+if TYPE_CHECKING:
+    from order_transport import OrderTransport
 
 SANDBOX_REST_API = "https://testnet.binancefuture.com"
 SANDBOX_REST_ORDER = "/fapi/v1/"
@@ -11,22 +13,14 @@ ACCOUNT = "account"
 ALL_OPEN_ORDER = "allOpenOrders"
 
 
-async def get_account_info(exchange: BinanceRestMixin) -> Dict[str, str]:
+async def get_account_info(transport: "OrderTransport") -> Dict[str, str]:
     # Manual implementation of GET for Sandbox API
-    data = await exchange._request(
-        GET, ACCOUNT, auth=True, api=SANDBOX_REST_API + SANDBOX_REST_ACCOUNT
-    )
+    data = await transport.request(GET, ACCOUNT, api=SANDBOX_REST_ACCOUNT)
     return data
 
 
-def cancel_all_orders(exchange: BinanceRestMixin, symbol: str) -> None:
+def cancel_all_orders(transport: "OrderTransport", symbol: str) -> None:
     # Manual implementation of CANCEL ALL for Sandbox API
     asyncio.ensure_future(
-        exchange._request(
-            DELETE,
-            ALL_OPEN_ORDER,
-            auth=True,
-            api=SANDBOX_REST_API + SANDBOX_REST_ORDER,
-            payload={"symbol": symbol},
-        )
+        transport.request(DELETE, ALL_OPEN_ORDER, payload={"symbol": symbol})
     )
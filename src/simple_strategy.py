@@ -1,227 +1,367 @@
 import asyncio
-import threading
-from asyncio import Future
+import time
+from collections import deque
 from decimal import Decimal
-from typing import List, Tuple
+from typing import Deque, List, Optional, Tuple
 
-from aiohttp import ClientResponseError
+from aiohttp import ClientError
 from cryptofeed.defines import BUY, SELL
-from cryptofeed.exchanges.mixins.binance_rest import BinanceRestMixin
 from cryptofeed.types import OrderInfo
 
-from order import Order, cancel_order, order_from_order_info, send_order
-from sandbox_get_override import cancel_all_orders
+from event_log import get_logger
+from latency import LatencyMetrics, RequestKind
+from order import (
+    BATCH_ORDERS_WEIGHT,
+    Order,
+    OrderRejectedError,
+    new_client_order_id,
+    order_from_order_info,
+)
+from order_gateway import OrderGateway
+from order_registry import OrderStatus
+from order_transport import OrderTransport
+from quoting import Quote, QuoteLadder, diff_quotes
+from risk import RiskAggregator
 from state import BookSide, State
+from strategy import Strategy
 
-SIZE = 0.01
-PRICE_OFFSET = 10
+SIZE = Decimal("0.01")
+PRICE_OFFSET = Decimal(10)
 EXPECTED_ORDERS_PER_SIDE = 2
-
-
-class SimpleStrategy:
-    def __init__(self, exchange: BinanceRestMixin, state: State, balance_limit: float):
-        self._exchange = exchange
+# Most volume queued ahead of an order the market moved away from for it to
+# be kept rather than requoted
+MAX_QUEUE_AHEAD = Decimal("0.01")
+REQUOTE_HISTORY = 1000
+# Order events acted upon, with the name they are logged under
+ORDER_EVENT_NAMES = {
+    "NEW": "New",
+    "AMENDMENT": "Amended",
+    "CANCELED": "Cancelled",
+    "TRADE": "Traded",
+}
+# Order requests that failed, timed out or were cancelled with their batch.
+# Requests of unknown outcome are rolled back as failed, the feed confirms
+# them if they went through
+ORDER_REQUEST_ERRORS = (
+    ClientError,
+    asyncio.TimeoutError,
+    asyncio.CancelledError,
+    OrderRejectedError,
+)
+
+LOG = get_logger(__name__)
+
+
+class RequoteMode:
+    # Cancel orders off the new ladder and insert its missing levels
+    PULL = "pull"
+    # Move orders off the new ladder to its missing levels via order modify
+    AMEND = "amend"
+
+
+class SimpleStrategy(Strategy):
+    def __init__(
+        self,
+        transport: OrderTransport,
+        state: State,
+        balance_limit: float,
+        requote_mode: str = RequoteMode.PULL,
+        latency: LatencyMetrics = None,
+        risk: RiskAggregator = None,
+        order_size: Decimal = SIZE,
+        price_offset: Decimal = PRICE_OFFSET,
+        orders_per_side: int = EXPECTED_ORDERS_PER_SIDE,
+        max_queue_ahead: Decimal = MAX_QUEUE_AHEAD,
+    ):
+        self._transport = transport
         self._state = state
         self._balance_limit = balance_limit
-        self.__lock = threading.Lock()
-        self.__pending_orders = []
-        self.__pending_cancels = []
+        self._requote_mode = requote_mode
+        self._latency = latency or LatencyMetrics()
+        self._risk = risk
+        self._gateway = OrderGateway(transport, self._latency)
+        # Order size in lots and level offset in ticks, converted once
+        self._price_offset = state.instrument.to_ticks(Decimal(price_offset))
+        self._ladder = QuoteLadder(
+            orders_per_side,
+            self._price_offset,
+            state.instrument.to_lots(Decimal(order_size)),
+        )
+        self._max_queue_ahead = state.instrument.to_lots(Decimal(max_queue_ahead))
         self.__bid_enabled = True
         self.__ask_enabled = True
+        self.__requote_started = {BUY: None, SELL: None}
+        self.__requote_durations = deque(maxlen=REQUOTE_HISTORY)
+
+    @property
+    def requote_durations(self) -> Deque[float]:
+        # Seconds each side spent without a quote at the new price per requote
+        return self.__requote_durations
 
     def process_strategy(self) -> None:
         self.__update_orders()
+        self._gateway.flush()
+        self._latency.decision_done()
+
+    def handle_order_info(self, order_info: OrderInfo, order: Order = None) -> None:
+        status = order_info.status
+        if status not in ORDER_EVENT_NAMES:
+            return
+        instrument = self._state.instrument
+        if order is None:
+            order = order_from_order_info(order_info, instrument)
+        LOG.info(
+            "%s OrderId(%s), Symbol(%s), Side(%s), Size(%s), Price(%s)",
+            ORDER_EVENT_NAMES[status],
+            order.order_id,
+            order.symbol,
+            order.side,
+            instrument.format_size(order.size),
+            instrument.format_price(order.price),
+        )
 
-    def handle_order_info(self, order_info: OrderInfo) -> None:
-        self.__lock.acquire()
-        try:
-            # Handle new order
-            if order_info.status == "NEW":
-                order = order_from_order_info(order_info)
-                print(
-                    f"New OrderId({order.order_id}), Symbol({order.symbol}), Side({order.side}), "
-                    f"Size({order.size}), Price({order.price})"
-                )
-                try:
-                    self.__pending_orders.remove(order)
-                except ValueError:
-                    pass
-
-            # Handle cancelled order
-            if order_info.status == "CANCELED":
-                order = order_from_order_info(order_info)
-                print(
-                    f"Cancelled OrderId({order.order_id}), Symbol({order.symbol}), Side({order.side}), "
-                    f"Size({order.size}), Price({order.price})"
-                )
-                try:
-                    self.__pending_cancels.remove(order)
-                except ValueError:
-                    pass
-
-            # Handle trade
-            if order_info.status == "TRADE":
-                order = order_from_order_info(order_info)
-                print(
-                    f"Traded OrderId({order.order_id}), Symbol({order.symbol}), Side({order.side}), "
-                    f"Size({order.size}), Price({order.price})"
-                )
-                self.__pull_orders(self._state.open_orders)
-        finally:
-            self.__lock.release()
+        # New and amended orders complete a requote of their side
+        if status == "NEW":
+            self._latency.confirmed(order.client_order_id, RequestKind.INSERT)
+            self.__stop_requote_timer(order.side)
+        elif status == "AMENDMENT":
+            self._latency.confirmed(order.client_order_id, RequestKind.MODIFY)
+            self.__stop_requote_timer(order.side)
+        elif status == "CANCELED":
+            self._latency.confirmed(order.client_order_id, RequestKind.CANCEL)
+        # Filled orders leave a gap in their side's ladder, which the next
+        # decision fills once the book shows the trade. Quoting now could buy
+        # back at a price the book has already traded through
+        self._gateway.flush()
 
     def __update_orders(self) -> None:
-        self.__lock.acquire()
-        try:
-            top_market = self._state.top_market
-            if not top_market:
-                print("Cancelling all orders as book is empty.")
-                cancel_all_orders(self._exchange, self._state.asset)
-                return
-
-            best_bid = top_market[BookSide.BID]
-            best_ask = top_market[BookSide.ASK]
-            open_orders = self._state.open_orders
-            bid_orders = [order for order in open_orders if order.side == BUY]
-            ask_orders = [order for order in open_orders if order.side == SELL]
-
-            if self.__should_orders_be_pulled(BUY, bid_orders, best_bid):
-                print("Pulling bid orders.")
-                self.__pull_orders(bid_orders)
-
-            if self.__should_orders_be_pulled(SELL, ask_orders, best_ask):
-                print("Pulling ask orders.")
-                self.__pull_orders(ask_orders)
-
-            # Do nothing if pending orders exists
-            if len(self.__pending_orders) > 0:
-                print("Has pending orders, doing nothing.")
-                return
-
-            if (
-                not bid_orders
-                and self.__bid_enabled
-                and self.__is_inventory_within_limit(BUY)
-            ):
-                print("Inserting new bid orders.")
-                orders = self.__create_orders(BUY, best_bid[0])
-                self.__insert_orders(orders)
-
-            if (
-                not ask_orders
-                and self.__ask_enabled
-                and self.__is_inventory_within_limit(SELL)
-            ):
-                print("Inserting new ask orders.")
-                orders = self.__create_orders(SELL, best_ask[0])
-                self.__insert_orders(orders)
-
-            self.__pull_if_order_count_inconsistent()
-        finally:
-            self.__lock.release()
-
-    def __pull_if_order_count_inconsistent(self) -> None:
-        # Pulls all orders if pending and live orders count is not consistent
-        expected_count = 0
-        if self.__bid_enabled:
-            expected_count += 2
-        if self.__ask_enabled:
-            expected_count += 2
-
-        if len(self.__pending_orders) + len(self._state.open_orders) != expected_count:
-            self.__pull_orders(self._state.open_orders)
-
-    def __insert_orders(self, orders: List[Order]) -> None:
-        for order in orders:
-            self.__pending_orders.append(order)
-            send_order(
-                exchange=self._exchange,
-                order=order,
-                callback=lambda future: self.__order_insert_callback(order, future),
-            )
-
-    def __create_orders(self, side: str, best_price: Decimal) -> List[Order]:
-        next_level_offset = PRICE_OFFSET if side == SELL else -PRICE_OFFSET
-
-        top_market_order = Order(
-            symbol=self._state.symbol, side=side, size=SIZE, price=best_price
+        if not self._state.top_market:
+            LOG.info("Cancelling all orders as book is empty.")
+            self._gateway.cancel_all_orders(self._state.asset)
+            return
+
+        self.__quote_side(BUY)
+        self.__quote_side(SELL)
+
+    def __quote_side(self, side: str) -> None:
+        # Moves the live orders of a side onto the ladder at the current best
+        # price with the fewest requests, orders already on it keep resting
+        side_name = "bid" if side == BUY else "ask"
+        orders = self._state.orders
+        if not self.__is_inventory_within_limit(side):
+            self.__pull_orders(orders.open_orders(side))
+            return
+
+        # Inserts and amends in flight are settled before the side is diffed
+        if (
+            orders.count(OrderStatus.PENDING_NEW, side) > 0
+            or orders.count(OrderStatus.PENDING_REPLACE, side) > 0
+        ):
+            LOG.debug("Has pending %s orders, doing nothing.", side_name)
+            return
+
+        # Orders being cancelled are gone as far as the ladder is concerned
+        open_orders = orders.open_orders(side)
+        live = sorted(
+            (
+                order
+                for order in open_orders
+                if orders.status(order.order_id) == OrderStatus.LIVE
+            ),
+            key=lambda order: order.price,
+            reverse=side == BUY,
         )
-
-        next_level_order = Order(
-            symbol=self._state.symbol,
-            side=side,
-            size=SIZE,
-            price=best_price + next_level_offset,
+        top_level = self._state.top_market.get(
+            BookSide.BID if side == BUY else BookSide.ASK
+        )
+        if len(live) == self._ladder.levels and self.__is_ladder_kept(
+            side, live, top_level
+        ):
+            return
+
+        best_price = self.__best_price_excluding_own(side, open_orders, top_level)
+        targets = [] if best_price is None else self._ladder.quotes(side, best_price)
+        inserts, cancels = diff_quotes(live, targets)
+
+        # New orders wait until the rate limits leave room for them
+        if inserts and not self._transport.rate_limits.allows(
+            BATCH_ORDERS_WEIGHT, len(inserts)
+        ):
+            LOG.debug("Rate limits reached, not inserting %s orders.", side_name)
+            inserts = []
+        if not inserts and not cancels:
+            return
+
+        LOG.info(
+            "Requoting %s orders, %s inserts and %s cancels.",
+            side_name,
+            len(inserts),
+            len(cancels),
         )
+        if inserts:
+            self.__start_requote_timer(side)
+        if self._requote_mode == RequoteMode.AMEND:
+            # Orders leaving the ladder are moved to its missing levels
+            amends = min(len(inserts), len(cancels))
+            self.__amend_orders(cancels[:amends], inserts[:amends])
+            inserts, cancels = inserts[amends:], cancels[amends:]
+        self.__pull_orders(cancels)
+        self.__insert_orders(inserts)
+
+    def __amend_orders(self, orders: List[Order], quotes: List[Quote]) -> None:
+        for order, quote in zip(orders, quotes):
+            replacement = order.replace(quote.price)
+            if not self._state.orders.request_replace(replacement):
+                continue
+            self._gateway.modify_order(
+                order=replacement,
+                callback=lambda future, order=replacement: self.__order_amend_callback(
+                    order, future
+                ),
+            )
 
-        return [top_market_order, next_level_order]
+    def __best_price_excluding_own(
+        self, side: str, open_orders: List[Order], top_level: Optional[Tuple[int, int]]
+    ) -> Optional[int]:
+        # Best price with volume from other participants, our own orders alone
+        # at a level should not be quoted against
+        if not open_orders:
+            return top_level[0] if top_level else None
+        book_side = BookSide.BID if side == BUY else BookSide.ASK
+        for price, _ in self._state.book.levels(book_side, len(open_orders) + 1):
+            own_size = sum(
+                order.remaining for order in open_orders if order.price == price
+            )
+            if self._state.book.queue_size(book_side, price, own_size) > 0:
+                return price
+        return None
+
+    def __start_requote_timer(self, side: str) -> None:
+        if self.__requote_started[side] is None:
+            self.__requote_started[side] = time.perf_counter()
+
+    def __stop_requote_timer(self, side: str) -> None:
+        started = self.__requote_started[side]
+        if started is None:
+            return
+        self.__requote_started[side] = None
+        duration = time.perf_counter() - started
+        self.__requote_durations.append(duration)
+        LOG.info("Requoted Side(%s) after %.1fms.", side, duration * 1000)
+
+    def __insert_orders(self, quotes: List[Quote]) -> None:
+        for quote in quotes:
+            order = Order(
+                symbol=self._state.symbol,
+                side=quote.side,
+                size=quote.size,
+                price=quote.price,
+                client_order_id=new_client_order_id(),
+            )
+            self._state.orders.add_pending(order)
+            self._gateway.send_order(
+                order=order,
+                callback=lambda future, order=order: self.__order_insert_callback(
+                    order, future
+                ),
+            )
 
     def __pull_orders(self, orders: List[Order]) -> None:
         for order in orders:
-            if order not in self.__pending_cancels:
-                self.__pending_cancels.append(order)
-                cancel_order(
-                    exchange=self._exchange,
+            if self._state.orders.request_cancel(order.order_id):
+                self._gateway.cancel_order(
                     order=order,
-                    callback=lambda future: self.__order_cancel_callback(order, future),
+                    callback=lambda future, order=order: self.__order_cancel_callback(
+                        order, future
+                    ),
                 )
 
-    def __should_orders_be_pulled(
-        self, side: str, open_orders: List[Order], top_level: Tuple[Decimal, Decimal]
+    def __is_ladder_kept(
+        self, side: str, live: List[Order], top_level: Optional[Tuple[int, int]]
     ) -> bool:
-        if not open_orders:
-            return False
-        if not self.__is_inventory_within_limit(side):
+        # A full ladder stays while its best order shares the top level or is
+        # near the front of a level the market moved away from
+        if self.__order_exists_at_top_level_and_not_alone(side, live, top_level):
             return True
-
-        return not self.__order_exists_at_top_level_and_not_alone(
-            open_orders, top_level
-        )
+        return self.__has_queue_priority(side, live, top_level)
 
     def __is_inventory_within_limit(self, side: str) -> bool:
         # Inventory management, pull orders on side if exceeded
         curr_balance = self._state.balance
+        # Limits across all symbols, shared with the other strategies
+        risk_allowed = self._risk is None or self._risk.allows(self._state.symbol, side)
         if side == BUY:
-            self.__bid_enabled = curr_balance <= self._balance_limit
+            self.__bid_enabled = risk_allowed and curr_balance <= self._balance_limit
             return self.__bid_enabled
         else:
-            self.__ask_enabled = curr_balance >= -self._balance_limit
+            self.__ask_enabled = risk_allowed and curr_balance >= -self._balance_limit
             return self.__ask_enabled
 
-    @staticmethod
     def __order_exists_at_top_level_and_not_alone(
-        open_orders: List[Order], top_level: Tuple[Decimal, Decimal]
+        self, side: str, open_orders: List[Order], top_level: Tuple[int, int]
     ) -> bool:
         # Checks if top level is empty
         if not top_level:
             return False
 
-        order_at_top_level = False
-        for order in open_orders:
-            if top_level[0] == order.price:
-                order_at_top_level = True
-                if top_level[1] == order.size:
-                    # Order alone at top level
-                    return False
+        top_price = top_level[0]
+        own_size = sum(
+            order.remaining for order in open_orders if order.price == top_price
+        )
+        if not own_size:
+            return False
 
-        return order_at_top_level
+        # Order alone at top level if nobody else is queued at that price
+        book_side = BookSide.BID if side == BUY else BookSide.ASK
+        return self._state.book.queue_size(book_side, top_price, own_size) > 0
 
-    def __order_insert_callback(self, order: Order, future: Future) -> None:
+    def __has_queue_priority(
+        self, side: str, open_orders: List[Order], top_level: Tuple[int, int]
+    ) -> bool:
+        # Whether the market moved away from our best order while it is near
+        # the front of its queue, requoting would put it at the back of the
+        # new top level. Orders alone at the top are at risk and never kept
+        if not top_level:
+            return False
+        best = max if side == BUY else min
+        order = best(open_orders, key=lambda order: order.price)
+        position = self._state.queue_position(order.order_id)
+        if position is None or position.ahead > self._max_queue_ahead:
+            return False
+        # Kept within one level spacing behind the top only
+        if side == BUY:
+            moved = top_level[0] - order.price
+        else:
+            moved = order.price - top_level[0]
+        return 0 < moved <= self._price_offset
+
+    def __order_insert_callback(self, order: Order, future: asyncio.Future) -> None:
         # Gracefully handle failed order inserts
+        try:
+            result = future.result()
+        except ORDER_REQUEST_ERRORS:
+            self._latency.discard(order.client_order_id, RequestKind.INSERT)
+            self._state.orders.reject_pending(order)
+            return
+        self._latency.acknowledged(order.client_order_id, RequestKind.INSERT)
+        self._state.orders.acknowledge(order.client_order_id, str(result["orderId"]))
+
+    def __order_amend_callback(self, order: Order, future: asyncio.Future) -> None:
+        # Gracefully handle failed order amends
         try:
             future.result()
-        except ClientResponseError:
-            try:
-                self.__pending_orders.remove(order)
-            except ValueError:
-                pass
+        except ORDER_REQUEST_ERRORS:
+            self._latency.discard(order.client_order_id, RequestKind.MODIFY)
+            self._state.orders.replace_failed(order.order_id)
+            return
+        self._latency.acknowledged(order.client_order_id, RequestKind.MODIFY)
 
-    def __order_cancel_callback(self, order: Order, future: Future) -> None:
+    def __order_cancel_callback(self, order: Order, future: asyncio.Future) -> None:
         # Gracefully handle failed order cancels
         try:
             future.result()
-        except ClientResponseError:
-            try:
-                self.__pending_cancels.remove(order)
-            except ValueError:
-                pass
+        except ORDER_REQUEST_ERRORS:
+            self._latency.discard(order.client_order_id, RequestKind.CANCEL)
+            self._state.orders.cancel_failed(order.order_id)
+            return
+        self._latency.acknowledged(order.client_order_id, RequestKind.CANCEL)
@@ -1,122 +1,232 @@
-import threading
+import time
 from dataclasses import dataclass
-from decimal import Decimal
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
-from cryptofeed.types import OrderBook, OrderInfo, Position
+from cryptofeed.defines import BUY
+from cryptofeed.types import OrderBook, OrderInfo, Position, Trade
 
+from instrument import Instrument
+from local_book import BookSide, LocalBook
+from market_history import ORDER_EVENTS, MarketHistory
 from order import Order, order_from_order_info
-
-
-class BookSide:
-    BID = "bid"
-    ASK = "ask"
-
-
-class BookKeys:
-    BOOK = "book"
+from order_registry import OrderRegistry
+from queue_position import QueueEstimator, QueuePosition
 
 
 @dataclass
 class State:
     symbol: str
     asset: str
+    instrument: Instrument
     balance: float
     open_orders: List[Order]
-    top_market: Dict[str, Tuple[Decimal, Decimal]]
-
-    def __init__(self, symbol, asset):
+    orders: OrderRegistry
+    top_market: Dict[str, Tuple[int, int]]
+    book: LocalBook
+    history: MarketHistory
+
+    def __init__(
+        self,
+        symbol,
+        asset,
+        instrument: Instrument = None,
+        history: MarketHistory = None,
+    ):
         self._symbol = symbol
         self._asset = asset
+        self._instrument = instrument or Instrument(symbol)
         self._balance = 0
-        self._open_orders = []
+        self._positions_timestamp = float("-inf")
+        self._book_timestamp = float("-inf")
+        self._orders = OrderRegistry()
         self._top_market = {}
-        self.__lock = threading.Lock()
+        self._book = LocalBook(self._instrument)
+        self._queue = QueueEstimator()
+        self._history = history or MarketHistory()
 
     @property
     def symbol(self) -> str:
-        self.__lock.acquire()
-        try:
-            return self._symbol
-        finally:
-            self.__lock.release()
+        return self._symbol
 
     @property
     def asset(self) -> str:
-        self.__lock.acquire()
-        try:
-            return self._asset
-        finally:
-            self.__lock.release()
+        return self._asset
+
+    @property
+    def instrument(self) -> Instrument:
+        # Prices in the book, top market and orders are ticks of it, sizes lots
+        return self._instrument
 
     @property
     def balance(self) -> float:
-        self.__lock.acquire()
-        try:
-            return self._balance
-        finally:
-            self.__lock.release()
+        return self._balance
 
     @property
     def open_orders(self) -> List[Order]:
-        self.__lock.acquire()
-        try:
-            return self._open_orders
-        finally:
-            self.__lock.release()
+        return self._orders.open_orders()
+
+    @property
+    def orders(self) -> OrderRegistry:
+        return self._orders
 
     @property
-    def top_market(self) -> Dict[str, Tuple[Decimal, Decimal]]:
-        self.__lock.acquire()
-        try:
-            return self._top_market
-        finally:
-            self.__lock.release()
+    def top_market(self) -> Dict[str, Tuple[int, int]]:
+        return self._top_market
+
+    @property
+    def book(self) -> LocalBook:
+        return self._book
+
+    @property
+    def history(self) -> MarketHistory:
+        # Recent top of book changes, trades and order events, for window
+        # statistics
+        return self._history
+
+    def queue_position(self, order_id: str) -> Optional[QueuePosition]:
+        # Estimated lots queued ahead of and behind one of our resting orders
+        return self._queue.position(order_id)
 
     def handle_book(self, book: OrderBook) -> None:
-        self.__lock.acquire()
-        try:
-            if book.symbol == self._symbol:
-                book_dict = book.to_dict()
-                self.__update_top_book(book_dict)
-        finally:
-            self.__lock.release()
+        if book.symbol == self._symbol:
+            self._book.apply(book)
+            timestamp = _transaction_time(book)
+            if timestamp is not None:
+                self._book_timestamp = timestamp
+            self._queue.book_updated(self._book)
+            self.__update_top_book(book.timestamp)
+
+    def handle_trade(self, trade: Trade) -> None:
+        if trade.symbol == self._symbol:
+            price = self._instrument.to_ticks(trade.price)
+            size = self._instrument.to_lots(trade.amount)
+            self._queue.traded(trade.side, price, size)
+            self._history.traded(
+                _timestamp(trade.timestamp), _side(trade.side), price, size
+            )
 
     def initialize_balance(self, balance: float) -> None:
         self._balance = balance
 
     def handle_positions(self, positions: Position) -> None:
-        self.__lock.acquire()
-        try:
-            self._balance = float(positions.position)
-        finally:
-            self.__lock.release()
-
-    def handle_order_info(self, order_info: OrderInfo) -> None:
-        self.__lock.acquire()
-        try:
-            order = order_from_order_info(order_info)
-            if order_info.status == "NEW":
-                self._open_orders.append(order)
-            if order_info.status == "TRADE" or order_info.status == "CANCELED":
-                try:
-                    self._open_orders.remove(order)
-                except ValueError:
-                    pass
-        finally:
-            self.__lock.release()
-
-    def __update_top_book(self, book_dict: Dict[str, Dict]):
-        if BookKeys.BOOK not in book_dict:
+        self._balance = float(positions.position)
+        self._positions_timestamp = (
+            _transaction_time(positions) or self._positions_timestamp
+        )
+
+    def resync(self, open_orders: List[Order], balance: float) -> Tuple[int, int, int]:
+        # Applies the exchange's view after a gap in the private feed
+        self._balance = balance
+        counts = self._orders.reconcile(open_orders)
+        # Queue positions across the gap are unknown, orders are assumed to
+        # be at the back of their levels again
+        self._queue.clear()
+        for order in self._orders.open_orders():
+            self._queue.add(order, self._book, in_book=True)
+        return counts
+
+    def handle_order_info(self, order_info: OrderInfo, order: Order = None) -> Order:
+        # The parsed order is returned so the strategy can reuse it
+        if order is None:
+            order = order_from_order_info(order_info, self._instrument)
+        status = order_info.status
+        filled = 0
+        if status == "NEW":
+            if order.order_id not in self._queue:
+                self._queue.add(
+                    self._orders.confirm(order), self._book, self.__in_book(order_info)
+                )
+        elif status == "AMENDMENT":
+            # Modified orders lose their priority
+            self._queue.remove(order.order_id)
+            self._queue.add(
+                self._orders.replace(order), self._book, self.__in_book(order_info)
+            )
+        elif status == "TRADE":
+            filled = self.__fill(order, _transaction_time(order_info))
+        elif status == "CANCELED":
+            self._queue.remove(order.order_id)
+            self._orders.remove(order.order_id)
+        if status in ORDER_EVENTS:
+            self._history.order_event(
+                _timestamp(order_info.timestamp),
+                status,
+                _side(order.side),
+                order.price,
+                order.remaining,
+                filled,
+            )
+        return order
+
+    def __in_book(self, order_info: OrderInfo) -> bool:
+        # The book update including the order may arrive before the order
+        # event, it does if it happened later on the exchange
+        timestamp = _transaction_time(order_info)
+        return timestamp is not None and self._book_timestamp > timestamp
+
+    def __fill(self, order: Order, timestamp: Optional[float]) -> int:
+        # Returns the lots this event filled, if the order was known
+        known = self._orders.get(order.order_id)
+        filled = 0
+        if known is not None and order.filled > known.filled:
+            filled = order.filled - known.filled
+            # The position moves on the fill itself, the POSITIONS update
+            # confirming it replaces the local figure when it arrives. Fills
+            # no later than the last position update are already part of it
+            if timestamp is None or timestamp > self._positions_timestamp:
+                size = float(self._instrument.size(filled))
+                self._balance += size if order.side == BUY else -size
+
+        if order.remaining > 0:
+            updated = self._orders.fill(order.order_id, order.filled)
+            if updated is not None:
+                self._queue.filled(updated)
+        else:
+            self._queue.remove(order.order_id)
+            self._orders.remove(order.order_id)
+        return filled
+
+    def __update_top_book(self, timestamp: Optional[float]):
+        best_bid = self._book.best(BookSide.BID)
+        best_ask = self._book.best(BookSide.ASK)
+        if best_bid is None and best_ask is None:
             self._top_market = {}
             return
 
-        if BookSide.BID in book_dict[BookKeys.BOOK]:
-            bids = book_dict[BookKeys.BOOK][BookSide.BID]
-            if bids:
-                self._top_market[BookSide.BID] = list(bids.items())[0]
+        top_market = self._top_market
+        changed = (
+            top_market.get(BookSide.BID) != best_bid
+            or top_market.get(BookSide.ASK) != best_ask
+        )
+        if best_bid is not None:
+            top_market[BookSide.BID] = best_bid
+
+        if best_ask is not None:
+            top_market[BookSide.ASK] = best_ask
+
+        # Only two sided tops are recorded, a mid needs both
+        if changed and best_bid is not None and best_ask is not None:
+            self._history.top_changed(_timestamp(timestamp), *best_bid, *best_ask)
+
+
+def _timestamp(timestamp: Optional[float]) -> float:
+    # Feed timestamps are missing on some messages, receipt time stands in
+    return time.time() if timestamp is None else timestamp
+
+
+def _transaction_time(event) -> Optional[float]:
+    # Binance stamps a fill and the position update it causes with the same
+    # transaction time T, their event times E can be milliseconds apart. Book
+    # updates carry T as well
+    raw = getattr(event, "raw", None)
+    if isinstance(raw, dict):
+        order = raw.get("o")
+        if isinstance(order, dict) and "T" in order:
+            return order["T"] / 1000
+        if "T" in raw:
+            return raw["T"] / 1000
+    return event.timestamp
+
 
-        if BookSide.ASK in book_dict[BookKeys.BOOK]:
-            asks = book_dict[BookKeys.BOOK][BookSide.ASK]
-            if asks:
-                self._top_market[BookSide.ASK] = list(asks.items())[0]
+def _side(side: str) -> int:
+    return 1 if side == BUY else -1
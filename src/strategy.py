@@ -0,0 +1,23 @@
+from abc import ABC, abstractmethod
+
+from cryptofeed.types import OrderInfo
+
+from order import Order
+
+
+class Strategy(ABC):
+    """Decision logic of one symbol, driven by the message handler.
+
+    Both methods are called on the event loop the feeds run on, after the
+    state has applied the event, and must not block it. Order requests made
+    while handling an event are expected to be sent before returning.
+    """
+
+    @abstractmethod
+    def process_strategy(self) -> None:
+        # Runs after book updates, once per update or per burst of them
+        pass
+
+    def handle_order_info(self, order_info: OrderInfo, order: Order = None) -> None:
+        # Our order events, order is the event as already parsed by the state
+        pass
@@ -0,0 +1,212 @@
+import argparse
+import itertools
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from backtest import Backtest, BacktestResult
+from event_log import get_logger, setup_logging
+from instrument import DEFAULT_STEP_SIZE, DEFAULT_TICK_SIZE, Instrument
+from market_data import MarketDataReader
+from replay import MARKET_CHANNELS
+from simple_strategy import EXPECTED_ORDERS_PER_SIDE, PRICE_OFFSET, SIZE
+
+# Swept parameters and how values given on the command line are parsed
+PARAMETERS = {
+    "order_size": Decimal,
+    "price_offset": Decimal,
+    "orders_per_side": int,
+    "balance_limit": float,
+    "requote_mode": str,
+}
+DEFAULT_SPACE = {
+    "order_size": [SIZE],
+    "price_offset": [PRICE_OFFSET],
+    "orders_per_side": [EXPECTED_ORDERS_PER_SIDE],
+    "balance_limit": [1.0],
+}
+RANDOM_SAMPLES = 20
+
+COLUMNS = (
+    ("pnl", "{:.4f}"),
+    ("trades", "{}"),
+    ("fill_rate", "{:.3f}"),
+    ("position", "{}"),
+    ("max_position", "{}"),
+    ("inserts", "{}"),
+    ("modifies", "{}"),
+    ("cancels", "{}"),
+    ("events_per_second", "{:,.0f}"),
+)
+
+# Values of a parameter, a list to pick from or a (low, high) range for
+# random search
+Values = Union[List, Tuple]
+Configuration = Dict[str, object]
+
+LOG = get_logger(__name__)
+
+
+def grid(space: Dict[str, Values]) -> Iterator[Configuration]:
+    # Every combination of the listed values
+    names = list(space)
+    for values in itertools.product(*(space[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def random_search(
+    space: Dict[str, Values], samples: int, seed: Optional[int] = None
+) -> Iterator[Configuration]:
+    # Lists are sampled from, (low, high) ranges uniformly within
+    rng = random.Random(seed)
+    for _ in range(samples):
+        configuration = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                configuration[name] = _uniform(rng, PARAMETERS[name], *values)
+            else:
+                configuration[name] = rng.choice(values)
+        yield configuration
+
+
+def run_sweep(
+    directory: str,
+    symbol: str,
+    asset: str,
+    configurations: Sequence[Configuration],
+    instrument: Instrument = None,
+    processes: Optional[int] = None,
+) -> List[Tuple[Configuration, BacktestResult]]:
+    """Replays the recording in directory once per configuration.
+
+    Backtests are CPU bound and independent, so they run on a pool of
+    processes, one per core by default. Each worker maps the recording
+    itself rather than having the events pickled over to it. Results are
+    returned in the order of configurations.
+    """
+    configurations = list(configurations)
+    processes = min(processes or os.cpu_count() or 1, len(configurations) or 1)
+    jobs = [
+        (directory, symbol, asset, instrument, configuration)
+        for configuration in configurations
+    ]
+    if processes == 1:
+        results = list(map(_run_backtest, jobs))
+    else:
+        # Spawned workers do not inherit the parent's event loop or logging
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(processes, mp_context=context) as pool:
+            results = list(pool.map(_run_backtest, jobs))
+    return list(zip(configurations, results))
+
+
+def format_table(results: Sequence[Tuple[Configuration, BacktestResult]]) -> str:
+    # One row per configuration, best PnL first
+    names = sorted({name for configuration, _ in results for name in configuration})
+    header = names + [column for column, _ in COLUMNS]
+    rows = [header]
+    for configuration, result in sorted(
+        results, key=lambda item: item[1].pnl, reverse=True
+    ):
+        rows.append(
+            [str(configuration.get(name, "")) for name in names]
+            + [template.format(getattr(result, column)) for column, template in COLUMNS]
+        )
+    widths = [max(len(row[index]) for row in rows) for index in range(len(header))]
+    return "\n".join(
+        "  ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in rows
+    )
+
+
+def parse_space(arguments: Sequence[str], ranges: bool = False) -> Dict[str, Values]:
+    # name=a,b,c lists values, with ranges name=low:high is a range
+    space = dict(DEFAULT_SPACE)
+    for argument in arguments:
+        name, _, values = argument.partition("=")
+        if name not in PARAMETERS:
+            raise ValueError(f"Unknown parameter {name}, expected one of {PARAMETERS}")
+        convert = PARAMETERS[name]
+        if ranges and ":" in values:
+            low, high = values.split(":")
+            space[name] = (convert(low), convert(high))
+        else:
+            space[name] = [convert(value) for value in values.split(",")]
+    return space
+
+
+def _run_backtest(job) -> BacktestResult:
+    directory, symbol, asset, instrument, configuration = job
+    reader = MarketDataReader(directory)
+    try:
+        backtest = Backtest(symbol, asset, instrument=instrument, **configuration)
+        # Only the market is replayed, the strategy trades a simulated account
+        return backtest.run(reader.events(MARKET_CHANNELS))
+    finally:
+        reader.close()
+
+
+def _uniform(rng: random.Random, convert, low, high):
+    if convert is int:
+        return rng.randint(low, high)
+    value = rng.uniform(float(low), float(high))
+    if convert is Decimal:
+        # Kept to the precision the range was given in
+        return Decimal(str(value)).quantize(min(low, high, key=_exponent))
+    return value
+
+
+def _exponent(value: Decimal) -> int:
+    return value.as_tuple().exponent
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep strategy parameters over a recorded market data replay"
+    )
+    parser.add_argument("directory", help="market data recorder output")
+    parser.add_argument("--symbol", required=True, help="e.g. BTC-USDT-PERP")
+    parser.add_argument("--asset", required=True, help="e.g. BTCUSDT")
+    parser.add_argument("--tick-size", default=DEFAULT_TICK_SIZE)
+    parser.add_argument("--step-size", default=DEFAULT_STEP_SIZE)
+    parser.add_argument(
+        "--param",
+        action="append",
+        default=[],
+        help="name=v1,v2 values to sweep, or name=low:high with --random",
+    )
+    parser.add_argument(
+        "--random",
+        type=int,
+        nargs="?",
+        const=RANDOM_SAMPLES,
+        help="sample this many configurations instead of the full grid",
+    )
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--processes", type=int, help="defaults to one per core")
+    args = parser.parse_args()
+
+    setup_logging()
+
+    space = parse_space(args.param, ranges=args.random is not None)
+    if args.random is not None:
+        configurations = list(random_search(space, args.random, args.seed))
+    else:
+        configurations = list(grid(space))
+    instrument = Instrument(args.symbol, args.tick_size, args.step_size)
+    LOG.info("Sweeping %s configurations.", len(configurations))
+    results = run_sweep(
+        args.directory,
+        args.symbol,
+        args.asset,
+        configurations,
+        instrument,
+        args.processes,
+    )
+    print(format_table(results))
+
+
+if __name__ == "__main__":
+    main()
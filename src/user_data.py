@@ -0,0 +1,177 @@
+import asyncio
+import time
+from typing import Dict, Iterable, Optional, Type
+
+import aiohttp
+from cryptofeed.defines import GET, POST, PUT
+from cryptofeed.exchanges import BinanceFutures
+
+from event_log import get_logger
+from order_transport import OrderTransport
+from post_parsing_utils import get_balance_for_asset, get_open_orders_from_info
+from sandbox_get_override import cancel_all_orders, get_account_info
+from state import State
+
+LISTEN_KEY = "listenKey"
+OPEN_ORDERS = "openOrders"
+LISTEN_KEY_EXPIRED = "listenKeyExpired"
+
+# Listen keys expire 60 minutes after they were created or last extended
+LISTEN_KEY_KEEPALIVE_INTERVAL = 30 * 60
+# Longest a resync may take before all orders are pulled instead
+RESYNC_TIMEOUT = 5.0
+
+LOG = get_logger(__name__)
+
+
+class UserDataStream:
+    """Listen key lifecycle and recovery of the private feed of a shard.
+
+    The listen key is extended through the order transport rather than the
+    blocking refresh loop cryptofeed starts on every connect, and renewed
+    when the exchange reports it expired. Every reconnect of the private
+    feed is a gap in the POSITIONS and ORDER_INFO events, so open orders and
+    positions are then fetched over REST and diffed into each State before
+    the new connection's events are handled. A resync taking longer than
+    resync_timeout pulls all orders instead, bounding the time the strategy
+    runs on a stale view of its orders.
+    """
+
+    def __init__(
+        self,
+        resync_timeout: float = RESYNC_TIMEOUT,
+        keepalive_interval: float = LISTEN_KEY_KEEPALIVE_INTERVAL,
+    ):
+        self._resync_timeout = resync_timeout
+        self._keepalive_interval = keepalive_interval
+        self._transport: Optional[OrderTransport] = None
+        self._states: Dict[str, State] = {}
+        self._connection = None
+        self._connections = 0
+        self._last_message: Optional[float] = None
+        self._keepalive_task: Optional[asyncio.Task] = None
+        self._resyncs = 0
+        self._failed_resyncs = 0
+        self._last_recovery: Optional[float] = None
+        self._max_recovery = 0.0
+
+    @property
+    def counters(self) -> Dict:
+        # Recovery is from the last message before a gap to the end of resync
+        return {
+            "connections": self._connections,
+            "resyncs": self._resyncs,
+            "failed_resyncs": self._failed_resyncs,
+            "last_recovery_ms": _milliseconds(self._last_recovery),
+            "max_recovery_ms": _milliseconds(self._max_recovery),
+        }
+
+    def feed(self, exchange: Type[BinanceFutures]) -> Type[BinanceFutures]:
+        # The private feed class, with its connects reported to this stream
+        stream = self
+
+        class UserDataFeed(exchange):
+            async def subscribe(self, conn) -> None:
+                # Replaces the base subscribe, which starts another listen
+                # key refresh loop on every connect
+                self._reset()
+                await stream.connected(conn)
+
+            async def message_handler(self, msg: str, conn, timestamp: float):
+                stream.received(timestamp)
+                if LISTEN_KEY_EXPIRED in msg:
+                    await stream.listen_key_expired()
+                    return
+                await super().message_handler(msg, conn, timestamp)
+
+        return UserDataFeed
+
+    def bind(self, transport: OrderTransport, states: Iterable[State]) -> None:
+        # Must be bound before the private feed connects
+        self._transport = transport
+        self._states = {state.symbol: state for state in states}
+
+    def received(self, timestamp: float) -> None:
+        # Receipt time of the latest private feed message, where a gap starts
+        self._last_message = timestamp
+
+    async def connected(self, connection) -> None:
+        self._connection = connection
+        self._connections += 1
+        if self._keepalive_task is None:
+            self._keepalive_task = asyncio.ensure_future(self.__keepalive())
+        # The first connect follows the start up cancel all, nothing to resync
+        if self._connections > 1:
+            await self.resync(self._last_message)
+
+    async def resync(self, gap_started: float = None) -> None:
+        started = time.time()
+        try:
+            await asyncio.wait_for(self.__resync(), self._resync_timeout)
+        except (asyncio.TimeoutError, aiohttp.ClientError) as error:
+            self._failed_resyncs += 1
+            LOG.warning("Resync failed (%r), pulling all orders.", error)
+            for state in self._states.values():
+                cancel_all_orders(self._transport, state.asset)
+        self._resyncs += 1
+
+        recovery = time.time() - (gap_started or started)
+        self._last_recovery = recovery
+        self._max_recovery = max(self._max_recovery, recovery)
+        LOG.info(
+            "Private feed recovered after %.1fms, resync took %.1fms.",
+            recovery * 1000,
+            (time.time() - started) * 1000,
+        )
+
+    async def listen_key_expired(self) -> None:
+        # A new key means a new address, closing the connection reconnects
+        # to it and resyncs what was missed
+        LOG.warning("Listen key expired, reconnecting with a new one.")
+        response = await self._transport.request(POST, LISTEN_KEY, auth=False)
+        connection = self._connection
+        address = connection.address.rsplit("/", 1)[0]
+        connection.address = f"{address}/{response[LISTEN_KEY]}"
+        await connection.close()
+
+    async def close(self) -> None:
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
+
+    async def __resync(self) -> None:
+        states = list(self._states.values())
+        account_info, *open_orders_infos = await asyncio.gather(
+            get_account_info(self._transport),
+            *(
+                self._transport.request(
+                    GET, OPEN_ORDERS, payload={"symbol": state.asset}
+                )
+                for state in states
+            ),
+        )
+        for state, open_orders_info in zip(states, open_orders_infos):
+            open_orders = get_open_orders_from_info(
+                open_orders_info, state.asset, state.symbol, state.instrument
+            )
+            balance = get_balance_for_asset(account_info, state.asset)
+            added, changed, removed = state.resync(open_orders, balance)
+            LOG.info(
+                "Resynced Symbol(%s), %s orders added, %s changed, %s removed.",
+                state.symbol,
+                added,
+                changed,
+                removed,
+            )
+
+    async def __keepalive(self) -> None:
+        while True:
+            await asyncio.sleep(self._keepalive_interval)
+            try:
+                await self._transport.request(PUT, LISTEN_KEY, auth=False)
+            except aiohttp.ClientError as error:
+                LOG.warning("Listen key keepalive failed: %r", error)
+
+
+def _milliseconds(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 1)
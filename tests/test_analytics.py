@@ -0,0 +1,166 @@
+import asyncio
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from cryptofeed.defines import BUY, LIMIT, SELL
+from cryptofeed.types import OrderBook, OrderInfo
+
+from analytics import (
+    BookSeries,
+    FillSeries,
+    analyze,
+    book_series_from_history,
+    book_series_from_recording,
+    fill_series_from_history,
+    fill_series_from_recording,
+    inventory_statistics,
+    markouts,
+)
+from instrument import Instrument
+from market_data import MarketDataReader, MarketDataRecorder
+from market_history import MarketHistory
+
+SYMBOL = "BTC-USDT-PERP"
+EXCHANGE = "BINANCE_FUTURES"
+
+
+def order_info(side: str, status: str, filled: str, timestamp: float) -> OrderInfo:
+    return OrderInfo(
+        EXCHANGE,
+        SYMBOL,
+        "1",
+        side,
+        status,
+        LIMIT,
+        None,
+        Decimal(2),
+        Decimal(2) - Decimal(filled),
+        timestamp,
+        raw={"o": {"c": "bt-1", "p": "100", "q": "2", "z": filled}},
+    )
+
+
+@pytest.fixture
+def recording(tmp_path) -> str:
+    # A bid of ours at 100 filled in two steps while the bids move down
+    async def record(recorder: MarketDataRecorder):
+        book = OrderBook(
+            EXCHANGE,
+            SYMBOL,
+            bids={Decimal(100): Decimal(1)},
+            asks={Decimal(102): Decimal(3)},
+        )
+        await recorder.order_book_handler(book, 1.0)
+        await recorder.order_info_handler(order_info(BUY, "NEW", "0", 1.5), 1.5)
+        await recorder.order_info_handler(order_info(BUY, "TRADE", "1", 2.0), 2.0)
+        book.delta = {
+            "bid": [(Decimal(100), Decimal(0)), (Decimal(99), Decimal(1))],
+            "ask": [],
+        }
+        await recorder.order_book_handler(book, 2.5)
+        await recorder.order_info_handler(order_info(BUY, "TRADE", "2", 3.0), 3.0)
+        book.delta = {
+            "bid": [],
+            "ask": [(Decimal(102), Decimal(0)), (Decimal(101), Decimal(1))],
+        }
+        await recorder.order_book_handler(book, 4.0)
+
+    recorder = MarketDataRecorder(str(tmp_path), SYMBOL)
+    asyncio.run(record(recorder))
+    recorder.close()
+    return str(tmp_path)
+
+
+def test_top_of_book_per_event(recording: str) -> None:
+    book = book_series_from_recording(MarketDataReader(recording))
+    assert book.timestamp.tolist() == [1.0, 2.5, 4.0]
+    assert book.bid.tolist() == [100, 99, 99]
+    assert book.ask.tolist() == [102, 102, 101]
+    assert book.mid.tolist() == [101, 100.5, 100]
+    assert book.spread.tolist() == [2, 3, 2]
+    assert book.microprice[0] == pytest.approx(100.5)
+
+
+def test_fills_from_cumulative_filled_size(recording: str) -> None:
+    fills = fill_series_from_recording(MarketDataReader(recording))
+    assert fills.timestamp.tolist() == [2.0, 3.0]
+    assert fills.size.tolist() == [1, 1]
+    assert fills.inventory.tolist() == [1, 2]
+
+
+def test_mid_outside_book_is_nan() -> None:
+    book = BookSeries(
+        timestamp=np.array([1.0, 2.0]),
+        bid=np.array([99.0, 100.0]),
+        ask=np.array([101.0, 102.0]),
+        bid_size=np.ones(2),
+        ask_size=np.ones(2),
+    )
+    mids = book.mid_at(np.array([0.5, 1.0, 1.5, 2.0, 2.5]))
+    assert np.isnan(mids[[0, 4]]).all()
+    assert mids[1:4].tolist() == [100, 100, 101]
+
+
+def test_markouts_are_signed_by_side() -> None:
+    book = BookSeries(
+        timestamp=np.array([0.0, 1.0, 2.0]),
+        bid=np.array([99.0, 101.0, 103.0]),
+        ask=np.array([101.0, 103.0, 105.0]),
+        bid_size=np.ones(3),
+        ask_size=np.ones(3),
+    )
+    fills = FillSeries(
+        timestamp=np.array([0.0, 0.0]),
+        side=np.array([1, -1]),
+        price=np.array([99.0, 101.0]),
+        size=np.ones(2),
+    )
+    assert markouts(book, fills, (1.0, 3.0)).tolist() == [
+        [3.0, pytest.approx(np.nan, nan_ok=True)],
+        [-1.0, pytest.approx(np.nan, nan_ok=True)],
+    ]
+
+
+def test_inventory_is_time_weighted() -> None:
+    fills = FillSeries(
+        timestamp=np.array([1.0, 3.0]),
+        side=np.array([1, -1]),
+        price=np.array([100.0, 100.0]),
+        size=np.array([2.0, 2.0]),
+    )
+    statistics = inventory_statistics(fills, 0.0, 4.0)
+    assert statistics["mean"] == 1.0
+    assert statistics["max_absolute"] == 2.0
+    assert statistics["time_flat"] == 0.5
+
+
+def test_analyze_splits_edge_into_realized_spread_and_adverse_selection(
+    recording: str,
+) -> None:
+    report = analyze(recording, horizons=(1.0,))
+    fills = report["fills"]
+    assert fills["edge"] == pytest.approx(0.75)
+    assert fills["realized_spread_1s"] == pytest.approx(0.25)
+    assert fills["adverse_selection_1s"] == pytest.approx(0.5)
+    assert report["quotes"]["mean_distance"] == pytest.approx(1.0)
+    assert report["inventory"]["time_flat"] == pytest.approx(1 / 3)
+
+
+def test_series_from_history() -> None:
+    history = MarketHistory()
+    history.top_changed(1.0, 1000, 2000, 1002, 1000)
+    history.top_changed(3.0, 998, 1000, 1000, 1000)
+    history.order_event(1.5, "NEW", 1, 1000, 2000)
+    history.order_event(2.0, "TRADE", 1, 1000, 1000, 1000)
+    instrument = Instrument(SYMBOL, "0.1", "0.001")
+
+    book = book_series_from_history(history, instrument)
+    assert book.mid.tolist() == pytest.approx([100.1, 99.9])
+    assert book.bid_size.tolist() == [2, 1]
+
+    fills = fill_series_from_history(history, instrument)
+    assert fills.timestamp.tolist() == [2.0]
+    assert fills.price.tolist() == pytest.approx([100.0])
+    assert fills.size.tolist() == [1]
+    assert markouts(book, fills, (1.0,)).tolist() == [[pytest.approx(-0.1)]]
@@ -0,0 +1,138 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+from cryptofeed.defines import BUY, DELETE, L2_BOOK, ORDER_INFO, POSITIONS, POST
+from cryptofeed.types import Position
+
+from backtest import Backtest, SimulatedExchange
+from instrument import Instrument
+from order import ORDER, OrderRejectedError
+from order_registry import OrderStatus
+from rate_limits import RateLimitTracker
+
+SYMBOL = "BTC-USDT-PERP"
+ASSET = "BTCUSDT"
+# Whole dollar ticks, so prices in ticks read as dollars
+INSTRUMENT = Instrument(SYMBOL, "1", "0.001")
+
+
+def snapshot(timestamp: float = 0.0):
+    bids = [(Decimal(100 - i), Decimal(1)) for i in range(20)]
+    asks = [(Decimal(101 + i), Decimal(1)) for i in range(20)]
+    return timestamp, L2_BOOK, (bids, asks, True)
+
+
+def delta(timestamp: float, bids=(), asks=()):
+    return timestamp, L2_BOOK, (list(bids), list(asks), False)
+
+
+@pytest.fixture
+def backtest():
+    return Backtest(SYMBOL, ASSET, instrument=INSTRUMENT)
+
+
+def test_orders_inserted_on_first_book(backtest: Backtest) -> None:
+    result = backtest.run([snapshot()])
+
+    assert result.events == 1
+    assert backtest.exchange.open_orders == 4
+    orders = backtest.state.orders
+    assert orders.count(OrderStatus.LIVE) == 4
+    assert orders.count(OrderStatus.PENDING_NEW) == 0
+    assert sorted(order.price for order in orders.open_orders(BUY)) == [90, 100]
+
+
+def test_orders_throttled_by_given_rate_limits() -> None:
+    rate_limits = RateLimitTracker(orders_per_10_seconds=0)
+    backtest = Backtest(SYMBOL, ASSET, instrument=INSTRUMENT, rate_limits=rate_limits)
+    backtest.run([snapshot()])
+
+    assert backtest.exchange.rate_limits is rate_limits
+    assert backtest.exchange.open_orders == 0
+
+
+def test_resting_order_filled_when_book_trades_through(backtest: Backtest) -> None:
+    events = [
+        snapshot(),
+        # Asks drop through our bid at 100
+        delta(
+            1.0, bids=[(Decimal(100), Decimal(0))], asks=[(Decimal(100), Decimal(2))]
+        ),
+    ]
+    result = backtest.run(events)
+
+    assert result.trades == 1
+    assert result.position == Decimal("0.01")
+    assert backtest.state.balance == pytest.approx(0.01)
+    assert result.volume == Decimal("0.01")
+
+
+def test_replay_is_deterministic() -> None:
+    events = [
+        snapshot(),
+        delta(
+            1.0, bids=[(Decimal(100), Decimal(0))], asks=[(Decimal(100), Decimal(2))]
+        ),
+        delta(2.0, bids=[(Decimal(99), Decimal(0))], asks=[(Decimal(99), Decimal(1))]),
+        delta(3.0, asks=[(Decimal(99), Decimal(0)), (Decimal(100), Decimal(0))]),
+    ]
+    first = Backtest(SYMBOL, ASSET).run(events)
+    second = Backtest(SYMBOL, ASSET).run(events)
+
+    assert (first.trades, first.position, first.pnl) == (
+        second.trades,
+        second.position,
+        second.pnl,
+    )
+
+
+def test_recorded_order_info_is_passed_through_with_replay_account() -> None:
+    backtest = Backtest(SYMBOL, ASSET, instrument=INSTRUMENT, replay_account=True)
+    exchange = SimulatedExchange(SYMBOL)
+
+    async def record():
+        await exchange.request(
+            POST,
+            ORDER,
+            payload={"side": "BUY", "price": "50", "quantity": "0.01"},
+        )
+
+    asyncio.run(record())
+    ((_, order_info),) = exchange.take_events()
+
+    backtest.run([snapshot(), (1.0, ORDER_INFO, order_info)])
+    assert backtest.state.orders.get(order_info.id) is not None
+
+
+def test_recorded_account_events_are_skipped(backtest: Backtest) -> None:
+    exchange = SimulatedExchange(SYMBOL)
+
+    async def record():
+        await exchange.request(
+            POST,
+            ORDER,
+            payload={"side": "BUY", "price": "100", "quantity": "0.01"},
+        )
+
+    asyncio.run(record())
+    ((_, order_info),) = exchange.take_events()
+    position = Position(
+        "BINANCE_FUTURES", SYMBOL, Decimal(5), Decimal(100), "both", Decimal(0), 1.0
+    )
+    recorded = [(1.0, ORDER_INFO, order_info), (1.0, POSITIONS, position)]
+
+    result = backtest.run([snapshot()] + recorded)
+    assert result.events == 1
+    assert backtest.state.balance == 0
+    assert backtest.state.orders.open_count() == 4
+
+
+def test_cancel_of_unknown_order_is_rejected() -> None:
+    exchange = SimulatedExchange(SYMBOL)
+
+    async def cancel():
+        await exchange.request(DELETE, ORDER, payload={"orderId": "1"})
+
+    with pytest.raises(OrderRejectedError):
+        asyncio.run(cancel())
@@ -0,0 +1,97 @@
+import asyncio
+from unittest.mock import Mock
+
+from book_scheduler import BookScheduler
+from local_book import BookSide
+
+
+def bound_scheduler(top_market: dict, **options):
+    scheduler = BookScheduler(**options)
+    decide = Mock()
+    scheduler.bind(decide, lambda: top_market)
+    return scheduler, decide
+
+
+def test_burst_is_conflated_into_one_decision() -> None:
+    top_market = {BookSide.BID: (1, 1)}
+    scheduler, decide = bound_scheduler(top_market)
+
+    async def run():
+        for size in range(1, 6):
+            top_market[BookSide.BID] = (1, size)
+            scheduler.book_updated()
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+
+    decide.assert_called_once()
+    assert scheduler.counters == {
+        "updates": 5,
+        "decisions": 1,
+        "conflated": 4,
+        "filtered": 0,
+    }
+
+
+def test_unchanged_top_of_book_is_filtered() -> None:
+    top_market = {BookSide.BID: (1, 1)}
+    scheduler, decide = bound_scheduler(top_market, max_decision_rate=None)
+
+    async def run():
+        for _ in range(3):
+            scheduler.book_updated()
+            await asyncio.sleep(0)
+
+    asyncio.run(run())
+
+    assert decide.call_count == 1
+    assert scheduler.counters["filtered"] == 2
+
+
+def test_invalidate_runs_decision_on_unchanged_top() -> None:
+    scheduler, decide = bound_scheduler({}, max_decision_rate=None)
+
+    async def run():
+        scheduler.book_updated()
+        await asyncio.sleep(0)
+        scheduler.invalidate()
+        scheduler.book_updated()
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+
+    assert decide.call_count == 2
+
+
+def test_every_update_decides_without_filter() -> None:
+    scheduler, decide = bound_scheduler(
+        {}, max_decision_rate=None, top_of_book_only=False
+    )
+
+    async def run():
+        for _ in range(3):
+            scheduler.book_updated()
+            await asyncio.sleep(0)
+
+    asyncio.run(run())
+
+    assert decide.call_count == 3
+
+
+def test_decisions_are_rate_limited() -> None:
+    top_market = {}
+    scheduler, decide = bound_scheduler(top_market, max_decision_rate=20)
+
+    async def run():
+        scheduler.book_updated()
+        await asyncio.sleep(0)
+        top_market[BookSide.ASK] = (2, 1)
+        scheduler.book_updated()
+        await asyncio.sleep(0)
+        assert decide.call_count == 1
+        assert scheduler.is_pending
+        await asyncio.sleep(0.06)
+
+    asyncio.run(run())
+
+    assert decide.call_count == 2
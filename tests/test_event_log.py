@@ -0,0 +1,60 @@
+import json
+import logging
+import queue
+
+from event_log import DeferredQueueHandler, JsonLinesFormatter, RateLimitFilter
+
+
+def make_record(msg: str, *args, created: float = 0.0) -> logging.LogRecord:
+    record = logging.LogRecord("strategy.test", logging.INFO, "", 0, msg, args, None)
+    record.created = created
+    return record
+
+
+def test_queue_handler_defers_formatting() -> None:
+    records = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+    record = make_record("Price(%s)", 100)
+
+    handler.handle(record)
+    queued = records.get_nowait()
+    assert queued is record
+    assert queued.msg == "Price(%s)"
+    assert queued.args == (100,)
+
+
+def test_rate_limit_drops_repeats_within_interval() -> None:
+    rate_limit = RateLimitFilter(interval=1.0)
+
+    assert rate_limit.filter(make_record("Pending", created=0.0))
+    assert not rate_limit.filter(make_record("Pending", created=0.5))
+    assert not rate_limit.filter(make_record("Pending", created=0.9))
+    # Different arguments are a different message
+    assert rate_limit.filter(make_record("Pending %s", 1, created=0.9))
+
+    record = make_record("Pending", created=1.5)
+    assert rate_limit.filter(record)
+    assert record.suppressed == 2
+
+
+def test_rate_limit_expires_old_entries() -> None:
+    rate_limit = RateLimitFilter(interval=1.0, max_entries=2)
+
+    assert rate_limit.filter(make_record("a", created=0.0))
+    assert rate_limit.filter(make_record("b", created=0.0))
+    assert rate_limit.filter(make_record("c", created=2.0))
+    assert len(rate_limit._last_seen) == 1
+
+
+def test_json_lines_formatter() -> None:
+    record = make_record("Price(%s)", 100, created=1.0)
+    record.suppressed = 3
+
+    event = json.loads(JsonLinesFormatter().format(record))
+    assert event == {
+        "ts": 1.0,
+        "level": "INFO",
+        "logger": "strategy.test",
+        "msg": "Price(100)",
+        "suppressed": 3,
+    }
@@ -0,0 +1,234 @@
+import asyncio
+import json
+from decimal import Decimal
+
+from aiohttp.test_utils import TestClient, TestServer
+from cryptofeed.defines import BUY, SELL
+
+from exchange_simulator import (
+    ExchangeSimulator,
+    MatchingEngine,
+    RateLimiter,
+    SimulatedOrder,
+)
+
+SYMBOL = "BTCUSDT"
+
+
+def order(order_id: int, side: str, price: str, quantity: str, owner=None):
+    return SimulatedOrder(
+        order_id, str(order_id), SYMBOL, side, Decimal(price), Decimal(quantity), owner
+    )
+
+
+def test_orders_fill_in_price_time_priority() -> None:
+    engine = MatchingEngine(SYMBOL)
+    first = order(1, SELL, "101", "1")
+    second = order(2, SELL, "101", "1")
+    better = order(3, SELL, "100", "1")
+    for resting in (first, second, better):
+        engine.submit(resting)
+
+    fills = engine.submit(order(4, BUY, "101", "1.5"))
+
+    assert [(fill[0].order_id, fill[2], fill[3]) for fill in fills] == [
+        (3, Decimal("100"), Decimal("1")),
+        (1, Decimal("101"), Decimal("0.5")),
+    ]
+    assert engine.depth(5) == ([], [(Decimal("101"), Decimal("1.5"))])
+    assert first.remaining == Decimal("0.5")
+    assert engine.get(3) is None
+
+
+def test_immediate_or_cancel_does_not_rest() -> None:
+    engine = MatchingEngine(SYMBOL)
+    engine.submit(order(1, SELL, "100", "1"))
+
+    engine.submit(order(2, BUY, "100", "2"), rest=False)
+
+    assert engine.depth(5) == ([], [])
+    assert engine.get(2) is None
+
+
+def test_modify_loses_priority_on_price_change() -> None:
+    engine = MatchingEngine(SYMBOL)
+    engine.submit(order(1, BUY, "99", "1"))
+    engine.submit(order(2, BUY, "99", "1"))
+    engine.modify(1, Decimal("98"), Decimal("1"))
+    engine.modify(1, Decimal("99"), Decimal("1"))
+
+    fills = engine.submit(order(3, SELL, "99", "1"))
+
+    assert fills[0][0].order_id == 2
+
+
+def test_modify_size_down_keeps_priority() -> None:
+    engine = MatchingEngine(SYMBOL)
+    engine.submit(order(1, BUY, "99", "2"))
+    engine.submit(order(2, BUY, "99", "1"))
+    engine.modify(1, Decimal("99"), Decimal("1"))
+
+    fills = engine.submit(order(3, SELL, "99", "1"))
+
+    assert fills[0][0].order_id == 1
+    assert engine.depth(1) == ([(Decimal("99"), Decimal("1"))], [])
+
+
+def test_take_changes_reports_changed_levels() -> None:
+    engine = MatchingEngine(SYMBOL)
+    engine.submit(order(1, BUY, "99", "1"))
+    engine.submit(order(2, SELL, "101", "1"))
+
+    assert engine.take_changes() == (
+        1,
+        [(Decimal("99"), Decimal("1"))],
+        [(Decimal("101"), Decimal("1"))],
+    )
+    assert engine.take_changes() is None
+
+    engine.cancel(1)
+
+    assert engine.take_changes() == (2, [(Decimal("99"), Decimal("0"))], [])
+
+
+def test_rate_limiter_rejects_over_weight() -> None:
+    limiter = RateLimiter(weight_per_minute=10, orders_per_10_seconds=1)
+
+    assert limiter.acquire(10, 0) is None
+    assert limiter.acquire(1, 0)[0] == -1003
+    assert limiter.used(60) == 10
+
+
+def test_rate_limiter_rejects_over_order_count() -> None:
+    limiter = RateLimiter(weight_per_minute=10, orders_per_10_seconds=1)
+
+    assert limiter.acquire(1, 1) is None
+    assert limiter.acquire(1, 1)[0] == -1015
+
+
+def test_background_flow_keeps_both_sides() -> None:
+    simulator = ExchangeSimulator(messages_per_second=0, seed=1)
+
+    for _ in range(1000):
+        simulator.step(SYMBOL)
+
+    bids, asks = simulator.engine(SYMBOL).depth(1)
+    assert bids and asks
+    assert bids[0][0] < asks[0][0]
+
+
+def run_with_client(simulator: ExchangeSimulator, scenario) -> None:
+    async def run():
+        client = TestClient(TestServer(simulator.application()))
+        await client.start_server()
+        try:
+            await scenario(client)
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+
+
+def test_order_round_trip_over_rest() -> None:
+    simulator = ExchangeSimulator(messages_per_second=0, seed=1)
+    best_ask = simulator.engine(SYMBOL).best(SELL)
+
+    async def scenario(client: TestClient) -> None:
+        listen_key = await (await client.post("/fapi/v1/listenKey")).json()
+        ws = await client.ws_connect(f"/ws/{listen_key['listenKey']}")
+        response = await client.post(
+            "/fapi/v1/order",
+            params={
+                "symbol": SYMBOL,
+                "side": "BUY",
+                "type": "LIMIT",
+                "price": str(best_ask - 100),
+                "quantity": "0.5",
+                "newClientOrderId": "abc",
+            },
+        )
+        inserted = await response.json()
+        assert response.headers["X-MBX-ORDER-COUNT-10S"] == "1"
+
+        open_orders = await (
+            await client.get("/fapi/v1/openOrders", params={"symbol": SYMBOL})
+        ).json()
+        assert [o["clientOrderId"] for o in open_orders] == ["abc"]
+
+        response = await client.delete(
+            "/fapi/v1/order",
+            params={"symbol": SYMBOL, "orderId": inserted["orderId"]},
+        )
+        assert (await response.json())["status"] == "CANCELED"
+
+        updates = [json.loads(await ws.receive_str()) for _ in range(2)]
+        assert [update["o"]["x"] for update in updates] == ["NEW", "CANCELED"]
+        await ws.close()
+
+    run_with_client(simulator, scenario)
+
+
+def test_aggressive_order_updates_position() -> None:
+    simulator = ExchangeSimulator(messages_per_second=0, seed=1)
+    best_ask = simulator.engine(SYMBOL).best(SELL)
+
+    async def scenario(client: TestClient) -> None:
+        await client.post(
+            "/fapi/v1/order",
+            params={
+                "symbol": SYMBOL,
+                "side": "BUY",
+                "price": str(best_ask),
+                "quantity": "0.001",
+            },
+        )
+        account = await (await client.get("/fapi/v2/account")).json()
+        assert account["positions"][0]["positionAmt"] == "0.001"
+
+    run_with_client(simulator, scenario)
+
+
+def test_unknown_order_is_rejected() -> None:
+    simulator = ExchangeSimulator(messages_per_second=0)
+
+    async def scenario(client: TestClient) -> None:
+        response = await client.delete(
+            "/fapi/v1/order", params={"symbol": SYMBOL, "orderId": "999"}
+        )
+        assert response.status == 400
+        assert (await response.json())["code"] == -2011
+
+    run_with_client(simulator, scenario)
+
+
+def test_rate_limit_returns_too_many_requests() -> None:
+    simulator = ExchangeSimulator(
+        messages_per_second=0, rate_limiter=RateLimiter(weight_per_minute=1)
+    )
+
+    async def scenario(client: TestClient) -> None:
+        assert (await client.get("/fapi/v1/ping")).status == 200
+        response = await client.get("/fapi/v1/ping")
+        assert response.status == 429
+        assert 0 < int(response.headers["Retry-After"]) <= 60
+        assert (await response.json())["code"] == -1003
+
+    run_with_client(simulator, scenario)
+
+
+def test_depth_stream_follows_snapshot() -> None:
+    simulator = ExchangeSimulator(messages_per_second=0, seed=1)
+
+    async def scenario(client: TestClient) -> None:
+        ws = await client.ws_connect("/stream?streams=btcusdt@depth@100ms")
+        snapshot = await (
+            await client.get("/fapi/v1/depth", params={"symbol": SYMBOL})
+        ).json()
+        simulator.step(SYMBOL)
+
+        update = json.loads(await ws.receive_str())
+        assert update["stream"] == "btcusdt@depth@100ms"
+        assert update["data"]["pu"] == snapshot["lastUpdateId"]
+        await ws.close()
+
+    run_with_client(simulator, scenario)
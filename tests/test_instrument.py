@@ -0,0 +1,79 @@
+import asyncio
+from decimal import Decimal
+from unittest.mock import AsyncMock, Mock
+
+from instrument import Instrument, instruments_from_exchange_info, load_instruments
+
+
+def exchange_info(symbol: str, tick_size: str, step_size: str) -> dict:
+    return {
+        "symbols": [
+            {
+                "symbol": symbol,
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "tickSize": tick_size},
+                    {"filterType": "LOT_SIZE", "stepSize": step_size},
+                ],
+            }
+        ]
+    }
+
+
+def test_strings_parsed_to_ticks_and_lots() -> None:
+    instrument = Instrument("BTC-USDT-PERP", "0.10", "0.001")
+    assert instrument.parse_price("30000.1") == 300001
+    assert instrument.parse_price("30000.10") == 300001
+    assert instrument.parse_price("30000") == 300000
+    assert instrument.parse_size("0.010") == 10
+    assert instrument.parse_size("2") == 2000
+
+
+def test_ticks_and_lots_formatted_to_strings() -> None:
+    instrument = Instrument("BTC-USDT-PERP", "0.10", "0.001")
+    assert instrument.format_price(300001) == "30000.10"
+    assert instrument.format_price(1) == "0.10"
+    assert instrument.format_size(10) == "0.010"
+    assert instrument.format_size(-1) == "-0.001"
+
+
+def test_coarse_ticks_round_trip() -> None:
+    instrument = Instrument("ETH-USDT-PERP", "0.5", "1")
+    assert instrument.parse_price("100.5") == 201
+    assert instrument.format_price(201) == "100.5"
+    assert instrument.parse_size("3") == 3
+    assert instrument.format_size(3) == "3"
+
+
+def test_decimals_converted_to_ticks_and_lots() -> None:
+    instrument = Instrument("BTC-USDT-PERP", "0.10", "0.001")
+    assert instrument.to_ticks(Decimal("30000.1")) == 300001
+    assert instrument.to_lots(Decimal("1.5")) == 1500
+    assert instrument.price(300001) == Decimal("30000.1")
+    assert instrument.size(1500) == Decimal("1.5")
+
+
+def test_off_grid_values_truncated() -> None:
+    instrument = Instrument("BTC-USDT-PERP", "0.10", "0.001")
+    assert instrument.parse_price("30000.19") == 300001
+    assert instrument.to_lots(Decimal("0.0019")) == 1
+
+
+def test_instruments_read_from_exchange_info() -> None:
+    instruments = instruments_from_exchange_info(
+        exchange_info("BTCUSDT", "0.10", "0.001"),
+        {"BTCUSDT": "BTC-USDT-PERP", "ETHUSDT": "ETH-USDT-PERP"},
+    )
+    assert list(instruments) == ["BTC-USDT-PERP"]
+    assert instruments["BTC-USDT-PERP"].tick_size == Decimal("0.10")
+    assert instruments["BTC-USDT-PERP"].step_size == Decimal("0.001")
+
+
+def test_load_instruments_requests_exchange_info() -> None:
+    transport = Mock()
+    transport.exchange_symbol.return_value = "BTCUSDT"
+    transport.request = AsyncMock(
+        return_value=exchange_info("BTCUSDT", "0.10", "0.001")
+    )
+    instruments = asyncio.run(load_instruments(transport, ["BTC-USDT-PERP"]))
+    assert transport.request.call_args.args == ("GET", "exchangeInfo")
+    assert instruments["BTC-USDT-PERP"].symbol == "BTC-USDT-PERP"
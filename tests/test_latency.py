@@ -0,0 +1,153 @@
+import pytest
+
+from latency import (
+    LatencyHistogram,
+    LatencyMetrics,
+    LatencyStage,
+    RequestKind,
+    _bucket_highest_value,
+    _bucket_index,
+    request_stage,
+)
+
+INSERT = RequestKind.INSERT
+CANCEL = RequestKind.CANCEL
+
+
+@pytest.fixture
+def metrics():
+    return LatencyMetrics()
+
+
+def test_bucket_bounds_contain_value() -> None:
+    for value in (0, 1, 31, 32, 33, 1000, 123456, 10**9):
+        index = _bucket_index(value)
+        assert value <= _bucket_highest_value(index)
+        # Relative error is bounded by the sub bucket resolution
+        assert _bucket_highest_value(index) - value <= max(value / 16, 1)
+    assert _bucket_index(1000) < _bucket_index(1100)
+
+
+def test_histogram_percentiles() -> None:
+    histogram = LatencyHistogram()
+    for value in range(1, 1001):
+        histogram.record(value * 1000)
+
+    assert len(histogram) == 1000
+    assert histogram.min == 1000
+    assert histogram.max == 1000000
+    assert histogram.percentile(50) == pytest.approx(500000, rel=0.05)
+    assert histogram.percentile(99) == pytest.approx(990000, rel=0.05)
+    assert histogram.percentile(100) == 1000000
+
+    histogram.reset()
+    assert len(histogram) == 0
+    assert histogram.percentile(50) == 0
+
+
+def test_histogram_clamps_negative_values() -> None:
+    histogram = LatencyHistogram()
+    histogram.record(-5)
+    assert histogram.min == 0
+
+
+def test_order_timeline(metrics: LatencyMetrics) -> None:
+    histograms = metrics.histograms
+    metrics.book_received(None, 0)
+    metrics.decided("bt-1", INSERT)
+    metrics.sent("bt-1", INSERT)
+    # Confirmation before the REST ack
+    metrics.confirmed("bt-1", INSERT)
+    assert metrics.tracked_orders == 1
+    metrics.acknowledged("bt-1", INSERT)
+    assert metrics.tracked_orders == 0
+
+    for stage in (
+        LatencyStage.HANDLER_TO_DECISION,
+        LatencyStage.DECISION_TO_SEND,
+        LatencyStage.TICK_TO_TRADE,
+        LatencyStage.SEND_TO_ACK,
+        LatencyStage.SEND_TO_CONFIRM,
+    ):
+        assert len(histograms[request_stage(INSERT, stage)]) == 1
+    assert len(histograms[LatencyStage.RECEIPT_TO_HANDLER]) == 0
+
+
+def test_feed_timestamps(metrics: LatencyMetrics) -> None:
+    metrics.book_received(1.0, 1.5)
+    histogram = metrics.histograms[LatencyStage.EXCHANGE_TO_RECEIPT]
+    assert histogram.max == pytest.approx(500000000, rel=0.05)
+    assert len(metrics.histograms[LatencyStage.RECEIPT_TO_HANDLER]) == 1
+
+
+def test_untracked_and_discarded_orders(metrics: LatencyMetrics) -> None:
+    # No book seen yet, nothing to measure from
+    metrics.decided("bt-1", INSERT)
+    assert metrics.tracked_orders == 0
+
+    metrics.book_received(None, 0)
+    metrics.decided(None, INSERT)
+    metrics.decided("bt-2", INSERT)
+    metrics.sent("bt-2", INSERT)
+    metrics.discard("bt-2", INSERT)
+    metrics.acknowledged("bt-2", INSERT)
+    assert metrics.tracked_orders == 0
+    send_to_ack = request_stage(INSERT, LatencyStage.SEND_TO_ACK)
+    assert len(metrics.histograms[send_to_ack]) == 0
+
+
+def test_request_kinds_timed_separately(metrics: LatencyMetrics) -> None:
+    # A cancel reuses the client order id of the insert it pulls
+    metrics.book_received(None, 0)
+    metrics.decided("bt-1", INSERT)
+    metrics.sent("bt-1", INSERT)
+    metrics.decided("bt-1", CANCEL)
+    metrics.sent("bt-1", CANCEL)
+    assert metrics.tracked_orders == 2
+
+    metrics.acknowledged("bt-1", CANCEL)
+    histograms = metrics.histograms
+    assert len(histograms[request_stage(CANCEL, LatencyStage.SEND_TO_ACK)]) == 1
+    assert len(histograms[request_stage(INSERT, LatencyStage.SEND_TO_ACK)]) == 0
+    assert len(histograms[request_stage(INSERT, LatencyStage.TICK_TO_TRADE)]) == 1
+
+
+def test_requests_after_decision_pass_not_timed(metrics: LatencyMetrics) -> None:
+    metrics.book_received(None, 0)
+    metrics.decision_done()
+    # As a pull on a resync, long after the last tick
+    metrics.decided("bt-1", CANCEL)
+    metrics.sent("bt-1", CANCEL)
+    assert metrics.tracked_orders == 0
+    tick_to_trade = request_stage(CANCEL, LatencyStage.TICK_TO_TRADE)
+    assert len(metrics.histograms[tick_to_trade]) == 0
+
+
+def test_oldest_unconfirmed_orders_are_evicted() -> None:
+    metrics = LatencyMetrics(max_tracked_orders=2)
+    metrics.book_received(None, 0)
+    # Sent and never acked nor confirmed, as after a lost response
+    for client_order_id in ("bt-1", "bt-2", "bt-3"):
+        metrics.decided(client_order_id, INSERT)
+        metrics.sent(client_order_id, INSERT)
+    assert metrics.tracked_orders == 2
+
+    histogram = metrics.histograms[request_stage(INSERT, LatencyStage.SEND_TO_ACK)]
+    metrics.acknowledged("bt-1", INSERT)
+    assert len(histogram) == 0
+    metrics.acknowledged("bt-3", INSERT)
+    assert len(histogram) == 1
+
+
+def test_snapshot(metrics: LatencyMetrics) -> None:
+    send_to_ack = request_stage(INSERT, LatencyStage.SEND_TO_ACK)
+    metrics.histograms[send_to_ack].record(2000)
+    snapshot = metrics.snapshot()
+    assert snapshot[send_to_ack]["count"] == 1
+    assert snapshot[send_to_ack]["p50_us"] == 2.0
+    assert snapshot[request_stage(INSERT, LatencyStage.TICK_TO_TRADE)]["count"] == 0
+
+
+def test_snapshot_includes_sections(metrics: LatencyMetrics) -> None:
+    metrics.add_section("conflation", lambda: {"updates": 3})
+    assert metrics.snapshot()["conflation"] == {"updates": 3}
@@ -0,0 +1,76 @@
+from decimal import Decimal
+from unittest.mock import Mock
+
+import pytest
+from cryptofeed.types import OrderBook
+
+from instrument import Instrument
+from local_book import BookSide, LocalBook
+
+# Half unit ticks and lots, feed Decimals are doubled when applied
+INSTRUMENT = Instrument("BTC-USDT-PERP", "0.5", "0.5")
+
+
+@pytest.fixture
+def book():
+    local_book = LocalBook(INSTRUMENT)
+    local_book.reset(bids={20: 2, 18: 4, 16: 6}, asks={22: 2, 24: 4})
+    return local_book
+
+
+def delta_book(bids=(), asks=()) -> Mock:
+    book = Mock()
+    book.delta = {BookSide.BID: list(bids), BookSide.ASK: list(asks)}
+    return book
+
+
+def test_best_levels(book: LocalBook) -> None:
+    assert book.best(BookSide.BID) == (20, 2)
+    assert book.best(BookSide.ASK) == (22, 2)
+
+
+def test_levels_ordered_from_top(book: LocalBook) -> None:
+    assert book.levels(BookSide.BID, 2) == [(20, 2), (18, 4)]
+    assert book.levels(BookSide.ASK, 5) == [(22, 2), (24, 4)]
+    assert book.levels(BookSide.BID, 0) == []
+
+
+def test_snapshot_rebuilds_book(book: LocalBook) -> None:
+    snapshot = OrderBook(
+        "BINANCE_FUTURES",
+        "BTC-USDT-PERP",
+        bids={Decimal(5): Decimal(1)},
+        asks={Decimal(6): Decimal("1.5")},
+    )
+    book.apply(snapshot)
+    assert book.best(BookSide.BID) == (10, 2)
+    assert book.best(BookSide.ASK) == (12, 3)
+    assert len(book) == 2
+
+
+def test_delta_inserts_updates_and_removes_levels(book: LocalBook) -> None:
+    book.apply(
+        delta_book(
+            bids=[(Decimal("10.5"), Decimal(4)), (Decimal(9), Decimal(5))],
+            asks=[(Decimal(11), Decimal(0))],
+        )
+    )
+    assert book.best(BookSide.BID) == (21, 8)
+    assert book.depth_at(BookSide.BID, 18) == 10
+    assert book.best(BookSide.ASK) == (24, 4)
+    assert book.depth_at(BookSide.ASK, 22) == 0
+
+
+def test_removing_missing_level_is_ignored(book: LocalBook) -> None:
+    book.apply(delta_book(asks=[(Decimal(20), Decimal(0))]))
+    assert len(book) == 5
+
+
+def test_empty_side_has_no_best() -> None:
+    assert LocalBook(INSTRUMENT).best(BookSide.BID) is None
+
+
+def test_queue_size_excludes_own_orders(book: LocalBook) -> None:
+    assert book.queue_size(BookSide.BID, 18, 1) == 3
+    assert book.queue_size(BookSide.BID, 20, 2) == 0
+    assert book.queue_size(BookSide.BID, 14, 2) == 0
@@ -0,0 +1,14 @@
+from local_exchange import local_binance_futures
+
+
+def test_local_binance_futures_points_at_simulator() -> None:
+    exchange = local_binance_futures("http://127.0.0.1:8765", "wss://127.0.0.1:8766")
+
+    assert (
+        exchange.rest_endpoints[0]
+        .route("l2book", sandbox=True)
+        .startswith("http://127.0.0.1:8765/fapi/v1/depth")
+    )
+    assert exchange.websocket_endpoints[0].get_address(sandbox=True) == (
+        "wss://127.0.0.1:8766"
+    )
@@ -0,0 +1,141 @@
+import asyncio
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from cryptofeed.defines import BUY, L2_BOOK, LIMIT, ORDER_INFO, POSITIONS, SELL, TRADES
+from cryptofeed.types import OrderBook, OrderInfo, Position, Trade
+
+from market_data import PRICE_SCALE, MarketDataReader, MarketDataRecorder
+
+SYMBOL = "BTC-USDT-PERP"
+EXCHANGE = "BINANCE_FUTURES"
+
+
+def record_book(recorder: MarketDataRecorder) -> None:
+    async def record():
+        book = OrderBook(
+            EXCHANGE,
+            SYMBOL,
+            bids={Decimal("100.5"): Decimal("1.25")},
+            asks={Decimal("101"): Decimal(2)},
+        )
+        book.timestamp = 1.0
+        await recorder.order_book_handler(book, 1.5)
+
+        book.delta = {"bid": [(Decimal("100.5"), Decimal(0))], "ask": []}
+        book.timestamp = 2.0
+        await recorder.order_book_handler(book, 2.5)
+
+    asyncio.run(record())
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_book_round_trip(tmp_path, compress: bool) -> None:
+    recorder = MarketDataRecorder(str(tmp_path), SYMBOL, compress=compress)
+    record_book(recorder)
+    recorder.close()
+
+    reader = MarketDataReader(str(tmp_path))
+    events = list(reader.events())
+    assert events == [
+        (
+            1.5,
+            L2_BOOK,
+            ([(Decimal("100.5"), Decimal("1.25"))], [(Decimal(101), Decimal(2))], True),
+        ),
+        (2.5, L2_BOOK, ([(Decimal("100.5"), Decimal(0))], [], False)),
+    ]
+
+    columns = reader.read(L2_BOOK)
+    assert columns["price"].dtype == np.int64
+    assert columns["price"].tolist() == [
+        int(Decimal("100.5") * PRICE_SCALE),
+        101 * PRICE_SCALE,
+        int(Decimal("100.5") * PRICE_SCALE),
+    ]
+    assert columns["timestamp"][0] == 1_000_000_000
+
+
+def test_uncompressed_chunks_are_views_of_the_file(tmp_path) -> None:
+    recorder = MarketDataRecorder(str(tmp_path), SYMBOL, compress=False)
+    record_book(recorder)
+    recorder.close()
+
+    reader = MarketDataReader(str(tmp_path))
+    (chunk,) = reader.chunks(L2_BOOK)
+    assert not chunk["price"].flags.owndata
+    assert not chunk["price"].flags.writeable
+
+
+def test_chunks_are_written_when_full(tmp_path) -> None:
+    recorder = MarketDataRecorder(str(tmp_path), SYMBOL, chunk_rows=2)
+    record_book(recorder)
+    recorder.close()
+
+    reader = MarketDataReader(str(tmp_path))
+    assert [len(chunk["price"]) for chunk in reader.chunks(L2_BOOK)] == [2, 1]
+    assert len(reader.read(L2_BOOK)["price"]) == 3
+
+
+def test_order_and_position_round_trip(tmp_path) -> None:
+    recorder = MarketDataRecorder(str(tmp_path), SYMBOL)
+    order_info = OrderInfo(
+        EXCHANGE,
+        SYMBOL,
+        "42",
+        BUY,
+        "TRADE",
+        LIMIT,
+        Decimal(100),
+        Decimal("0.01"),
+        Decimal(0),
+        3.0,
+        raw={"o": {"c": "bt-1", "p": "100", "q": "0.01", "z": "0.01", "X": "FILLED"}},
+    )
+    position = Position(
+        EXCHANGE, SYMBOL, Decimal("0.01"), Decimal(100), "both", Decimal(0), 3.0
+    )
+
+    async def record():
+        await recorder.order_info_handler(order_info, 3.1)
+        await recorder.positions_handler(position, 3.2)
+
+    asyncio.run(record())
+    recorder.close()
+
+    events = list(MarketDataReader(str(tmp_path)).events())
+    assert [(timestamp, channel) for timestamp, channel, _ in events] == [
+        (3.1, ORDER_INFO),
+        (3.2, POSITIONS),
+    ]
+    replayed_order = events[0][2]
+    assert replayed_order.id == "42"
+    assert replayed_order.side == BUY
+    assert replayed_order.status == "TRADE"
+    assert replayed_order.raw["o"]["c"] == "bt-1"
+    assert replayed_order.remaining == 0
+    assert events[1][2].position == Decimal("0.01")
+
+    # Channels can be replayed selectively
+    reader = MarketDataReader(str(tmp_path))
+    assert [channel for _, channel, _ in reader.events([POSITIONS])] == [POSITIONS]
+
+
+def test_missing_recording_has_no_events(tmp_path) -> None:
+    reader = MarketDataReader(str(tmp_path))
+    assert reader.channels == []
+    assert list(reader.events()) == []
+
+
+def test_trade_round_trip(tmp_path) -> None:
+    recorder = MarketDataRecorder(str(tmp_path), SYMBOL)
+    trade = Trade(EXCHANGE, SYMBOL, SELL, Decimal("0.25"), Decimal("100.5"), 4.25)
+    asyncio.run(recorder.trades_handler(trade, 4.5))
+    recorder.close()
+
+    ((timestamp, channel, replayed),) = MarketDataReader(str(tmp_path)).events()
+    assert (timestamp, channel) == (4.5, TRADES)
+    assert replayed.side == SELL
+    assert (replayed.amount, replayed.price) == (Decimal("0.25"), Decimal("100.5"))
+    assert replayed.timestamp == 4.25
@@ -0,0 +1,58 @@
+import math
+
+import pytest
+
+from market_history import ORDER_EVENTS, MarketHistory
+
+
+def test_volatility_of_mid_changes_in_window() -> None:
+    history = MarketHistory()
+    history.top_changed(0.0, 100, 1, 102, 1)
+    history.top_changed(1.0, 102, 1, 104, 1)
+    history.top_changed(2.0, 101, 1, 103, 1)
+    history.top_changed(3.0, 101, 1, 105, 1)
+
+    # Mid changes of 2, -1 and 1 ticks within the last 3 seconds
+    assert history.volatility(3.0) == pytest.approx(math.sqrt(6 / 3))
+    # Only the change at 3.0 in the last second
+    assert history.volatility(1.0, now=3.5) == pytest.approx(1.0)
+    assert history.update_rate(2.0) == pytest.approx(1.0)
+
+
+def test_window_is_cut_to_what_buffers_hold() -> None:
+    history = MarketHistory(book_capacity=2)
+    for second in range(5):
+        history.top_changed(float(second), 100 + second, 1, 102 + second, 1)
+
+    # Rows from 3.0 on cover a second, not the ten asked for
+    assert history.update_rate(10.0) == pytest.approx(2.0)
+    assert history.volatility(10.0) == pytest.approx(math.sqrt(2.0))
+
+
+def test_trade_imbalance() -> None:
+    history = MarketHistory()
+    assert history.trade_imbalance(10.0) == 0.0
+
+    history.traded(1.0, 1, 100, 3)
+    history.traded(2.0, -1, 100, 1)
+    history.traded(5.0, 1, 100, 1)
+    assert history.trade_imbalance(10.0) == pytest.approx(3 / 5)
+    assert history.trade_imbalance(3.5) == pytest.approx(0.0)
+    assert history.now == 5.0
+
+
+def test_order_events_are_kept() -> None:
+    history = MarketHistory()
+    history.order_event(1.0, "NEW", 1, 100, 10)
+    history.order_event(2.0, "TRADE", 1, 100, 6, 4)
+
+    orders = history.orders
+    assert orders.column("status").tolist() == [
+        ORDER_EVENTS.index("NEW"),
+        ORDER_EVENTS.index("TRADE"),
+    ]
+    assert orders.column("filled").tolist() == [0, 4]
+
+    history.clear()
+    assert len(history.orders) == 0
+    assert history.volatility(1.0) == 0.0
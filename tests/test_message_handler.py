@@ -0,0 +1,125 @@
+import asyncio
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from book_scheduler import BookScheduler
+from message_handler import MessageHandler
+from strategy import Strategy
+
+
+@pytest.fixture
+def state():
+    return Mock()
+
+
+@pytest.fixture
+def strategy():
+    return Mock()
+
+
+@pytest.fixture
+def message_handler(state, strategy):
+    message_handler = MessageHandler(state)
+    message_handler.set_strategy(strategy)
+    return message_handler
+
+
+def test_book_update_runs_strategy(
+    message_handler: MessageHandler, state: Mock, strategy: Mock
+) -> None:
+    book = Mock()
+    asyncio.run(message_handler.order_book_handler(book, 0))
+    state.handle_book.assert_called_once_with(book)
+    strategy.process_strategy.assert_called_once()
+
+
+def test_order_info_updates_state_before_strategy(
+    message_handler: MessageHandler, state: Mock, strategy: Mock
+) -> None:
+    calls = []
+    state.handle_order_info.side_effect = lambda *args: calls.append("state")
+    strategy.handle_order_info.side_effect = lambda *args: calls.append("strategy")
+
+    asyncio.run(message_handler.order_info_handler(Mock(), 0))
+    assert calls == ["state", "strategy"]
+
+
+def test_order_info_parsed_once_for_state_and_strategy(
+    message_handler: MessageHandler, state: Mock, strategy: Mock
+) -> None:
+    order_info = Mock()
+    asyncio.run(message_handler.order_info_handler(order_info, 0))
+    strategy.handle_order_info.assert_called_once_with(
+        order_info, state.handle_order_info.return_value
+    )
+
+
+def test_any_strategy_subclass_can_be_set(state: Mock) -> None:
+    class CountingStrategy(Strategy):
+        def __init__(self):
+            self.decisions = 0
+
+        def process_strategy(self) -> None:
+            self.decisions += 1
+
+    strategy = CountingStrategy()
+    message_handler = MessageHandler(state)
+    message_handler.set_strategy(strategy)
+
+    asyncio.run(message_handler.order_book_handler(Mock(), 0))
+    # Order events are optional to handle
+    asyncio.run(message_handler.order_info_handler(Mock(), 0))
+    assert strategy.decisions == 1
+
+
+def test_call_threadsafe_runs_on_loop_thread(message_handler: MessageHandler) -> None:
+    threads = []
+
+    async def run():
+        message_handler.bind_loop(asyncio.get_running_loop())
+        caller = threading.Thread(
+            target=message_handler.call_threadsafe,
+            args=(lambda: threads.append(threading.get_ident()),),
+        )
+        caller.start()
+        caller.join()
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert threads == [threading.get_ident()]
+
+
+def test_call_threadsafe_on_loop_runs_immediately(
+    message_handler: MessageHandler,
+) -> None:
+    calls = []
+
+    async def run():
+        message_handler.bind_loop(asyncio.get_running_loop())
+        message_handler.call_threadsafe(calls.append, 1)
+        assert calls == [1]
+
+    asyncio.run(run())
+
+
+def test_call_threadsafe_requires_bound_loop(message_handler: MessageHandler) -> None:
+    with pytest.raises(RuntimeError):
+        message_handler.call_threadsafe(Mock())
+
+
+def test_scheduler_defers_strategy_to_the_loop(state: Mock, strategy: Mock) -> None:
+    scheduler = BookScheduler(max_decision_rate=None, top_of_book_only=False)
+    message_handler = MessageHandler(state, scheduler=scheduler)
+    message_handler.set_strategy(strategy)
+
+    async def run():
+        await message_handler.order_book_handler(Mock(), 0)
+        await message_handler.order_book_handler(Mock(), 0)
+        strategy.process_strategy.assert_not_called()
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert state.handle_book.call_count == 2
+    strategy.process_strategy.assert_called_once()
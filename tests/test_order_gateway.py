@@ -0,0 +1,240 @@
+import asyncio
+from decimal import Decimal
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from cryptofeed.defines import BUY, SELL
+
+from instrument import Instrument
+from latency import LatencyMetrics, LatencyStage, RequestKind, request_stage
+from order import (
+    Order,
+    OrderRejectedError,
+    new_client_order_id,
+    order_from_order_info,
+    send_order,
+    send_orders,
+)
+from order_gateway import OrderGateway
+from rate_limits import RateLimitTracker
+
+
+@pytest.fixture
+def transport():
+    transport = Mock()
+    transport.exchange_symbol.return_value = "BTCUSDT"
+    transport.instrument.return_value = Instrument("BTC-USDT-PERP")
+    transport.rate_limits = RateLimitTracker()
+    return transport
+
+
+@pytest.fixture
+def gateway(transport):
+    return OrderGateway(transport)
+
+
+def make_order(side: str, price: int, order_id: str = None) -> Order:
+    return Order(
+        symbol="BTC-USDT-PERP",
+        side=side,
+        size=10,
+        price=price,
+        order_id=order_id,
+    )
+
+
+@patch("order_gateway.send_orders")
+@patch("order_gateway.send_order")
+def test_flush_batches_inserts(
+    mock_send: Mock, mock_send_batch: Mock, gateway: OrderGateway
+) -> None:
+    orders = [make_order(BUY, 1), make_order(BUY, 2), make_order(SELL, 3)]
+    for order in orders:
+        gateway.send_order(order, Mock())
+    mock_send_batch.assert_not_called()
+
+    gateway.flush()
+    mock_send.assert_not_called()
+    mock_send_batch.assert_called_once()
+    assert mock_send_batch.call_args.kwargs["orders"] == orders
+    assert not gateway.has_queued_requests
+
+
+@patch("order_gateway.send_orders")
+@patch("order_gateway.send_order")
+def test_flush_splits_inserts_above_batch_limit(
+    mock_send: Mock, mock_send_batch: Mock, gateway: OrderGateway
+) -> None:
+    for price in range(6):
+        gateway.send_order(make_order(BUY, price), Mock())
+
+    gateway.flush()
+    assert mock_send_batch.call_count == 1
+    assert len(mock_send_batch.call_args.kwargs["orders"]) == 5
+    mock_send.assert_called_once()
+
+
+@patch("order_gateway.cancel_orders")
+@patch("order_gateway.cancel_order")
+def test_flush_single_cancel_uses_single_endpoint(
+    mock_cancel: Mock, mock_cancel_batch: Mock, gateway: OrderGateway
+) -> None:
+    order = make_order(BUY, 1, "1")
+    callback = Mock()
+    gateway.cancel_order(order, callback)
+
+    gateway.flush()
+    mock_cancel.assert_called_once_with(
+        transport=gateway._transport, order=order, callback=callback
+    )
+    mock_cancel_batch.assert_not_called()
+
+
+@patch("order_gateway.cancel_all_orders")
+def test_cancel_all_drops_queued_requests(
+    mock_cancel_all: Mock, gateway: OrderGateway
+) -> None:
+    gateway.send_order(make_order(BUY, 1), Mock())
+    gateway.cancel_all_orders("BTCUSDT")
+    mock_cancel_all.assert_called_once()
+    assert not gateway.has_queued_requests
+
+
+def test_batch_results_mapped_to_order_callbacks(transport: Mock) -> None:
+    transport.request = AsyncMock(
+        return_value=[{"orderId": 1}, {"code": -2010, "msg": "rejected"}]
+    )
+    results = []
+
+    async def run():
+        send_orders(
+            transport,
+            [make_order(BUY, 1), make_order(BUY, 2)],
+            [results.append, results.append],
+        )
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert transport.request.call_args.args[:2] == ("POST", "batchOrders")
+    assert results[0].result() == {"orderId": 1}
+    with pytest.raises(OrderRejectedError):
+        results[1].result()
+
+
+@patch("order_gateway.modify_order")
+@patch("order_gateway.send_order")
+@patch("order_gateway.cancel_order")
+def test_flush_sends_cancels_and_modifies_before_inserts(
+    mock_cancel: Mock, mock_send: Mock, mock_modify: Mock, gateway: OrderGateway
+) -> None:
+    calls = []
+    mock_cancel.side_effect = lambda **kwargs: calls.append("cancel")
+    mock_send.side_effect = lambda **kwargs: calls.append("send")
+    mock_modify.side_effect = lambda **kwargs: calls.append("modify")
+
+    gateway.send_order(make_order(BUY, 1), Mock())
+    gateway.modify_order(make_order(BUY, 2, "2").replace(3), Mock())
+    gateway.cancel_order(make_order(SELL, 4, "4"), Mock())
+    gateway.flush()
+    assert calls == ["cancel", "modify", "send"]
+
+
+@patch("order_gateway.send_orders")
+@patch("order_gateway.cancel_order")
+def test_cancels_sent_when_inserts_are_rate_limited(
+    mock_cancel: Mock, mock_send_batch: Mock, transport: Mock, gateway: OrderGateway
+) -> None:
+    # Only the budget held back for cancels is left
+    transport.rate_limits.update({"X-MBX-ORDER-COUNT-10S": "290"})
+    results = []
+
+    async def run():
+        gateway.send_order(make_order(BUY, 1), results.append)
+        gateway.send_order(make_order(BUY, 2), results.append)
+        gateway.cancel_order(make_order(SELL, 3, "3"), Mock())
+        gateway.flush()
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    mock_cancel.assert_called_once()
+    mock_send_batch.assert_not_called()
+    assert len(results) == 2
+    with pytest.raises(OrderRejectedError):
+        results[0].result()
+    assert transport.rate_limits.throttled == 2
+
+
+@patch("order_gateway.cancel_order")
+def test_nothing_sent_while_backing_off(
+    mock_cancel: Mock, transport: Mock, gateway: OrderGateway
+) -> None:
+    transport.rate_limits.back_off(418, "60")
+
+    async def run():
+        gateway.cancel_order(make_order(SELL, 3, "3"), Mock())
+        gateway.flush()
+
+    asyncio.run(run())
+    mock_cancel.assert_not_called()
+
+
+def test_replace_chain_tracks_previous_versions() -> None:
+    original = make_order(BUY, 1, "1")
+    replaced = original.replace(2).replace(3)
+    assert replaced.order_id == "1"
+    assert replaced.price == 3
+    assert [order.price for order in replaced.replace_chain] == [2, 1]
+
+
+def test_order_is_immutable() -> None:
+    order = make_order(BUY, 1, "1")
+    with pytest.raises(AttributeError):
+        order.price = 2
+    assert not hasattr(order, "__dict__")
+
+
+@patch("order.asyncio.ensure_future")
+def test_order_parameters_carry_client_order_id(
+    mock_ensure_future: Mock, transport: Mock
+) -> None:
+    client_order_id = new_client_order_id()
+    order = Order("BTC-USDT-PERP", BUY, 10, 10, client_order_id=client_order_id)
+    send_order(transport, order, Mock())
+    assert transport.request.call_args.kwargs["payload"]["newClientOrderId"] == (
+        client_order_id
+    )
+    assert new_client_order_id() != client_order_id
+    assert len(client_order_id) <= 36
+
+
+def test_order_from_order_info_reads_client_order_id() -> None:
+    order_info = Mock()
+    order_info.amount = Decimal("0.01")
+    order_info.remaining = Decimal("0.004")
+    order_info.id = "1"
+    order_info.raw = {"o": {"p": "100.5", "c": "a"}}
+    order = order_from_order_info(order_info, Instrument("BTC-USDT-PERP"))
+    assert order.client_order_id == "a"
+    assert order.price == 1005
+    assert order.size == 10
+    assert order.filled == 6
+    assert order.remaining == 4
+
+
+@patch("order_gateway.send_order")
+def test_flush_records_send_latency(mock_send: Mock, transport: Mock) -> None:
+    latency = LatencyMetrics()
+    gateway = OrderGateway(transport, latency)
+    order = Order("BTC-USDT-PERP", BUY, 10, 10, client_order_id="bt-1")
+
+    latency.book_received(None, 0)
+    gateway.send_order(order, Mock())
+    histograms = latency.histograms
+    insert = RequestKind.INSERT
+    assert len(histograms[request_stage(insert, LatencyStage.HANDLER_TO_DECISION)]) == 1
+    assert len(histograms[request_stage(insert, LatencyStage.TICK_TO_TRADE)]) == 0
+
+    gateway.flush()
+    assert len(histograms[request_stage(insert, LatencyStage.DECISION_TO_SEND)]) == 1
+    assert len(histograms[request_stage(insert, LatencyStage.TICK_TO_TRADE)]) == 1
@@ -0,0 +1,208 @@
+import pytest
+from cryptofeed.defines import BUY, SELL
+
+from order import Order
+from order_registry import OrderRegistry, OrderStatus
+
+SYMBOL = "BTC-USDT-PERP"
+
+
+@pytest.fixture
+def registry():
+    return OrderRegistry()
+
+
+def make_order(side: str, price: int, order_id: str = None, size: int = 10):
+    return Order(SYMBOL, side, size, price, order_id)
+
+
+def test_confirm_matches_pending_order(registry: OrderRegistry) -> None:
+    registry.add_pending(make_order(BUY, 100))
+    assert registry.count(OrderStatus.PENDING_NEW) == 1
+
+    registry.confirm(make_order(BUY, 100, "1"))
+    assert registry.count(OrderStatus.PENDING_NEW) == 0
+    assert registry.status("1") == OrderStatus.LIVE
+    assert registry.open_count(BUY) == 1
+    assert registry.open_count(SELL) == 0
+
+
+def test_duplicate_price_orders_tracked_separately(registry: OrderRegistry) -> None:
+    first = make_order(BUY, 100)
+    second = make_order(BUY, 100)
+    registry.add_pending(first)
+    registry.add_pending(second)
+
+    registry.confirm(make_order(BUY, 100, "1"))
+    assert registry.count(OrderStatus.PENDING_NEW, BUY) == 1
+    registry.confirm(make_order(BUY, 100, "2"))
+    assert registry.count(OrderStatus.PENDING_NEW, BUY) == 0
+
+    assert {order.order_id for order in registry.at_price(BUY, 100)} == {
+        "1",
+        "2",
+    }
+
+    registry.remove("1")
+    assert [order.order_id for order in registry.at_price(BUY, 100)] == ["2"]
+    assert registry.open_count(BUY) == 1
+
+
+def test_reject_pending_keeps_other_orders_at_price(registry: OrderRegistry) -> None:
+    first = make_order(BUY, 100)
+    second = make_order(BUY, 100)
+    registry.add_pending(first)
+    registry.add_pending(second)
+
+    assert registry.reject_pending(second)
+    assert not registry.reject_pending(second)
+    assert registry.count(OrderStatus.PENDING_NEW) == 1
+
+
+def test_duplicate_confirmation_is_ignored(registry: OrderRegistry) -> None:
+    registry.confirm(make_order(SELL, 100, "1"))
+    registry.confirm(make_order(SELL, 100, "1"))
+    assert len(registry) == 1
+    assert registry.count(OrderStatus.LIVE, SELL) == 1
+
+
+def test_cancel_lifecycle(registry: OrderRegistry) -> None:
+    registry.confirm(make_order(SELL, 100, "1"))
+
+    assert registry.request_cancel("1")
+    assert not registry.request_cancel("1")
+    assert registry.status("1") == OrderStatus.PENDING_CANCEL
+    assert registry.open_count() == 1
+
+    registry.cancel_failed("1")
+    assert registry.status("1") == OrderStatus.LIVE
+
+    registry.request_cancel("1")
+    registry.remove("1")
+    assert registry.status("1") == OrderStatus.DONE
+    assert registry.open_count() == 0
+    assert registry.count(OrderStatus.PENDING_CANCEL) == 0
+    assert not registry.request_cancel("1")
+
+
+def test_replace_lifecycle(registry: OrderRegistry) -> None:
+    original = registry.confirm(make_order(BUY, 100, "1"))
+
+    assert registry.request_replace(original.replace(101))
+    assert registry.status("1") == OrderStatus.PENDING_REPLACE
+    assert registry.count(OrderStatus.PENDING_REPLACE, BUY) == 1
+
+    replaced = registry.replace(make_order(BUY, 101, "1"))
+    assert registry.status("1") == OrderStatus.LIVE
+    assert replaced.replace_chain == [original]
+    assert registry.at_price(BUY, 100) == []
+    assert registry.at_price(BUY, 101) == [replaced]
+    assert registry.count(OrderStatus.PENDING_REPLACE) == 0
+
+
+def test_replace_failed_restores_live(registry: OrderRegistry) -> None:
+    original = registry.confirm(make_order(BUY, 100, "1"))
+    registry.request_replace(original.replace(101))
+
+    registry.replace_failed("1")
+    assert registry.status("1") == OrderStatus.LIVE
+    assert registry.replacement("1") is None
+
+
+def test_confirm_resolves_pending_by_client_order_id(registry: OrderRegistry) -> None:
+    first = Order(SYMBOL, BUY, 10, 100, client_order_id="a")
+    second = Order(SYMBOL, BUY, 10, 100, client_order_id="b")
+    registry.add_pending(first)
+    registry.add_pending(second)
+
+    registry.confirm(Order(SYMBOL, BUY, 10, 100, "2", "b"))
+    assert registry.get_by_client_id("a") is first
+    assert registry.get_by_client_id("b").order_id == "2"
+    assert not registry.reject_pending(second)
+    assert registry.reject_pending(first)
+    assert registry.count(OrderStatus.PENDING_NEW) == 0
+
+
+def test_ack_then_feed_records_latency(registry: OrderRegistry) -> None:
+    registry.add_pending(Order(SYMBOL, SELL, 10, 100, client_order_id="a"))
+    registry.acknowledge("a", "1")
+    assert registry.get_by_client_id("a").order_id is None
+
+    registry.confirm(Order(SYMBOL, SELL, 10, 100, "1", "a"))
+    assert registry.get_by_client_id("a").order_id == "1"
+    assert len(registry.ack_to_feed_latencies) == 1
+    assert registry.ack_to_feed_latencies[0] >= 0
+
+
+def test_feed_then_ack_records_latency(registry: OrderRegistry) -> None:
+    registry.add_pending(Order(SYMBOL, SELL, 10, 100, client_order_id="a"))
+    registry.confirm(Order(SYMBOL, SELL, 10, 100, "1", "a"))
+    registry.acknowledge("a", "1")
+    assert len(registry.ack_to_feed_latencies) == 1
+    assert registry.ack_to_feed_latencies[0] <= 0
+
+
+def test_ack_for_unknown_order_is_ignored(registry: OrderRegistry) -> None:
+    registry.acknowledge("a", "1")
+    assert registry.get_by_client_id("a") is None
+    assert len(registry.ack_to_feed_latencies) == 0
+
+
+def test_reconcile_applies_exchange_open_orders(registry: OrderRegistry) -> None:
+    registry.confirm(make_order(BUY, 100, "1"))
+    registry.confirm(make_order(BUY, 90, "2"))
+    registry.confirm(make_order(SELL, 110, "3"))
+    pending = make_order(SELL, 120)
+    registry.add_pending(pending)
+
+    counts = registry.reconcile(
+        [
+            make_order(BUY, 100, "1"),
+            make_order(SELL, 111, "3"),
+            make_order(BUY, 80, "4"),
+        ]
+    )
+    assert counts == (1, 1, 1)
+    assert {order.order_id for order in registry.open_orders()} == {"1", "3", "4"}
+    assert registry.get("3").price == 111
+    assert registry.count(OrderStatus.PENDING_NEW) == 1
+
+
+def test_reconcile_resolves_acknowledged_pending_orders(
+    registry: OrderRegistry,
+) -> None:
+    # Acked over REST, with the feed events lost in the gap
+    done = make_order(BUY, 100)._replace(client_order_id="bt-1")
+    live = make_order(SELL, 110)._replace(client_order_id="bt-2")
+    unacked = make_order(SELL, 120)._replace(client_order_id="bt-3")
+    for order in (done, live, unacked):
+        registry.add_pending(order)
+    registry.acknowledge("bt-1", "555")
+    registry.acknowledge("bt-2", "556")
+
+    counts = registry.reconcile([live._replace(order_id="556")])
+    assert counts == (1, 0, 1)
+    assert registry.count(OrderStatus.PENDING_NEW, BUY) == 0
+    assert registry.status("556") == OrderStatus.LIVE
+    assert registry.get_by_client_id("bt-1") is None
+    # Inserts not acked yet are still waiting on their responses
+    assert registry.count(OrderStatus.PENDING_NEW, SELL) == 1
+
+
+def test_fill_keeps_status_and_indexes(registry: OrderRegistry) -> None:
+    registry.confirm(make_order(BUY, 100, "1"))
+    assert registry.request_cancel("1")
+
+    filled = registry.fill("1", 4)
+    assert filled.remaining == 6
+    assert registry.get("1") is filled
+    assert registry.at_price(BUY, 100) == [filled]
+    assert registry.status("1") == OrderStatus.PENDING_CANCEL
+
+    # Cumulative fills arriving out of order do not go back
+    assert registry.fill("1", 2).filled == 4
+    assert registry.fill("2", 4) is None
+
+    counts = registry.reconcile([make_order(BUY, 100, "1")._replace(filled=7)])
+    assert counts == (0, 1, 0)
+    assert registry.get("1").remaining == 3
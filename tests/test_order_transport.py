@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import hmac
+from decimal import Decimal
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
+
+from order_transport import OrderTransport
+
+
+@pytest.fixture
+def exchange():
+    exchange = Mock()
+    exchange.key_id = "key"
+    exchange.key_secret = "secret"
+    return exchange
+
+
+@pytest.fixture
+def transport(exchange):
+    return OrderTransport(exchange, api="https://localhost")
+
+
+class FakeResponse:
+    def __init__(self, body: bytes, status: int = 200, headers: dict = None):
+        self._body = body
+        self.status = status
+        self.headers = headers or {}
+        self.raise_for_status = Mock()
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+
+def fake_session(body: bytes, status: int = 200, headers: dict = None) -> MagicMock:
+    session = MagicMock()
+    session.closed = False
+    session.request.return_value = FakeResponse(body, status, headers)
+    return session
+
+
+def test_signature_matches_fresh_hmac(transport: OrderTransport) -> None:
+    query_string = "symbol=BTCUSDT&timestamp=1"
+    expected = hmac.new(b"secret", query_string.encode(), hashlib.sha256).hexdigest()
+    assert transport._sign(query_string) == expected
+    # The cached key schedule is not consumed by signing
+    assert transport._sign(query_string) == expected
+
+
+def test_signed_request_url(transport: OrderTransport) -> None:
+    transport._session = fake_session(b'{"orderId": 1, "price": 1.5}')
+
+    result = asyncio.run(
+        transport.request("POST", "order", payload={"symbol": "BTCUSDT"})
+    )
+    assert result == {"orderId": 1, "price": Decimal("1.5")}
+
+    method, url = transport._session.request.call_args.args
+    assert method == "POST"
+    assert url.startswith("https://localhost/fapi/v1/order?symbol=BTCUSDT&timestamp=")
+    query_string, signature = url.split("?")[1].split("&signature=")
+    assert signature == transport._sign(query_string)
+
+
+def test_unsigned_request_url(transport: OrderTransport) -> None:
+    transport._session = fake_session(b"{}")
+
+    asyncio.run(transport.request("GET", "ping", auth=False))
+    assert transport._session.request.call_args.args == (
+        "GET",
+        "https://localhost/fapi/v1/ping",
+    )
+
+
+def test_response_headers_update_rate_limits(transport: OrderTransport) -> None:
+    transport._session = fake_session(
+        b"{}", headers={"X-MBX-USED-WEIGHT-1M": "2000", "X-MBX-ORDER-COUNT-10S": "10"}
+    )
+
+    asyncio.run(transport.request("GET", "ping", auth=False))
+    remaining = transport.rate_limits.remaining()
+    assert remaining["weight_1m"] == 400
+    assert remaining["orders_10s"] == 290
+
+
+def test_too_many_requests_blocks_order_requests(transport: OrderTransport) -> None:
+    transport._session = fake_session(b"{}", 429, {"Retry-After": "30"})
+
+    asyncio.run(transport.request("POST", "order"))
+    assert transport.rate_limits.is_blocked
+    assert not transport.rate_limits.allows(1, cancel=True)
+
+
+def test_warm_up_opens_pooled_connections(transport: OrderTransport) -> None:
+    transport._session = fake_session(b"{}")
+
+    asyncio.run(transport.warm_up())
+    assert transport._session.request.call_count == transport._warm_connections
+
+
+def test_keepalive_survives_timeouts(transport: OrderTransport) -> None:
+    pings = []
+
+    async def warm_up():
+        # Only the first ping times out
+        pings.append(None)
+        if len(pings) == 1:
+            raise asyncio.TimeoutError()
+
+    transport.warm_up = warm_up
+
+    async def scenario():
+        transport.start_keepalive(interval=0)
+        for _ in range(100):
+            await asyncio.sleep(0)
+        await transport.close()
+
+    with patch("order_transport.LOG") as log:
+        asyncio.run(scenario())
+    assert len(pings) > 1
+    log.warning.assert_called_once()
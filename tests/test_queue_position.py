@@ -0,0 +1,111 @@
+import pytest
+from cryptofeed.defines import BUY, SELL
+
+from instrument import Instrument
+from local_book import BookSide, LocalBook
+from order import Order
+from queue_position import QueueEstimator, QueuePosition
+
+SYMBOL = "BTC-USDT-PERP"
+
+
+@pytest.fixture
+def book():
+    local_book = LocalBook(Instrument(SYMBOL, "1", "1"))
+    local_book.reset(bids={100: 10, 99: 5}, asks={101: 8})
+    return local_book
+
+
+def join(book: LocalBook, estimator: QueueEstimator, order: Order) -> None:
+    # Confirmed, then shown on the book
+    estimator.add(order, book)
+    side = BookSide.BID if order.side == BUY else BookSide.ASK
+    book.update(side, order.price, book.depth_at(side, order.price) + order.size)
+    estimator.book_updated(book)
+
+
+def test_order_joins_back_of_level(book: LocalBook) -> None:
+    estimator = QueueEstimator()
+    join(book, estimator, Order(SYMBOL, BUY, 2, 100, "1"))
+
+    assert "1" in estimator
+    assert estimator.position("1") == QueuePosition(10, 0)
+    assert estimator.position("2") is None
+
+
+def test_order_shown_on_book_before_confirmation(book: LocalBook) -> None:
+    estimator = QueueEstimator()
+    book.update(BookSide.BID, 100, 12)
+    estimator.add(Order(SYMBOL, BUY, 2, 100, "1"), book, in_book=True)
+
+    assert estimator.position("1") == QueuePosition(10, 0)
+
+
+def test_joins_after_order_queue_behind(book: LocalBook) -> None:
+    estimator = QueueEstimator()
+    join(book, estimator, Order(SYMBOL, BUY, 2, 100, "1"))
+    book.update(BookSide.BID, 100, 15)
+    estimator.book_updated(book)
+
+    assert estimator.position("1") == QueuePosition(10, 3)
+
+
+def test_trades_taken_from_front_and_not_counted_twice(book: LocalBook) -> None:
+    estimator = QueueEstimator()
+    join(book, estimator, Order(SYMBOL, BUY, 2, 100, "1"))
+    estimator.traded(SELL, 100, 4)
+    assert estimator.position("1").ahead == 6
+
+    # The book then shows the traded volume gone
+    book.update(BookSide.BID, 100, 8)
+    estimator.book_updated(book)
+    assert estimator.position("1") == QueuePosition(6, 0)
+
+    # Buys trade against asks, bids are not affected
+    estimator.traded(BUY, 100, 4)
+    assert estimator.position("1").ahead == 6
+
+
+def test_cancels_shared_between_ahead_and_behind(book: LocalBook) -> None:
+    estimator = QueueEstimator()
+    join(book, estimator, Order(SYMBOL, BUY, 2, 100, "1"))
+    book.update(BookSide.BID, 100, 22)
+    estimator.book_updated(book)
+    assert estimator.position("1") == QueuePosition(10, 10)
+
+    # Half of the others cancel, half of them from ahead of the order
+    book.update(BookSide.BID, 100, 12)
+    estimator.book_updated(book)
+    assert estimator.position("1") == QueuePosition(5, 5)
+
+
+def test_own_orders_at_level_not_counted_ahead(book: LocalBook) -> None:
+    estimator = QueueEstimator()
+    join(book, estimator, Order(SYMBOL, SELL, 1, 101, "1"))
+    join(book, estimator, Order(SYMBOL, SELL, 1, 101, "2"))
+    assert estimator.position("2") == QueuePosition(8, 0)
+
+    estimator.remove("1")
+    book.update(BookSide.ASK, 101, 9)
+    estimator.book_updated(book)
+    assert estimator.position("2") == QueuePosition(8, 0)
+
+    estimator.remove("2")
+    assert "2" not in estimator
+    estimator.clear()
+    assert estimator.position("2") is None
+
+
+def test_partially_filled_order_moves_to_front(book: LocalBook) -> None:
+    estimator = QueueEstimator()
+    order = Order(SYMBOL, BUY, 4, 100, "1")
+    join(book, estimator, order)
+    book.update(BookSide.BID, 100, 16)
+    estimator.book_updated(book)
+
+    # Everything ahead trades, then one lot of the order
+    estimator.traded(SELL, 100, 11)
+    estimator.filled(order._replace(filled=1))
+    book.update(BookSide.BID, 100, 5)
+    estimator.book_updated(book)
+    assert estimator.position("1") == QueuePosition(0, 2)
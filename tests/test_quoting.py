@@ -0,0 +1,43 @@
+from cryptofeed.defines import BUY, SELL
+
+from order import Order
+from quoting import Quote, QuoteLadder, diff_quotes
+
+SYMBOL = "BTC-USDT-PERP"
+
+
+def test_ladder_levels_move_away_from_the_top() -> None:
+    ladder = QuoteLadder(3, 5, 2)
+    assert ladder.levels == 3
+    assert ladder.quotes(BUY, 100) == [
+        Quote(BUY, 100, 2),
+        Quote(BUY, 95, 2),
+        Quote(BUY, 90, 2),
+    ]
+    assert [quote.price for quote in ladder.quotes(SELL, 101)] == [101, 106, 111]
+
+
+def test_orders_on_the_ladder_are_kept() -> None:
+    ladder = QuoteLadder(10, 1, 1)
+    live = [Order(SYMBOL, BUY, 1, 100 - level, str(level)) for level in range(10)]
+
+    assert diff_quotes(live, ladder.quotes(BUY, 100)) == ([], [])
+    # The market moving one level only replaces the far end of the ladder
+    inserts, cancels = diff_quotes(live, ladder.quotes(BUY, 101))
+    assert inserts == [Quote(BUY, 101, 1)]
+    assert cancels == [live[-1]]
+
+
+def test_partially_filled_orders_match_their_level() -> None:
+    live = [Order(SYMBOL, SELL, 2, 101, "1", filled=1)]
+    inserts, cancels = diff_quotes(live, QuoteLadder(2, 10, 2).quotes(SELL, 101))
+    assert inserts == [Quote(SELL, 111, 2)]
+    assert cancels == []
+
+
+def test_one_order_per_target() -> None:
+    live = [Order(SYMBOL, BUY, 1, 100, "1"), Order(SYMBOL, BUY, 1, 100, "2")]
+    inserts, cancels = diff_quotes(live, [Quote(BUY, 100, 1), Quote(BUY, 99, 1)])
+    assert inserts == [Quote(BUY, 99, 1)]
+    assert cancels == [live[1]]
+    assert diff_quotes(live, []) == ([], live)
@@ -0,0 +1,69 @@
+from rate_limits import RateLimitTracker, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_bucket_refills_at_limit_per_interval() -> None:
+    clock = FakeClock()
+    bucket = TokenBucket(10, 10, clock)
+    bucket.consume(10)
+    assert bucket.available == 0
+    clock.now = 5
+    assert bucket.available == 5
+    clock.now = 60
+    assert bucket.available == 10
+
+
+def test_headers_only_lower_the_estimate() -> None:
+    bucket = TokenBucket(100, 60, FakeClock())
+    bucket.consume(50)
+    bucket.sync(10)
+    assert bucket.available == 50
+    bucket.sync(80)
+    assert bucket.available == 20
+
+
+def test_headers_synced_by_limit_window() -> None:
+    tracker = RateLimitTracker(clock=FakeClock())
+    tracker.update(
+        {
+            "x-mbx-used-weight-1m": "100",
+            "X-MBX-ORDER-COUNT-1M": "200",
+            "X-MBX-ORDER-COUNT-10S": "30",
+            "X-MBX-ORDER-COUNT-1D": "5",
+            "Content-Type": "application/json",
+        }
+    )
+    assert tracker.remaining() == {
+        "weight_1m": 2300,
+        "orders_1m": 1000,
+        "orders_10s": 270,
+        "throttled": 0,
+    }
+
+
+def test_cancels_may_use_the_reserve() -> None:
+    tracker = RateLimitTracker(
+        orders_per_10_seconds=10, cancel_reserve=0.5, clock=FakeClock()
+    )
+    tracker.update({"X-MBX-USED-WEIGHT-1M": "2395"})
+    tracker.consume(0, 5)
+    assert not tracker.allows(1, 1)
+    assert tracker.allows(1, cancel=True)
+    assert not tracker.allows(10, cancel=True)
+
+
+def test_back_off_blocks_until_retry_after() -> None:
+    clock = FakeClock()
+    tracker = RateLimitTracker(clock=clock)
+    tracker.back_off(429, "5")
+    assert tracker.is_blocked
+    assert not tracker.allows(1, cancel=True)
+    clock.now = 5
+    assert tracker.allows(1, 1)
@@ -0,0 +1,55 @@
+import pytest
+
+from ring_buffer import RingBuffer
+
+
+def test_columns_are_read_oldest_first() -> None:
+    buffer = RingBuffer(3, ("timestamp", "value"))
+    assert len(buffer) == 0
+    assert buffer.last("value") is None
+
+    buffer.append(1.0, 10)
+    buffer.append(2.0, 20)
+    assert buffer.column("value").tolist() == [10, 20]
+    assert buffer.last("timestamp") == 2.0
+
+
+def test_oldest_rows_are_overwritten_once_full() -> None:
+    buffer = RingBuffer(3, ("timestamp", "value"))
+    for index in range(5):
+        buffer.append(float(index), index * 10)
+
+    assert len(buffer) == 3
+    assert buffer.column("timestamp").tolist() == [2, 3, 4]
+    assert buffer.column("value", 1).tolist() == [30, 40]
+    assert buffer.last("value") == 40
+
+
+def test_columns_are_views_of_the_storage() -> None:
+    buffer = RingBuffer(4, ("timestamp",))
+    for index in range(6):
+        buffer.append(float(index))
+    timestamps = buffer.column("timestamp")
+    assert not timestamps.flags.owndata
+    assert timestamps.tolist() == [2, 3, 4, 5]
+
+
+def test_since_finds_first_row_in_window() -> None:
+    buffer = RingBuffer(4, ("timestamp",))
+    for timestamp in (1.0, 2.0, 2.0, 3.0, 4.0):
+        buffer.append(timestamp)
+
+    assert buffer.since(1.0) == 0
+    assert buffer.since(2.0) == 2
+    assert buffer.since(5.0) == 4
+
+
+def test_clear_and_capacity() -> None:
+    buffer = RingBuffer(2, ("timestamp",))
+    buffer.append(1.0)
+    buffer.clear()
+    assert len(buffer) == 0
+    assert buffer.column("timestamp").tolist() == []
+
+    with pytest.raises(ValueError):
+        RingBuffer(0, ("timestamp",))
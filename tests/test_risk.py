@@ -0,0 +1,37 @@
+from cryptofeed.defines import BUY, SELL
+
+from risk import RiskAggregator
+
+
+def test_positions_are_tracked_per_symbol() -> None:
+    risk = RiskAggregator(["BTC-USDT-PERP", "ETH-USDT-PERP"])
+
+    risk.update("BTC-USDT-PERP", 0.5, 30000)
+    risk.update("ETH-USDT-PERP", -2, 2000)
+    risk.update("SOL-USDT-PERP", 1, 20)
+
+    assert risk.positions() == {"BTC-USDT-PERP": 0.5, "ETH-USDT-PERP": -2}
+    assert risk.gross_notional() == 19000
+    assert risk.position("SOL-USDT-PERP") == 0
+
+
+def test_no_limit_allows_both_sides() -> None:
+    risk = RiskAggregator(["BTC-USDT-PERP"])
+    risk.update("BTC-USDT-PERP", 100, 30000)
+
+    assert risk.allows("BTC-USDT-PERP", BUY)
+    assert risk.allows("BTC-USDT-PERP", SELL)
+
+
+def test_over_limit_only_allows_reducing_side() -> None:
+    risk = RiskAggregator(["BTC-USDT-PERP", "ETH-USDT-PERP"], max_gross_notional=10000)
+    risk.update("BTC-USDT-PERP", 0.5, 30000)
+
+    assert not risk.allows("BTC-USDT-PERP", BUY)
+    assert risk.allows("BTC-USDT-PERP", SELL)
+    assert not risk.allows("ETH-USDT-PERP", BUY)
+    assert not risk.allows("ETH-USDT-PERP", SELL)
+
+    risk.update("BTC-USDT-PERP", 0.1, 30000)
+
+    assert risk.allows("ETH-USDT-PERP", BUY)
@@ -0,0 +1,74 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+from runner import SymbolConfig, SymbolDispatcher, load_symbols, shard_symbols
+
+
+def test_load_symbols_defaults_to_btc() -> None:
+    symbols = load_symbols({})
+
+    assert [symbol.symbol for symbol in symbols] == ["BTC-USDT-PERP"]
+    assert symbols[0].asset == "BTCUSDT"
+
+
+def test_load_symbols_from_config() -> None:
+    symbols = load_symbols(
+        {
+            "symbols": [
+                {"symbol": "ETH-USDT-PERP", "asset": "ETHUSDT", "balance_limit": 5},
+            ]
+        }
+    )
+
+    assert symbols == [SymbolConfig("ETH-USDT-PERP", "ETHUSDT", balance_limit=5)]
+
+
+def test_shard_symbols_round_robin_and_pinned() -> None:
+    symbols = [
+        SymbolConfig("A", "A"),
+        SymbolConfig("B", "B"),
+        SymbolConfig("HOT", "HOT", shard=0),
+        SymbolConfig("C", "C"),
+    ]
+
+    groups = shard_symbols(symbols, 2)
+
+    assert [[symbol.symbol for symbol in group] for group in groups] == [
+        ["A", "HOT", "C"],
+        ["B"],
+    ]
+
+
+def test_shard_symbols_drops_empty_shards() -> None:
+    assert len(shard_symbols([SymbolConfig("A", "A")], 4)) == 1
+
+
+def test_dispatcher_routes_by_symbol() -> None:
+    btc_handler = Mock(order_book_handler=AsyncMock(), order_info_handler=AsyncMock())
+    eth_handler = Mock(order_book_handler=AsyncMock())
+    dispatcher = SymbolDispatcher()
+    dispatcher.add("BTC-USDT-PERP", btc_handler)
+    dispatcher.add("ETH-USDT-PERP", eth_handler)
+
+    book = Mock(symbol="ETH-USDT-PERP")
+    order_info = Mock(symbol="BTC-USDT-PERP")
+    asyncio.run(dispatcher.order_book_handler(book, 1.0))
+    asyncio.run(dispatcher.order_info_handler(order_info, 2.0))
+    asyncio.run(dispatcher.order_book_handler(Mock(symbol="SOL-USDT-PERP"), 3.0))
+
+    eth_handler.order_book_handler.assert_awaited_once_with(book, 1.0)
+    btc_handler.order_book_handler.assert_not_awaited()
+    btc_handler.order_info_handler.assert_awaited_once_with(order_info, 2.0)
+
+
+def test_dispatcher_publishes_positions_to_risk() -> None:
+    risk = Mock()
+    handler = Mock(positions_handler=AsyncMock())
+    dispatcher = SymbolDispatcher(risk)
+    dispatcher.add("BTC-USDT-PERP", handler)
+
+    positions = Mock(symbol="BTC-USDT-PERP", position=2, entry_price=100)
+    asyncio.run(dispatcher.positions_handler(positions, 1.0))
+
+    risk.update.assert_called_once_with("BTC-USDT-PERP", 2.0, 100.0)
+    handler.positions_handler.assert_awaited_once_with(positions, 1.0)
@@ -1,65 +1,92 @@
-from decimal import Decimal
-from unittest.mock import ANY, AsyncMock, Mock, patch
+import asyncio
+from typing import List
+from unittest.mock import ANY, Mock, patch
 
 import pytest
+from aiohttp import ClientConnectionError
 from cryptofeed.defines import BUY, SELL
 
-from simple_strategy import SimpleStrategy
+from instrument import Instrument
+from local_book import LocalBook
+from order import Order
+from order_registry import OrderRegistry, OrderStatus
+from queue_position import QueuePosition
+from simple_strategy import RequoteMode, SimpleStrategy
 from state import BookSide, State
 
+# Whole unit ticks and 0.01 lots, orders are one lot with levels 10 ticks apart
+INSTRUMENT = Instrument("BTC-USDT-PERP", "1", "0.01")
+# Request errors after which the exchange may or may not have the request
+UNKNOWN_OUTCOMES = [
+    asyncio.TimeoutError(),
+    asyncio.CancelledError(),
+    ClientConnectionError("Connection reset"),
+]
+
 
 @pytest.fixture
 def state():
-    return Mock()
+    state = Mock()
+    state.orders = OrderRegistry()
+    state.instrument = INSTRUMENT
+    state.queue_position.return_value = None
+    return state
+
+
+def set_open_orders(state: State, orders: List[Order]) -> None:
+    for order in orders:
+        state.orders.confirm(order)
+
+
+@pytest.fixture
+def gateway():
+    with patch("simple_strategy.OrderGateway") as mock_gateway_class:
+        yield mock_gateway_class.return_value
 
 
 @pytest.fixture
-def simple_strategy(state):
-    return SimpleStrategy(exchange=Mock(), state=state, balance_limit=1)
+def simple_strategy(state, gateway):
+    return SimpleStrategy(transport=Mock(), state=state, balance_limit=1)
 
 
-@patch("simple_strategy.cancel_all_orders")
 def test_no_top_market_cancels_all_orders(
-    mock_cancel_all: AsyncMock, simple_strategy: SimpleStrategy, state: State
+    gateway: Mock, simple_strategy: SimpleStrategy, state: State
 ) -> None:
     state.balance = 0
     state.top_market = {}
 
-    state.open_orders = []
+    set_open_orders(state, [])
     simple_strategy.process_strategy()
-    mock_cancel_all.assert_called()
+    gateway.cancel_all_orders.assert_called()
 
 
-@patch("simple_strategy.cancel_order")
-@patch("simple_strategy.send_order")
 def test_best_bid_only_has_our_open_order(
-    mock_insert: Mock, mock_cancel: Mock, simple_strategy: SimpleStrategy, state: State
+    gateway: Mock, simple_strategy: SimpleStrategy, state: State
 ) -> None:
     state.balance = 10
     state.top_market = {
-        BookSide.BID: (Decimal(1), Decimal(1)),
-        BookSide.ASK: (Decimal(2), Decimal(1)),
+        BookSide.BID: (1, 100),
+        BookSide.ASK: (2, 100),
     }
 
     order_1 = Mock()
     order_1.side = BUY
     order_1.price = 1
     order_1.size = 1
+    order_1.remaining = 1
 
-    state.open_orders = [order_1]
+    set_open_orders(state, [order_1])
     simple_strategy.process_strategy()
-    mock_cancel.assert_called_once_with(exchange=ANY, order=order_1, callback=ANY)
+    gateway.cancel_order.assert_called_once_with(order=order_1, callback=ANY)
 
 
-@patch("simple_strategy.cancel_order")
-@patch("simple_strategy.send_order")
 def test_best_ask_only_has_our_open_order(
-    mock_insert: Mock, mock_cancel: Mock, simple_strategy: SimpleStrategy, state: State
+    gateway: Mock, simple_strategy: SimpleStrategy, state: State
 ) -> None:
     state.balance = -10
     state.top_market = {
-        BookSide.BID: (Decimal(1), Decimal(1)),
-        BookSide.ASK: (Decimal(2), Decimal(1)),
+        BookSide.BID: (1, 100),
+        BookSide.ASK: (2, 100),
     }
 
     order_1 = Mock()
@@ -67,35 +94,33 @@ def test_best_ask_only_has_our_open_order(
     order_1.price = 2
     order_1.size = 2
 
-    state.open_orders = [order_1]
+    set_open_orders(state, [order_1])
     simple_strategy.process_strategy()
-    mock_cancel.assert_called_once_with(exchange=ANY, order=order_1, callback=ANY)
+    gateway.cancel_order.assert_called_once_with(order=order_1, callback=ANY)
 
 
-@patch("simple_strategy.send_order")
 def test_no_orders_inserts_orders(
-    mock_insert: Mock, simple_strategy: SimpleStrategy, state: State
+    gateway: Mock, simple_strategy: SimpleStrategy, state: State
 ) -> None:
     state.balance = 0
     state.top_market = {
-        BookSide.BID: (Decimal(1), Decimal(1)),
-        BookSide.ASK: (Decimal(2), Decimal(1)),
+        BookSide.BID: (1, 100),
+        BookSide.ASK: (2, 100),
     }
 
-    state.open_orders = []
+    set_open_orders(state, [])
     simple_strategy.process_strategy()
-    assert mock_insert.call_count == 4
+    assert gateway.send_order.call_count == 4
+    gateway.flush.assert_called_once()
 
 
-@patch("simple_strategy.cancel_order")
-@patch("simple_strategy.send_order")
 def test_position_exceeds_positive_limit_pull_all_bid_orders(
-    mock_insert: Mock, mock_cancel: Mock, simple_strategy: SimpleStrategy, state: State
+    gateway: Mock, simple_strategy: SimpleStrategy, state: State
 ) -> None:
     state.balance = 10
     state.top_market = {
-        BookSide.BID: (Decimal(1), Decimal(1)),
-        BookSide.ASK: (Decimal(2), Decimal(1)),
+        BookSide.BID: (1, 100),
+        BookSide.ASK: (2, 100),
     }
 
     order_1 = Mock()
@@ -103,21 +128,19 @@ def test_position_exceeds_positive_limit_pull_all_bid_orders(
     order_2 = Mock()
     order_2.side = BUY
 
-    state.open_orders = [order_1, order_2]
+    set_open_orders(state, [order_1, order_2])
     simple_strategy.process_strategy()
-    assert mock_cancel.call_count == 2
-    assert mock_insert.call_count == 2
+    assert gateway.cancel_order.call_count == 2
+    assert gateway.send_order.call_count == 2
 
 
-@patch("simple_strategy.cancel_order")
-@patch("simple_strategy.send_order")
 def test_position_exceeds_positive_limit_pull_all_ask_orders(
-    mock_insert: Mock, mock_cancel: Mock, simple_strategy: SimpleStrategy, state: State
+    gateway: Mock, simple_strategy: SimpleStrategy, state: State
 ) -> None:
     state.balance = -10
     state.top_market = {
-        BookSide.BID: (Decimal(1), Decimal(1)),
-        BookSide.ASK: (Decimal(2), Decimal(1)),
+        BookSide.BID: (1, 100),
+        BookSide.ASK: (2, 100),
     }
 
     order_1 = Mock()
@@ -125,61 +148,401 @@ def test_position_exceeds_positive_limit_pull_all_ask_orders(
     order_2 = Mock()
     order_2.side = SELL
 
-    state.open_orders = [order_1, order_2]
+    set_open_orders(state, [order_1, order_2])
     simple_strategy.process_strategy()
-    assert mock_cancel.call_count == 2
-    assert mock_insert.call_count == 2
+    assert gateway.cancel_order.call_count == 2
+    assert gateway.send_order.call_count == 2
 
 
-@patch("simple_strategy.send_order")
 def test_has_pending_orders_do_nothing(
-    mock_insert: Mock, simple_strategy: SimpleStrategy, state: State
+    gateway: Mock, simple_strategy: SimpleStrategy, state: State
 ) -> None:
     state.balance = 0
     state.top_market = {
-        BookSide.BID: (Decimal(1), Decimal(1)),
-        BookSide.ASK: (Decimal(2), Decimal(1)),
+        BookSide.BID: (1, 100),
+        BookSide.ASK: (2, 100),
     }
 
-    state.open_orders = []
+    set_open_orders(state, [])
+
+    simple_strategy.process_strategy()
+    simple_strategy.process_strategy()
+    assert gateway.send_order.call_count == 4
+
+
+@pytest.mark.parametrize("error", UNKNOWN_OUTCOMES)
+def test_inserts_of_unknown_outcome_are_rolled_back(
+    gateway: Mock, simple_strategy: SimpleStrategy, state: State, error: Exception
+) -> None:
+    state.balance = 0
+    state.top_market = {
+        BookSide.BID: (1, 100),
+        BookSide.ASK: (2, 100),
+    }
+    set_open_orders(state, [])
 
     simple_strategy.process_strategy()
+    future = Mock()
+    future.result.side_effect = error
+    for call in gateway.send_order.call_args_list:
+        call.kwargs["callback"](future)
+
+    # No side is left waiting on inserts that will never be answered
+    assert state.orders.count(OrderStatus.PENDING_NEW) == 0
     simple_strategy.process_strategy()
+    assert gateway.send_order.call_count == 8
 
 
-@patch("simple_strategy.cancel_order")
-@patch("simple_strategy.send_order")
-def test_pull_orders_if_count_is_inconsistent(
-    mock_insert: Mock, mock_cancel: Mock, simple_strategy: SimpleStrategy, state: State
+@pytest.mark.parametrize("error", UNKNOWN_OUTCOMES)
+def test_cancels_of_unknown_outcome_are_rolled_back(
+    gateway: Mock, simple_strategy: SimpleStrategy, state: State, error: Exception
 ) -> None:
     state.balance = 10
     state.top_market = {
-        BookSide.BID: (Decimal(1), Decimal(1)),
-        BookSide.ASK: (Decimal(2), Decimal(1)),
+        BookSide.BID: (1, 100),
+        BookSide.ASK: (101, 100),
     }
+    state.book = LocalBook(INSTRUMENT)
+    state.book.reset(bids={1: 100}, asks={101: 100, 111: 1, 115: 1})
+    ladder = [
+        Order("BTC-USDT-PERP", SELL, 1, 101, "1"),
+        Order("BTC-USDT-PERP", SELL, 1, 111, "2"),
+    ]
+    extra = Order("BTC-USDT-PERP", SELL, 1, 115, "3")
+    set_open_orders(state, ladder + [extra])
 
-    order_1 = Mock()
-    order_1.side = SELL
+    simple_strategy.process_strategy()
+    future = Mock()
+    future.result.side_effect = error
+    gateway.cancel_order.call_args.kwargs["callback"](future)
+
+    assert state.orders.status("3") == OrderStatus.LIVE
+    simple_strategy.process_strategy()
+    assert gateway.cancel_order.call_count == 2
+
+
+def test_orders_off_the_ladder_are_cancelled(
+    gateway: Mock, simple_strategy: SimpleStrategy, state: State
+) -> None:
+    state.balance = 10
+    state.top_market = {
+        BookSide.BID: (1, 100),
+        BookSide.ASK: (101, 100),
+    }
+    state.book = LocalBook(INSTRUMENT)
+    state.book.reset(bids={1: 100}, asks={101: 100, 111: 1, 115: 1})
 
-    state.open_orders = [order_1]
+    ladder = [
+        Order("BTC-USDT-PERP", SELL, 1, 101, "1"),
+        Order("BTC-USDT-PERP", SELL, 1, 111, "2"),
+    ]
+    extra = Order("BTC-USDT-PERP", SELL, 1, 115, "3")
+    set_open_orders(state, ladder + [extra])
 
     simple_strategy.process_strategy()
-    assert mock_cancel.call_count == 1
+    gateway.cancel_order.assert_called_once_with(order=extra, callback=ANY)
+    gateway.send_order.assert_not_called()
 
 
-@patch("simple_strategy.order_from_order_info")
-@patch("simple_strategy.cancel_order")
-def test_handle_trade_order_pull_all(
-    mock_cancel: Mock,
-    mock_converter: Mock,
-    simple_strategy: SimpleStrategy,
-    state: State,
+def test_filled_order_gap_is_filled_on_next_decision(
+    gateway: Mock, simple_strategy: SimpleStrategy, state: State
 ) -> None:
-    order_1 = Mock()
-    order_2 = Mock()
-    state.open_orders = [order_1, order_2]
+    state.balance = 0
+    state.top_market = {
+        BookSide.BID: (100, 500),
+        BookSide.ASK: (101, 100),
+    }
+    state.book = LocalBook(INSTRUMENT)
+    state.book.reset(bids={100: 500, 90: 1}, asks={101: 100, 111: 1})
+    filled = Order("BTC-USDT-PERP", BUY, 1, 100, "1", filled=1)
+    set_open_orders(
+        state,
+        [
+            Order("BTC-USDT-PERP", BUY, 1, 90, "2"),
+            Order("BTC-USDT-PERP", SELL, 1, 101, "3"),
+            Order("BTC-USDT-PERP", SELL, 1, 111, "4"),
+        ],
+    )
 
     order_info = Mock()
     order_info.status = "TRADE"
-    simple_strategy.handle_order_info(order_info)
-    assert mock_cancel.call_count == 2
+    simple_strategy.handle_order_info(order_info, filled)
+    gateway.send_order.assert_not_called()
+
+    # Only the missing level of the filled side is inserted
+    simple_strategy.process_strategy()
+    gateway.cancel_order.assert_not_called()
+    gateway.send_order.assert_called_once()
+    inserted = gateway.send_order.call_args.kwargs["order"]
+    assert (inserted.side, inserted.price) == (BUY, 100)
+
+
+def test_partially_filled_order_keeps_orders(
+    gateway: Mock, simple_strategy: SimpleStrategy, state: State
+) -> None:
+    bid = Order("BTC-USDT-PERP", BUY, 2, 100, "1")
+    set_open_orders(state, [bid])
+
+    order_info = Mock()
+    order_info.status = "TRADE"
+    simple_strategy.handle_order_info(order_info, bid._replace(filled=1))
+    gateway.cancel_order.assert_not_called()
+
+
+def test_order_events_are_logged_in_instrument_units(
+    simple_strategy: SimpleStrategy, state: State
+) -> None:
+    state.instrument = Instrument("BTC-USDT-PERP", "0.1", "0.001")
+    order = Order("BTC-USDT-PERP", BUY, 10, 299982, "1")
+    order_info = Mock()
+    order_info.status = "NEW"
+
+    with patch("simple_strategy.LOG") as log:
+        simple_strategy.handle_order_info(order_info, order)
+    assert log.info.call_args.args[-2:] == ("0.010", "29998.2")
+
+
+def test_order_alone_at_top_level_is_pulled(
+    gateway: Mock, simple_strategy: SimpleStrategy, state: State
+) -> None:
+    state.balance = 0
+    state.top_market = {
+        BookSide.BID: (1, 1),
+        BookSide.ASK: (2, 100),
+    }
+    state.book = LocalBook(INSTRUMENT)
+    state.book.reset(bids={1: 1}, asks={2: 100})
+
+    order_1 = Mock()
+    order_1.side = BUY
+    order_1.price = 1
+    order_1.size = 1
+    order_1.remaining = 1
+
+    set_open_orders(state, [order_1])
+    simple_strategy.process_strategy()
+    gateway.cancel_order.assert_any_call(order=order_1, callback=ANY)
+
+
+def test_order_sharing_top_level_is_kept(
+    gateway: Mock, simple_strategy: SimpleStrategy, state: State
+) -> None:
+    state.balance = 0
+    state.top_market = {
+        BookSide.BID: (1, 300),
+        BookSide.ASK: (2, 100),
+    }
+    state.book = LocalBook(INSTRUMENT)
+    state.book.reset(bids={1: 300}, asks={2: 100})
+
+    order_1 = Mock()
+    order_1.side = BUY
+    order_1.price = 1
+    order_1.size = 1
+    order_1.remaining = 1
+    order_2 = Mock()
+    order_2.side = BUY
+    order_2.price = -9
+    order_2.size = 1
+    order_2.remaining = 1
+
+    set_open_orders(state, [order_1, order_2])
+    simple_strategy.process_strategy()
+    for call in gateway.cancel_order.call_args_list:
+        assert call.kwargs["order"] not in (order_1, order_2)
+
+
+def test_amend_mode_moves_orders_to_new_top_level(gateway: Mock, state: State) -> None:
+    simple_strategy = SimpleStrategy(
+        transport=Mock(), state=state, balance_limit=1, requote_mode=RequoteMode.AMEND
+    )
+    state.balance = 0
+    state.top_market = {
+        BookSide.BID: (100, 1),
+        BookSide.ASK: (101, 100),
+    }
+    state.book = LocalBook(INSTRUMENT)
+    state.book.reset(
+        bids={100: 1, 99: 200},
+        asks={101: 100},
+    )
+
+    top_order = Order("BTC-USDT-PERP", BUY, 1, 100, "1")
+    next_order = Order("BTC-USDT-PERP", BUY, 1, 90, "2")
+    ask_orders = [
+        Order("BTC-USDT-PERP", SELL, 1, 101, "3"),
+        Order("BTC-USDT-PERP", SELL, 1, 111, "4"),
+    ]
+    set_open_orders(state, [next_order, top_order] + ask_orders)
+
+    simple_strategy.process_strategy()
+    gateway.cancel_order.assert_not_called()
+    amended = [call.kwargs["order"] for call in gateway.modify_order.call_args_list]
+    assert [order.price for order in amended] == [99, 89]
+    assert amended[0].replaces is top_order
+    assert amended[1].order_id == "2"
+
+    # Amends in flight are not sent again on the next book update
+    simple_strategy.process_strategy()
+    assert gateway.modify_order.call_count == 2
+
+
+def test_amends_cancelled_with_their_batch_are_rolled_back(
+    gateway: Mock, state: State
+) -> None:
+    simple_strategy = SimpleStrategy(
+        transport=Mock(), state=state, balance_limit=1, requote_mode=RequoteMode.AMEND
+    )
+    state.balance = 0
+    state.top_market = {
+        BookSide.BID: (100, 1),
+        BookSide.ASK: (101, 100),
+    }
+    state.book = LocalBook(INSTRUMENT)
+    state.book.reset(bids={100: 1, 99: 200}, asks={101: 100})
+    set_open_orders(
+        state,
+        [
+            Order("BTC-USDT-PERP", BUY, 1, 100, "1"),
+            Order("BTC-USDT-PERP", BUY, 1, 90, "2"),
+            Order("BTC-USDT-PERP", SELL, 1, 101, "3"),
+            Order("BTC-USDT-PERP", SELL, 1, 111, "4"),
+        ],
+    )
+
+    simple_strategy.process_strategy()
+    assert state.orders.count(OrderStatus.PENDING_REPLACE) == 2
+    # As the per order futures of a cancelled batch request
+    loop = asyncio.new_event_loop()
+    future = loop.create_future()
+    future.cancel()
+    for call in gateway.modify_order.call_args_list:
+        call.kwargs["callback"](future)
+    loop.close()
+
+    assert state.orders.count(OrderStatus.PENDING_REPLACE) == 0
+    simple_strategy.process_strategy()
+    assert gateway.modify_order.call_count == 4
+
+
+def test_shared_risk_limit_only_quotes_reducing_side(
+    gateway: Mock, state: State
+) -> None:
+    risk = Mock()
+    risk.allows.side_effect = lambda symbol, side: side == SELL
+    simple_strategy = SimpleStrategy(
+        transport=Mock(), state=state, balance_limit=1, risk=risk
+    )
+    state.balance = 0
+    state.top_market = {
+        BookSide.BID: (1, 100),
+        BookSide.ASK: (2, 100),
+    }
+
+    set_open_orders(state, [])
+    simple_strategy.process_strategy()
+    sides = [call.kwargs["order"].side for call in gateway.send_order.call_args_list]
+    assert sides == [SELL, SELL]
+
+
+def test_no_inserts_without_rate_limit_budget(gateway: Mock, state: State) -> None:
+    transport = Mock()
+    transport.rate_limits.allows.return_value = False
+    simple_strategy = SimpleStrategy(transport=transport, state=state, balance_limit=1)
+    state.balance = 0
+    state.top_market = {
+        BookSide.BID: (1, 100),
+        BookSide.ASK: (2, 100),
+    }
+
+    set_open_orders(state, [])
+    simple_strategy.process_strategy()
+    gateway.send_order.assert_not_called()
+
+
+def test_quote_parameters_set_levels_and_size(gateway: Mock, state: State) -> None:
+    simple_strategy = SimpleStrategy(
+        transport=Mock(),
+        state=state,
+        balance_limit=1,
+        order_size="0.05",
+        price_offset="2",
+        orders_per_side=3,
+    )
+    state.balance = 0
+    state.top_market = {
+        BookSide.BID: (100, 100),
+        BookSide.ASK: (101, 100),
+    }
+
+    set_open_orders(state, [])
+    simple_strategy.process_strategy()
+    orders = [call.kwargs["order"] for call in gateway.send_order.call_args_list]
+    assert [order.price for order in orders if order.side == BUY] == [100, 98, 96]
+    assert [order.price for order in orders if order.side == SELL] == [101, 103, 105]
+    assert {order.size for order in orders} == {5}
+
+
+def test_orders_near_front_of_queue_kept_when_market_moves_away(
+    gateway: Mock, simple_strategy: SimpleStrategy, state: State
+) -> None:
+    state.balance = 0
+    state.top_market = {
+        BookSide.BID: (101, 1),
+        BookSide.ASK: (102, 100),
+    }
+    state.book = LocalBook(INSTRUMENT)
+    state.book.reset(bids={101: 1, 100: 5}, asks={102: 100})
+    orders = [
+        Order("BTC-USDT-PERP", BUY, 1, 100, "1"),
+        Order("BTC-USDT-PERP", BUY, 1, 90, "2"),
+    ]
+    set_open_orders(state, orders)
+
+    state.queue_position.return_value = QueuePosition(1, 3)
+    simple_strategy.process_strategy()
+    state.queue_position.assert_called_with("1")
+    gateway.cancel_order.assert_not_called()
+
+    # Too far back in the queue to be worth keeping
+    state.queue_position.return_value = QueuePosition(3, 1)
+    simple_strategy.process_strategy()
+    cancelled = [call.kwargs["order"] for call in gateway.cancel_order.call_args_list]
+    assert cancelled == orders
+
+
+def test_ten_level_ladder_requotes_with_one_order(gateway: Mock, state: State) -> None:
+    simple_strategy = SimpleStrategy(
+        transport=Mock(),
+        state=state,
+        balance_limit=1,
+        price_offset="1",
+        orders_per_side=10,
+        requote_mode=RequoteMode.AMEND,
+    )
+    state.balance = 0
+    # Bids moved up a level, our best bid at 100 is now behind 101
+    state.top_market = {
+        BookSide.BID: (101, 100),
+        BookSide.ASK: (102, 100),
+    }
+    state.book = LocalBook(INSTRUMENT)
+    state.book.reset(
+        bids={101: 100, **{100 - level: 101 for level in range(10)}},
+        asks={102 + level: 101 for level in range(10)},
+    )
+    bids = [
+        Order("BTC-USDT-PERP", BUY, 1, 100 - level, str(level)) for level in range(10)
+    ]
+    asks = [
+        Order("BTC-USDT-PERP", SELL, 1, 102 + level, str(10 + level))
+        for level in range(10)
+    ]
+    set_open_orders(state, bids + asks)
+
+    simple_strategy.process_strategy()
+    gateway.send_order.assert_not_called()
+    gateway.cancel_order.assert_not_called()
+    gateway.modify_order.assert_called_once()
+    amended = gateway.modify_order.call_args.kwargs["order"]
+    assert (amended.order_id, amended.price) == ("9", 101)
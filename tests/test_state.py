@@ -2,8 +2,12 @@ from decimal import Decimal
 from unittest.mock import Mock, patch
 
 import pytest
+from cryptofeed.defines import BUY, SELL
+from cryptofeed.types import OrderBook, Trade
 
-from state import BookKeys, BookSide, State
+from order import Order
+from queue_position import QueuePosition
+from state import BookSide, State
 
 
 @pytest.fixture
@@ -17,20 +21,48 @@ def state(symbol):
 
 
 def test_book_update(symbol: str, state: State) -> None:
+    book = OrderBook(
+        "BINANCE_FUTURES",
+        symbol,
+        bids={Decimal(1): Decimal(1), Decimal("0.5"): Decimal(3)},
+        asks={Decimal(2): Decimal(1), Decimal(3): Decimal(2)},
+    )
+
+    state.handle_book(book)
+    # Default instrument has 0.1 ticks and 0.001 lots
+    assert state.top_market[BookSide.BID] == (10, 1000)
+    assert state.top_market[BookSide.ASK] == (20, 1000)
+
+
+def test_book_update_does_not_copy_book(symbol: str, state: State) -> None:
+    source = OrderBook(
+        "BINANCE_FUTURES",
+        symbol,
+        bids={Decimal(1): Decimal(1)},
+        asks={Decimal(2): Decimal(1)},
+    )
     book = Mock()
     book.symbol = symbol
-    book.to_dict = Mock()
-    book.to_dict.return_value = {
-        BookKeys.BOOK: {
-            BookSide.BID: {Decimal(1): Decimal(1)},
-            BookSide.ASK: {Decimal(2): Decimal(1)},
-        }
-    }
+    book.book = source.book
+    book.delta = None
+    book.timestamp = None
 
     state.handle_book(book)
-    print(state.top_market)
-    assert state.top_market[BookSide.BID] == (Decimal(1), Decimal(1))
-    assert state.top_market[BookSide.ASK] == (Decimal(2), Decimal(1))
+    book.to_dict.assert_not_called()
+    assert state.top_market[BookSide.BID] == (10, 1000)
+
+
+def test_empty_book_clears_top_market(symbol: str, state: State) -> None:
+    state.handle_book(
+        OrderBook(
+            "BINANCE_FUTURES",
+            symbol,
+            bids={Decimal(1): Decimal(1)},
+            asks={Decimal(2): Decimal(1)},
+        )
+    )
+    state.handle_book(OrderBook("BINANCE_FUTURES", symbol))
+    assert state.top_market == {}
 
 
 def test_balance_initialization(symbol: str, state: State) -> None:
@@ -55,12 +87,12 @@ def test_handle_positions(symbol: str, state: State) -> None:
 
 @patch("state.order_from_order_info")
 def test_handle_new_order_info(mock_converter: Mock, symbol: str, state: State) -> None:
-    order = Mock()
-    order_info = Mock()
+    order = Order(symbol, BUY, 10, 10, "1")
+    order_info = Mock(timestamp=None)
     order_info.status = "NEW"
     mock_converter.return_value = order
 
-    state.handle_order_info(order_info)
+    assert state.handle_order_info(order_info) is order
     assert order in state.open_orders
 
 
@@ -68,33 +100,163 @@ def test_handle_new_order_info(mock_converter: Mock, symbol: str, state: State)
 def test_handle_trade_order_info(
     mock_converter: Mock, symbol: str, state: State
 ) -> None:
-    order = Mock()
-    order_info_1 = Mock()
-    order_info_1.status = "NEW"
-    mock_converter.return_value = order
+    mock_converter.return_value = Order(symbol, BUY, 10, 10, "1")
+    state.handle_order_info(Mock(status="NEW", timestamp=None))
 
-    state.handle_order_info(order_info_1)
-    assert order in state.open_orders
+    # Partial fills reduce the remaining size and move the position at once
+    mock_converter.return_value = Order(symbol, BUY, 10, 10, "1", filled=4)
+    state.handle_order_info(Mock(status="TRADE", timestamp=1.0))
+    assert state.open_orders[0].remaining == 6
+    assert state.balance == pytest.approx(0.004)
+
+    mock_converter.return_value = Order(symbol, BUY, 10, 10, "1", filled=10)
+    state.handle_order_info(Mock(status="TRADE", timestamp=2.0))
+    assert state.open_orders == []
+    assert state.balance == pytest.approx(0.01)
 
-    order_info_2 = Mock()
-    order_info_2.status = "TRADE"
-    state.handle_order_info(order_info_2)
-    assert order not in state.open_orders
+
+@patch("state.order_from_order_info")
+def test_fill_already_in_position_update_not_counted(
+    mock_converter: Mock, symbol: str, state: State
+) -> None:
+    mock_converter.return_value = Order(symbol, SELL, 10, 10, "1")
+    state.handle_order_info(Mock(status="NEW", timestamp=None))
+    state.handle_positions(Mock(position=Decimal("-0.01"), timestamp=2.0))
+
+    mock_converter.return_value = Order(symbol, SELL, 10, 10, "1", filled=10)
+    state.handle_order_info(Mock(status="TRADE", timestamp=2.0))
+    assert state.balance == pytest.approx(-0.01)
+
+
+@patch("state.order_from_order_info")
+def test_fill_in_earlier_position_event_not_counted(
+    mock_converter: Mock, symbol: str, state: State
+) -> None:
+    # Binance sends the position update first, the trade's event time can be
+    # a millisecond later, both carry the same transaction time
+    mock_converter.return_value = Order(symbol, SELL, 10, 10, "1")
+    state.handle_order_info(Mock(status="NEW", timestamp=None))
+    state.handle_positions(
+        Mock(position=Decimal("-0.01"), timestamp=2.0, raw={"E": 2000, "T": 2000})
+    )
+
+    mock_converter.return_value = Order(symbol, SELL, 10, 10, "1", filled=10)
+    raw = {"E": 2001, "T": 2000, "o": {"T": 2000}}
+    state.handle_order_info(Mock(status="TRADE", timestamp=2.001, raw=raw))
+    assert state.balance == pytest.approx(-0.01)
 
 
 @patch("state.order_from_order_info")
 def test_handle_cancel_order_info(
     mock_converter: Mock, symbol: str, state: State
 ) -> None:
-    order = Mock()
-    order_info_1 = Mock()
+    order = Order(symbol, BUY, 10, 10, "1")
+    order_info_1 = Mock(timestamp=None)
     order_info_1.status = "NEW"
     mock_converter.return_value = order
 
     state.handle_order_info(order_info_1)
     assert order in state.open_orders
 
-    order_info_2 = Mock()
+    order_info_2 = Mock(timestamp=None)
     order_info_2.status = "CANCELED"
     state.handle_order_info(order_info_2)
     assert order not in state.open_orders
+
+
+@patch("state.order_from_order_info")
+def test_handle_amended_order_info(
+    mock_converter: Mock, symbol: str, state: State
+) -> None:
+    order = Order(symbol, "buy", 10, 10, "1")
+    mock_converter.return_value = order
+    order_info_1 = Mock(timestamp=None)
+    order_info_1.status = "NEW"
+    state.handle_order_info(order_info_1)
+
+    mock_converter.return_value = Order(symbol, "buy", 10, 20, "1")
+    order_info_2 = Mock(timestamp=None)
+    order_info_2.status = "AMENDMENT"
+    state.handle_order_info(order_info_2)
+
+    assert len(state.open_orders) == 1
+    assert state.open_orders[0].price == 20
+    assert state.open_orders[0].replace_chain == [order]
+
+
+def test_queue_position_follows_book_and_trades(symbol: str, state: State) -> None:
+    state.handle_book(
+        OrderBook(
+            "BINANCE_FUTURES",
+            symbol,
+            bids={Decimal(1): Decimal(3)},
+            asks={Decimal(2): Decimal(1)},
+        )
+    )
+    order_info = Mock(status="NEW", timestamp=None)
+    with patch("state.order_from_order_info") as mock_converter:
+        mock_converter.return_value = Order(symbol, BUY, 1000, 10, "1")
+        state.handle_order_info(order_info)
+    assert state.queue_position("1").ahead == 3000
+
+    state.handle_trade(
+        Trade("BINANCE_FUTURES", symbol, SELL, Decimal(1), Decimal(1), 0)
+    )
+    assert state.queue_position("1").ahead == 2000
+
+    with patch("state.order_from_order_info") as mock_converter:
+        mock_converter.return_value = Order(symbol, BUY, 1000, 10, "1")
+        state.handle_order_info(Mock(status="CANCELED", timestamp=None))
+    assert state.queue_position("1") is None
+
+
+def test_queue_position_when_book_shows_order_before_new(
+    symbol: str, state: State
+) -> None:
+    # The depth update including our 1.0 at 1.0 arrives before the NEW event
+    book = OrderBook(
+        "BINANCE_FUTURES",
+        symbol,
+        bids={Decimal(1): Decimal(4)},
+        asks={Decimal(2): Decimal(1)},
+    )
+    book.timestamp = 2.002
+    book.raw = {"E": 2002, "T": 2001}
+    state.handle_book(book)
+
+    raw = {"E": 2003, "T": 2000, "o": {"T": 2000}}
+    with patch("state.order_from_order_info") as mock_converter:
+        mock_converter.return_value = Order(symbol, BUY, 1000, 10, "1")
+        state.handle_order_info(Mock(status="NEW", timestamp=2.003, raw=raw))
+    assert state.queue_position("1") == QueuePosition(3000, 0)
+
+
+def test_history_records_top_changes_trades_and_fills(
+    symbol: str, state: State
+) -> None:
+    book = OrderBook(
+        "BINANCE_FUTURES",
+        symbol,
+        bids={Decimal(1): Decimal(3)},
+        asks={Decimal(2): Decimal(1)},
+    )
+    book.timestamp = 1.0
+    state.handle_book(book)
+    # Unchanged tops are not recorded again
+    book.timestamp = 2.0
+    book.delta = {BookSide.BID: [(Decimal("0.5"), Decimal(1))], BookSide.ASK: []}
+    state.handle_book(book)
+    assert state.history.book.column("bid").tolist() == [10]
+
+    state.handle_trade(
+        Trade("BINANCE_FUTURES", symbol, SELL, Decimal(1), Decimal(1), 3.0)
+    )
+    assert state.history.trade_imbalance(10.0) == -1.0
+
+    with patch("state.order_from_order_info") as mock_converter:
+        mock_converter.return_value = Order(symbol, BUY, 10, 10, "1")
+        state.handle_order_info(Mock(status="NEW", timestamp=4.0))
+        mock_converter.return_value = Order(symbol, BUY, 10, 10, "1", filled=4)
+        state.handle_order_info(Mock(status="TRADE", timestamp=5.0))
+    assert state.history.orders.column("filled").tolist() == [0, 4]
+    assert state.history.now == 5.0
@@ -0,0 +1,137 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+from cryptofeed.defines import BUY, LIMIT
+from cryptofeed.types import OrderBook, OrderInfo, Position
+
+from instrument import Instrument
+from market_data import MarketDataRecorder
+from sweep import format_table, grid, parse_space, random_search, run_sweep
+
+SYMBOL = "BTC-USDT-PERP"
+ASSET = "BTCUSDT"
+EXCHANGE = "BINANCE_FUTURES"
+INSTRUMENT = Instrument(SYMBOL, "1", "0.001")
+
+
+def record(directory: str, account_events: bool = False) -> str:
+    # A snapshot, then asks dropping through the bid at 100. Account events
+    # are those of the live account the recording was made with
+    async def write(recorder: MarketDataRecorder):
+        book = OrderBook(
+            EXCHANGE,
+            SYMBOL,
+            bids={Decimal(100 - i): Decimal(1) for i in range(20)},
+            asks={Decimal(101 + i): Decimal(1) for i in range(20)},
+        )
+        await recorder.order_book_handler(book, 1.0)
+        if account_events:
+            await recorder.order_info_handler(live_order_info(), 1.5)
+            await recorder.positions_handler(
+                Position(
+                    EXCHANGE, SYMBOL, Decimal(5), Decimal(100), "both", Decimal(0), 1.5
+                ),
+                1.5,
+            )
+        book.delta = {
+            "bid": [(Decimal(100), Decimal(0))],
+            "ask": [(Decimal(100), Decimal(2))],
+        }
+        await recorder.order_book_handler(book, 2.0)
+
+    recorder = MarketDataRecorder(directory, SYMBOL)
+    asyncio.run(write(recorder))
+    recorder.close()
+    return directory
+
+
+def live_order_info() -> OrderInfo:
+    return OrderInfo(
+        EXCHANGE,
+        SYMBOL,
+        "999999",
+        BUY,
+        "NEW",
+        LIMIT,
+        Decimal(95),
+        Decimal(1),
+        Decimal(1),
+        1.5,
+        raw={"o": {"c": "live-1", "p": "95", "q": "1", "z": "0"}},
+    )
+
+
+@pytest.fixture
+def recording(tmp_path) -> str:
+    return record(str(tmp_path))
+
+
+def test_grid_covers_every_combination() -> None:
+    configurations = list(grid({"orders_per_side": [1, 2], "balance_limit": [1, 5]}))
+    assert len(configurations) == 4
+    assert {"orders_per_side": 2, "balance_limit": 1} in configurations
+
+
+def test_random_search_samples_lists_and_ranges() -> None:
+    space = {
+        "orders_per_side": (1, 3),
+        "price_offset": (Decimal("1.0"), Decimal("5.0")),
+        "requote_mode": ["pull", "amend"],
+    }
+    first = list(random_search(space, 10, seed=7))
+    assert first == list(random_search(space, 10, seed=7))
+    for configuration in first:
+        assert 1 <= configuration["orders_per_side"] <= 3
+        assert Decimal(1) <= configuration["price_offset"] <= Decimal(5)
+        assert configuration["price_offset"].as_tuple().exponent == -1
+        assert configuration["requote_mode"] in ("pull", "amend")
+
+
+def test_parse_space_converts_values() -> None:
+    space = parse_space(["order_size=0.01,0.02", "orders_per_side=1:3"], ranges=True)
+    assert space["order_size"] == [Decimal("0.01"), Decimal("0.02")]
+    assert space["orders_per_side"] == (1, 3)
+    assert space["balance_limit"] == [1.0]
+    with pytest.raises(ValueError):
+        parse_space(["unknown=1"])
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_sweep_replays_each_configuration(recording: str, processes: int) -> None:
+    configurations = [
+        {"orders_per_side": 1, "order_size": Decimal("0.01")},
+        {"orders_per_side": 3, "order_size": Decimal("0.02")},
+    ]
+    results = run_sweep(recording, SYMBOL, ASSET, configurations, INSTRUMENT, processes)
+
+    assert [configuration for configuration, _ in results] == configurations
+    single, triple = (result for _, result in results)
+    # Both sides quoted, then both ladders moved to the new best prices
+    assert (single.inserts, triple.inserts) == (4, 12)
+    assert (single.cancels, triple.cancels) == (1, 5)
+    assert (single.trades, triple.trades) == (1, 1)
+    assert (single.position, triple.position) == (Decimal("0.01"), Decimal("0.02"))
+    assert single.fill_rate == pytest.approx(1 / 4)
+
+    table = format_table(results).splitlines()
+    assert table[0].split()[:2] == ["order_size", "orders_per_side"]
+    assert len(table) == 3
+
+
+def test_sweep_ignores_recorded_account_events(tmp_path) -> None:
+    configurations = [{"orders_per_side": 1, "order_size": Decimal("0.01")}]
+    plain = record(str(tmp_path / "plain"))
+    with_account = record(str(tmp_path / "account"), account_events=True)
+
+    ((_, expected),) = run_sweep(plain, SYMBOL, ASSET, configurations, INSTRUMENT, 1)
+    ((_, result),) = run_sweep(
+        with_account, SYMBOL, ASSET, configurations, INSTRUMENT, 1
+    )
+    assert (result.events, result.inserts, result.cancels, result.trades) == (
+        expected.events,
+        expected.inserts,
+        expected.cancels,
+        expected.trades,
+    )
+    assert (result.position, result.pnl) == (expected.position, expected.pnl)
@@ -0,0 +1,136 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock, patch
+
+import aiohttp
+from cryptofeed.defines import BUY, SELL
+from cryptofeed.exchanges import BinanceFutures
+
+from instrument import Instrument
+from order import Order
+from state import State
+from user_data import UserDataStream
+
+SYMBOL = "BTC-USDT-PERP"
+ASSET = "BTCUSDT"
+INSTRUMENT = Instrument(SYMBOL, "0.10", "0.001")
+
+
+def open_order(order_id: int, side: str, price: str, quantity: str = "0.010"):
+    return {
+        "symbol": ASSET,
+        "orderId": order_id,
+        "clientOrderId": f"bt-{order_id}",
+        "side": side,
+        "price": price,
+        "origQty": quantity,
+        "executedQty": "0",
+    }
+
+
+def make_transport(open_orders) -> Mock:
+    account_info = {"positions": [{"symbol": ASSET, "positionAmt": "0.020"}]}
+
+    async def request(method, endpoint, **kwargs):
+        return open_orders if endpoint == "openOrders" else account_info
+
+    transport = Mock()
+    transport.request = AsyncMock(side_effect=request)
+    return transport
+
+
+def make_stream(transport: Mock, state: State, **options) -> UserDataStream:
+    stream = UserDataStream(**options)
+    stream.bind(transport, [state])
+    return stream
+
+
+def test_resync_diffs_exchange_orders_into_state() -> None:
+    state = State(SYMBOL, ASSET, INSTRUMENT)
+    state.orders.confirm(Order(SYMBOL, BUY, 10, 300000, "1", "bt-1"))
+    state.orders.confirm(Order(SYMBOL, BUY, 10, 299900, "2", "bt-2"))
+    transport = make_transport(
+        [open_order(1, "BUY", "30000.00"), open_order(3, "SELL", "30001.00", "0.005")]
+    )
+    stream = make_stream(transport, state)
+
+    asyncio.run(stream.resync())
+    assert {order.order_id for order in state.open_orders} == {"1", "3"}
+    assert state.orders.get("3") == Order(SYMBOL, SELL, 5, 300010)
+    assert state.balance == 0.02
+    assert stream.counters["resyncs"] == 1
+
+
+def test_first_connect_does_not_resync() -> None:
+    state = State(SYMBOL, ASSET, INSTRUMENT)
+    transport = make_transport([])
+    stream = make_stream(transport, state)
+
+    async def run():
+        await stream.connected(Mock())
+        transport.request.assert_not_called()
+        stream.received(1.0)
+        await stream.connected(Mock())
+        await stream.close()
+
+    asyncio.run(run())
+    assert transport.request.call_count == 2
+    assert stream.counters["connections"] == 2
+    assert stream.counters["last_recovery_ms"] is not None
+
+
+@patch("user_data.cancel_all_orders")
+def test_slow_resync_pulls_all_orders(mock_cancel_all: Mock) -> None:
+    state = State(SYMBOL, ASSET, INSTRUMENT)
+    transport = Mock()
+
+    async def request(*args, **kwargs):
+        await asyncio.sleep(1)
+
+    transport.request = request
+    stream = make_stream(transport, state, resync_timeout=0.01)
+
+    asyncio.run(stream.resync())
+    mock_cancel_all.assert_called_once_with(transport, ASSET)
+    assert stream.counters["failed_resyncs"] == 1
+
+
+@patch("user_data.cancel_all_orders")
+def test_failed_resync_request_pulls_all_orders(mock_cancel_all: Mock) -> None:
+    state = State(SYMBOL, ASSET, INSTRUMENT)
+    transport = Mock()
+    transport.request = AsyncMock(side_effect=aiohttp.ClientError())
+    stream = make_stream(transport, state)
+
+    asyncio.run(stream.resync())
+    mock_cancel_all.assert_called_once_with(transport, ASSET)
+
+
+def test_expired_listen_key_reconnects_with_new_key() -> None:
+    transport = Mock()
+    transport.request = AsyncMock(return_value={"listenKey": "new"})
+    stream = make_stream(transport, State(SYMBOL, ASSET, INSTRUMENT))
+    connection = Mock(address="wss://localhost/ws/old")
+    connection.close = AsyncMock()
+
+    async def run():
+        await stream.connected(connection)
+        await stream.listen_key_expired()
+        await stream.close()
+
+    asyncio.run(run())
+    assert connection.address == "wss://localhost/ws/new"
+    connection.close.assert_awaited_once()
+
+
+def test_feed_reports_connects_without_refresh_loop() -> None:
+    stream = Mock()
+    stream.connected = AsyncMock()
+    feed_class = UserDataStream.feed(stream, BinanceFutures)
+    feed = feed_class.__new__(feed_class)
+    feed._reset = Mock()
+    connection = Mock()
+
+    with patch("cryptofeed.exchanges.binance.create_task") as mock_create_task:
+        asyncio.run(feed.subscribe(connection))
+    stream.connected.assert_awaited_once_with(connection)
+    mock_create_task.assert_not_called()